@@ -0,0 +1,331 @@
+"""
+Optional async (ASGI) serving mode of the product API, a partial app used for benchmarking the serving model
+
+Serves the core endpoints of the Flask application with the same URL layout - token, products (single product
+create, read, update and delete, product list) and offer lists by product and vendor with the price history of
+a product and vendor - on Starlette with an async DB driver (aiosqlite) and an async client of the offers microservice
+(httpx), so waiting on the DB or the offers service does not pin an OS thread. Offer lists are read from OFFERS and
+archive partitions with the same statements as the Flask application, but without its snapshot and response caches;
+price histories stored in PRICE_SERIES (PRICE_SERIES=1) are decoded in a worker thread. Other endpoints
+(active offers of a product or vendor, comparison, vendor summaries, bulk history, deleting many products, watches)
+and the fields parameter are served only by the Flask application. Requires packages from requirements-async.txt;
+run it with e.g.:
+    uvicorn --factory asgi_app:create_asgi_app --host 0.0.0.0 --port 5000 --workers 4
+The offers poller is not part of this mode; run it separately (python poller.py).
+"""
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+from functools import wraps
+from os import environ
+from typing import Callable, List
+
+import httpx
+from marshmallow import ValidationError
+from sqlalchemy import Table, select
+from sqlalchemy.exc import IntegrityError, MultipleResultsFound
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+from auth_api import evaluate_token, secret_token
+from main import create_app
+from flask_misc import fl_sql, RESPONSE204, RESPONSE500
+from metrics import REGISTRY, REQUEST_COUNT, REQUEST_LATENCY, UPSTREAM_ERRORS, UPSTREAM_LATENCY, CONTENT_TYPE
+from product_api import product_body
+from product_db_model import ProductDbModel
+from product_db_schema import ProductDbSchema
+from offer_api import PriceHistory
+from offer_db_model import OfferDbModel, DATE_FORMAT
+from offer_db_schema import OfferDbSchema
+from offer_cleanup import schedule_purge
+from offer_partition_db_model import OfferPartitionDbModel, OFFER_COLUMNS
+from price_series_db_model import PriceSeriesDbModel, series_enabled
+
+ASYNC_DRIVERS = {'sqlite': 'sqlite+aiosqlite', 'postgresql': 'postgresql+asyncpg', 'postgres': 'postgresql+asyncpg'}
+
+product_schema = ProductDbSchema()
+product_list_schema = ProductDbSchema(many=True)
+offer_list_schema = OfferDbSchema(many=True)
+
+
+def to_async_uri(database_uri: str) -> "str":
+    """
+    Convert SQLAlchemy database URI of the sync application to URI using an async driver
+
+    :param database_uri: Database URI, e.g. sqlite:///data.db (str)
+    :returns: - 'str' representing URI with async driver, e.g. sqlite+aiosqlite:///data.db
+    """
+    scheme, rest = database_uri.split('://', 1)
+    if '+' in scheme:
+        return database_uri
+    return f'{ASYNC_DRIVERS.get(scheme, scheme)}://{rest}'
+
+
+class AsyncOffersClient:
+    def __init__(self, base_url: str = None, auth_code: str = None, timeout: float = None):
+        """
+        Initialize AsyncOffersClient - async client of the external offers API. The authorization code is requested
+        on first use if it was not provided
+
+        :param base_url: Base URL of the offers API, OFFER_BASE_URL by default (str)
+        :param auth_code: Authorization code, OFFER_AUTH_CODE by default (str)
+        :param timeout: Timeout of requests in seconds, OFFER_REQUEST_TIMEOUT by default (float)
+        """
+        self.base_url = base_url or environ['OFFER_BASE_URL']
+        self.auth_code = auth_code or environ.get('OFFER_AUTH_CODE') or None
+        self.client = httpx.AsyncClient(timeout=timeout or float(environ.get('OFFER_REQUEST_TIMEOUT', 10)),
+                                        verify=False)
+
+    async def _auth(self) -> "str":
+        if self.auth_code is None:
+            response = await self.client.post(self.base_url + '/auth')
+            if response.status_code != 201:
+                raise KeyError('Could not retrieve new authorization code.')
+            self.auth_code = response.json()
+        return self.auth_code
+
+    async def register_product(self, product: ProductDbModel) -> "bool":
+        """
+        Call to external API to register a new product
+
+        :param product: Registered product (ProductDbModel)
+        :returns: 'bool' representing the success of the operation
+        """
+        start = time.perf_counter()
+        try:
+            response = await self.client.post(self.base_url + '/products/register',
+                                              headers={'Bearer': await self._auth()},
+                                              json=product_schema.dump(product))
+        except httpx.HTTPError as e:
+            UPSTREAM_ERRORS.inc('register', type(e).__name__)
+            return False
+        finally:
+            UPSTREAM_LATENCY.observe(time.perf_counter() - start, 'register')
+        if response.status_code != 201:
+            UPSTREAM_ERRORS.inc('register', response.status_code)
+        return response.status_code == 201
+
+    async def close(self):
+        """
+        Close underlying connections
+        """
+        await self.client.aclose()
+
+
+def endpoint(resource: str, authenticated: bool = True) -> "Callable":
+    """
+    Decorate handler with token evaluation and request metrics, mirroring the Flask resources
+
+    :param resource: Name of the matching Flask resource class, used as metrics label (str)
+    :param authenticated: Whether the handler requires a valid bearer token (bool)
+    :returns: - 'Callable' representing the decorator
+    """
+    def decorator(handler: Callable) -> "Callable":
+        @wraps(handler)
+        async def wrapper(request: Request) -> "Response":
+            start = time.perf_counter()
+            msg, auth_check = evaluate_token(request.headers.get('Bearer')) if authenticated else (None, 200)
+            if auth_check != 200:
+                response = JSONResponse({'message': msg}, status_code=auth_check)
+            else:
+                response = await handler(request)
+            REQUEST_LATENCY.observe(time.perf_counter() - start, resource, request.method)
+            REQUEST_COUNT.inc(resource, request.method, response.status_code)
+            return response
+        return wrapper
+    return decorator
+
+
+def create_asgi_app(database_uri: str = None, offers_client: AsyncOffersClient = None) -> "Starlette":
+    """
+    Create the async application
+
+    :param database_uri: Database URI of the sync application, DATABASE_URI or sqlite:///data.db by default (str)
+    :param offers_client: Client of the offers API, created from environment variables if not provided
+                          (AsyncOffersClient)
+    :returns: - 'Starlette' representing the application
+    """
+    database_uri = database_uri or environ.get('DATABASE_URI', 'sqlite:///data.db')
+    engine = create_async_engine(to_async_uri(database_uri))
+    session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    clients = {'offers': offers_client}
+    # operations done the same way as by the Flask application run in worker threads within its context
+    flask_app = create_app({'SQLALCHEMY_DATABASE_URI': database_uri})
+    with flask_app.app_context():
+        history_from_series = series_enabled()
+
+    def get_offers_client() -> "AsyncOffersClient":
+        if clients['offers'] is None:
+            clients['offers'] = AsyncOffersClient()
+        return clients['offers']
+
+    def delete_product(prod_id: int) -> "bool":
+        # deleting a product deactivates its offers and purges them in the background
+        with flask_app.app_context():
+            if not ProductDbModel.delete_by_id(prod_id):
+                return False
+            schedule_purge([prod_id])
+            return True
+
+    def series_history(prod_id: int, vendor_id: int, from_date: datetime, to_date: datetime) -> "list":
+        with flask_app.app_context():
+            return list(PriceSeriesDbModel.find_history_between_dates(from_date, to_date,
+                                                                      pairs=[(prod_id, vendor_id)]))
+
+    @asynccontextmanager
+    async def lifespan(app: Starlette):
+        async with engine.begin() as conn:
+            await conn.run_sync(fl_sql.Model.metadata.create_all)
+        yield
+        if clients['offers'] is not None:
+            await clients['offers'].close()
+        await engine.dispose()
+
+    async def find_product(session: AsyncSession, prod_id: int) -> "ProductDbModel":
+        result = await session.execute(select(ProductDbModel).filter_by(prod_id=prod_id))
+        return result.scalars().one_or_none()
+
+    async def with_archived(session: AsyncSession, offers: list, where: Callable[[Table], list] = None,
+                            from_date: datetime = None, to_date: datetime = None) -> "List[OfferDbModel]":
+        # the same partitions and order as OfferDbModel._with_archived, archived offers are older so they come first
+        archived = []
+        partitions = (await session.execute(OfferPartitionDbModel.overlapping_statement(from_date, to_date)))
+        for partition in partitions.scalars().all():
+            rows = (await session.execute(partition.select_statement(list(OFFER_COLUMNS), where))).all()
+            archived.extend(OfferDbModel.from_archived(row) for row in rows)
+        return archived + offers
+
+    async def list_offers(statement, archived: Callable[[Table], list] = None) -> "Response":
+        # archived holds criteria of archived offers, active offers are never archived
+        async with session_factory() as session:
+            offer_list = (await session.execute(statement.order_by(OfferDbModel.internal_id))).scalars().all()
+            if archived is not None:
+                offer_list = await with_archived(session, offer_list, archived)
+        return JSONResponse(await run_in_threadpool(offer_list_schema.dump, offer_list))
+
+    @endpoint('RequestToken', authenticated=False)
+    async def request_token(request: Request) -> "Response":
+        return JSONResponse({'access_token': secret_token}, status_code=201)
+
+    @endpoint('Product')
+    async def product(request: Request) -> "Response":
+        prod_id = request.path_params['prod_id']
+        async with session_factory() as session:
+            if request.method == 'DELETE':
+                if await run_in_threadpool(delete_product, prod_id):
+                    return Response(status_code=204)
+                return JSONResponse({'message': f'No product with prod_id={prod_id} was found and therefore was not '
+                                                f'deleted'})
+            try:
+                found_product = await find_product(session, prod_id)
+            except MultipleResultsFound:
+                return JSONResponse({'message': RESPONSE500}, status_code=500)
+            if request.method == 'GET' or found_product is None:
+                return JSONResponse(product_schema.dump(found_product))
+            req_data = await request.json()
+            for key in list(req_data):
+                if key not in product_body.keys():
+                    return JSONResponse({'message': f'Attribute {key} is not present in the model.'}, status_code=400)
+            for key, value in req_data.items():
+                setattr(found_product, key, value)
+            try:
+                await session.commit()
+            except IntegrityError:
+                await session.rollback()
+                return JSONResponse({'message': 'Tried to update unique attribute to already existing value'},
+                                    status_code=400)
+            return JSONResponse(product_schema.dump(found_product))
+
+    @endpoint('ProductList')
+    async def product_list(request: Request) -> "Response":
+        async with session_factory() as session:
+            if request.method == 'GET':
+                products = (await session.execute(select(ProductDbModel))).scalars().all()
+                return JSONResponse(await run_in_threadpool(product_list_schema.dump, products))
+            product_json = await request.json()
+            try:
+                result = await session.execute(select(ProductDbModel).filter_by(name=product_json['name']))
+                found_product = result.scalars().one_or_none()
+            except MultipleResultsFound:
+                return JSONResponse({'message': f'{RESPONSE500} - multiple objects with the same name found'},
+                                    status_code=500)
+            if found_product is not None:
+                return JSONResponse({'message': 'Product with a same name already exists.'}, status_code=400)
+            try:
+                product_data = product_schema.load(product_json, transient=True)
+            except (ValidationError, ValueError) as e:
+                return JSONResponse({'message': str(e)}, status_code=400)
+            session.add(product_data)
+            try:
+                await session.commit()
+            except IntegrityError:
+                await session.rollback()
+                return JSONResponse({'message': 'Internal server error - object not created'}, status_code=500)
+        if await get_offers_client().register_product(product_data):
+            return JSONResponse(product_schema.dump(product_data), status_code=201)
+        return JSONResponse({'message': 'Internal server error - object not registered'}, status_code=500)
+
+    @endpoint('OfferList')
+    async def offer_list(request: Request) -> "Response":
+        return await list_offers(select(OfferDbModel), lambda table: [])
+
+    @endpoint('ActiveOfferList')
+    async def active_offer_list(request: Request) -> "Response":
+        return await list_offers(select(OfferDbModel).filter_by(active=True))
+
+    @endpoint('ProductOfferList')
+    async def product_offer_list(request: Request) -> "Response":
+        prod_id = request.path_params['prod_id']
+        return await list_offers(select(OfferDbModel).filter_by(prod_id=prod_id),
+                                 lambda table: [table.c.prod_id == prod_id])
+
+    @endpoint('VendorOfferList')
+    async def vendor_offer_list(request: Request) -> "Response":
+        vendor_id = request.path_params['vendor_id']
+        return await list_offers(select(OfferDbModel).filter_by(vendor_id=vendor_id),
+                                 lambda table: [table.c.vendor_id == vendor_id])
+
+    @endpoint('ProductAndVendorOfferHistoryList')
+    async def price_history(request: Request) -> "Response":
+        prod_id = request.path_params['prod_id']
+        vendor_id = request.path_params['vendor_id']
+        date_interval_json = await request.json()
+        from_date = datetime.strptime(date_interval_json['date_start'], DATE_FORMAT)
+        to_date = datetime.strptime(date_interval_json['date_end'], DATE_FORMAT)
+        if history_from_series:
+            offers = await run_in_threadpool(series_history, prod_id, vendor_id, from_date, to_date)
+        else:
+            statement = select(OfferDbModel).filter_by(prod_id=prod_id, vendor_id=vendor_id) \
+                .filter(OfferDbModel.date_created >= from_date, OfferDbModel.date_created <= to_date) \
+                .order_by(OfferDbModel.date_created.asc())
+            async with session_factory() as session:
+                offers = (await session.execute(statement)).scalars().all()
+                offers = await with_archived(
+                    session, offers, lambda table: [table.c.prod_id == prod_id, table.c.vendor_id == vendor_id,
+                                                    table.c.date_created >= from_date, table.c.date_created <= to_date],
+                    from_date, to_date)
+            # stable, offers created at the same time keep their order
+            offers.sort(key=lambda offer: offer.date_created)
+        # the sync API returns the price history as a json encoded string, keep the same format
+        return JSONResponse(PriceHistory.from_offers(prod_id, vendor_id, offers).to_json())
+
+    async def metrics_view(request: Request) -> "Response":
+        return Response(REGISTRY.render(), headers={'Content-Type': CONTENT_TYPE})
+
+    routes = [
+        Route('/api/auth', request_token, methods=['POST']),
+        Route('/api/product/{prod_id:int}', product, methods=['GET', 'DELETE', 'PATCH']),
+        Route('/api/products', product_list, methods=['GET', 'POST']),
+        Route('/api/offers', offer_list, methods=['GET']),
+        Route('/api/offers/active', active_offer_list, methods=['GET']),
+        Route('/api/offers/product/{prod_id:int}', product_offer_list, methods=['GET']),
+        Route('/api/offers/vendor/{vendor_id:int}', vendor_offer_list, methods=['GET']),
+        Route('/api/offers/product/{prod_id:int}/vendor/{vendor_id:int}', price_history, methods=['POST']),
+        Route('/metrics', metrics_view, methods=['GET']),
+    ]
+    return Starlette(routes=routes, lifespan=lifespan)
@@ -0,0 +1,169 @@
+"""
+Benchmark of the sync (gunicorn + Flask) and async (uvicorn + Starlette) serving modes at high concurrency
+
+Both servers run as separate processes on the same generated SQLite DB (without the poller) and the offers service
+simulator adds latency to product registration, so that waiting on the upstream is part of the measurement.
+Requires packages from requirements-async.txt.
+
+Usage (from the repository root):
+    python -m benchmarks.async_vs_sync --concurrency 256 --requests 5000 --latency-ms 50
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+import httpx
+
+from benchmarks.datagen import generate
+from benchmarks.run import HEADERS, build_app, percentile
+from offers_simulator import SimulatorConfig, SimulatorServer
+
+SYNC_PORT = 5101
+ASYNC_PORT = 5102
+
+
+def server_commands(workers: int) -> "Dict[str, List[str]]":
+    """
+    Define commands starting the compared servers
+
+    :param workers: Number of worker processes of each server (int)
+    :returns: - 'Dict[str, List[str]]' representing command by serving mode
+    """
+    return {
+        'sync': [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--workers', str(workers),
+                 '--bind', f'127.0.0.1:{SYNC_PORT}', 'wsgi:app'],
+        'async': [sys.executable, '-m', 'uvicorn', '--factory', 'asgi_app:create_asgi_app', '--workers', str(workers),
+                  '--host', '127.0.0.1', '--port', str(ASYNC_PORT), '--no-access-log'],
+    }
+
+
+def wait_until_ready(base_url: str, timeout: float = 30):
+    """
+    Wait until the server answers requests
+
+    :param base_url: Base URL of the server (str)
+    :param timeout: Maximum waiting time in seconds (float)
+    :raises TimeoutError: If the server did not start in time
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(base_url + '/metrics').status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise TimeoutError(f'Server at {base_url} did not start in {timeout} s')
+
+
+def scenarios(products: int) -> "Dict[str, Callable]":
+    """
+    Define load scenarios - DB bound reads and a product creation waiting on the offers service
+
+    :param products: Number of generated products (int)
+    :returns: - 'Dict[str, Callable]' representing request factories by scenario name
+    """
+    return {
+        'product_get': lambda c, i: c.get(f'/api/product/{i % products + 1}', headers=HEADERS),
+        'offers_product': lambda c, i: c.get(f'/api/offers/product/{i % products + 1}', headers=HEADERS),
+        'product_create': lambda c, i: c.post('/api/products', headers=HEADERS,
+                                              json={'name': f'Benchmark product {time.time_ns()}-{i}',
+                                                    'description': 'Benchmark'}),
+    }
+
+
+async def run_scenario(base_url: str, request_factory: Callable, requests: int, concurrency: int) -> "dict":
+    """
+    Send requests with given number of requests in flight and measure latency of every request
+
+    :param base_url: Base URL of the server (str)
+    :param request_factory: Function creating a request coroutine from client and request index (Callable)
+    :param requests: Total number of requests (int)
+    :param concurrency: Number of requests in flight (int)
+    :returns: - 'dict' representing throughput, latency percentiles and number of failed requests
+    """
+    latencies = []
+    errors = 0
+    counter = iter(range(requests))
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        async def worker():
+            nonlocal errors
+            for i in counter:
+                start = time.perf_counter()
+                try:
+                    response = await request_factory(client, i)
+                    if response.status_code >= 400:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {'requests': len(latencies), 'errors': errors, 'throughput': len(latencies) / elapsed,
+            'p50_ms': percentile(latencies, 0.5) * 1000, 'p99_ms': percentile(latencies, 0.99) * 1000}
+
+
+def main(argv: List[str] = None) -> "int":
+    """
+    Run the benchmark from command line
+
+    :param argv: Command line arguments (List[str])
+    :returns: - 'int' representing exit code
+    """
+    parser = argparse.ArgumentParser(description='Compare sync and async serving modes of the API')
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--vendors', type=int, default=200)
+    parser.add_argument('--vendors-per-product', type=int, default=5)
+    parser.add_argument('--history', type=int, default=5)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=128)
+    parser.add_argument('--workers', type=int, default=2, help='worker processes of each server')
+    parser.add_argument('--latency-ms', type=float, default=50.0, help='latency of the offers service')
+    parser.add_argument('--modes', nargs='+', default=['sync', 'async'], choices=['sync', 'async'])
+    args = parser.parse_args(argv)
+
+    config = SimulatorConfig(latency=args.latency_ms / 1000)
+    simulator = SimulatorServer(config)
+    simulator.start()
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_path = os.path.join(tmp_dir, 'benchmark.db')
+            os.environ['OFFER_BASE_URL'] = simulator.base_url
+            os.environ['OFFER_AUTH_CODE'] = config.auth_code
+            app = build_app(db_path)
+            with app.app_context():
+                generate(args.products, args.vendors, args.vendors_per_product, args.history)
+            env = dict(os.environ, DATABASE_URI=f'sqlite:///{db_path}', POLLER_LEASE='none')
+            commands = server_commands(args.workers)
+            for mode in args.modes:
+                port = SYNC_PORT if mode == 'sync' else ASYNC_PORT
+                base_url = f'http://127.0.0.1:{port}'
+                server = subprocess.Popen(commands[mode], env=env, stdout=subprocess.DEVNULL,
+                                          stderr=subprocess.DEVNULL)
+                try:
+                    wait_until_ready(base_url)
+                    for name, factory in scenarios(args.products).items():
+                        result = asyncio.run(run_scenario(base_url, factory, args.requests, args.concurrency))
+                        print(f'{mode:<6} {name:<16} {result["throughput"]:>10.1f} req/s   '
+                              f'p50 {result["p50_ms"]:>9.2f} ms   p99 {result["p99_ms"]:>9.2f} ms   '
+                              f'errors {result["errors"]}')
+                finally:
+                    server.terminate()
+                    server.wait()
+    finally:
+        simulator.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
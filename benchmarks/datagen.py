@@ -0,0 +1,50 @@
+import random
+import time
+from datetime import datetime, timedelta
+
+from flask_misc import fl_sql
+from offer_db_model import OfferDbModel
+from product_db_model import ProductDbModel
+
+BATCH_SIZE = 10000
+
+
+def generate(products: int, vendors: int, vendors_per_product: int, history: int, seed: int = 0) -> "dict":
+    """
+    Write synthetic products and offer history straight into the DB (bypassing the API and the ORM unit of work).
+    For every product, vendors_per_product vendors out of vendors are chosen and each of them gets history offers,
+    the newest of which is active. Must be called within app context
+
+    :param products: Number of generated products (int)
+    :param vendors: Number of distinct vendors (int)
+    :param vendors_per_product: Number of vendors offering each product (int)
+    :param history: Number of offers in the history of each product and vendor pair (int)
+    :param seed: Seed of the random generator, the same seed generates the same data (int)
+    :returns: - 'dict' representing number of generated rows and generation time
+    """
+    rnd = random.Random(seed)
+    start = time.perf_counter()
+    fl_sql.session.execute(ProductDbModel.__table__.insert(),
+                           [{'prod_id': prod_id, 'name': f'Product {prod_id}',
+                             'description': f'Synthetic product number {prod_id}'}
+                            for prod_id in range(1, products + 1)])
+    now = datetime.now()
+    batch = []
+    offers = 0
+    for prod_id in range(1, products + 1):
+        for vendor_id in rnd.sample(range(1, vendors + 1), min(vendors_per_product, vendors)):
+            price = rnd.randint(100, 100000)
+            for i in range(history):
+                price = max(1, price + rnd.randint(-price // 10, price // 10))
+                batch.append({'vendor_id': vendor_id, 'price': price, 'items_in_stock': rnd.randint(1, 1000),
+                              'active': i == history - 1, 'prod_id': prod_id,
+                              'date_created': now - timedelta(hours=history - i)})
+            if len(batch) >= BATCH_SIZE:
+                fl_sql.session.execute(OfferDbModel.__table__.insert(), batch)
+                offers += len(batch)
+                batch = []
+    if batch:
+        fl_sql.session.execute(OfferDbModel.__table__.insert(), batch)
+        offers += len(batch)
+    fl_sql.session.commit()
+    return {'products': products, 'offers': offers, 'seconds': time.perf_counter() - start}
@@ -0,0 +1,79 @@
+"""
+Offline ingestion benchmark of the poller against the offers service simulator
+
+Usage (from the repository root):
+    python -m benchmarks.ingest --products 100000 --cycles 2
+    python -m benchmarks.ingest --products 100000 --base-url http://127.0.0.1:5001   # simulator in another process
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from typing import List
+
+from benchmarks.datagen import generate
+from benchmarks.run import build_app
+from offers_simulator import SimulatorConfig, SimulatorServer
+
+
+def main(argv: List[str] = None) -> "int":
+    """
+    Run the ingestion benchmark from command line
+
+    :param argv: Command line arguments (List[str])
+    :returns: - 'int' representing exit code
+    """
+    parser = argparse.ArgumentParser(description='Measure offer ingestion throughput of the poller')
+    parser.add_argument('--products', type=int, default=10000)
+    parser.add_argument('--cycles', type=int, default=2, help='number of measured poller cycles')
+    parser.add_argument('--vendors', type=int, default=1000)
+    parser.add_argument('--min-vendors', type=int, default=3)
+    parser.add_argument('--max-vendors', type=int, default=10)
+    parser.add_argument('--churn', type=float, default=0.1)
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--base-url', help='use already running simulator instead of an in-process one')
+    parser.add_argument('--auth-code', default='simulator_auth_code')
+    args = parser.parse_args(argv)
+
+    simulator = None
+    if args.base_url:
+        os.environ['OFFER_BASE_URL'] = args.base_url
+    else:
+        # ticks are advanced manually between cycles, so every cycle sees churn fraction of changed offers
+        simulator = SimulatorServer(SimulatorConfig(seed=args.seed, min_vendors=args.min_vendors,
+                                                    max_vendors=args.max_vendors, vendor_pool=args.vendors,
+                                                    churn=args.churn, tick_seconds=0,
+                                                    latency=args.latency_ms / 1000, error_rate=args.error_rate,
+                                                    auth_code=args.auth_code))
+        simulator.start()
+        os.environ['OFFER_BASE_URL'] = simulator.base_url
+    os.environ['OFFER_AUTH_CODE'] = args.auth_code
+
+    from offers_client import OffersClient
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            app = build_app(os.path.join(tmp_dir, 'ingest.db'))
+            client = OffersClient()
+            client.define_app_context(app)
+            with app.app_context():
+                generated = generate(args.products, args.vendors, 0, 0, args.seed)
+                print(f'Generated {generated["products"]} products in {generated["seconds"]:.1f} s')
+                for cycle in range(args.cycles):
+                    start = time.perf_counter()
+                    inserted = client.poll_once()
+                    elapsed = time.perf_counter() - start
+                    print(f'cycle {cycle + 1}: {elapsed:.1f} s, {args.products / elapsed:.1f} products/s, '
+                          f'{inserted} offers inserted ({inserted / elapsed:.1f} offers/s)')
+                    if simulator is not None:
+                        simulator.simulator.advance()
+    finally:
+        if simulator is not None:
+            simulator.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
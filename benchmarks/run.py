@@ -0,0 +1,282 @@
+"""
+Reproducible load-test and benchmark suite of the product API
+
+Usage (from the repository root):
+    python -m benchmarks.run --preset small --save-baseline benchmarks/baselines/small.json
+    python -m benchmarks.run --preset small --compare benchmarks/baselines/small.json
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, List
+
+from benchmarks.datagen import generate
+from offers_simulator import SimulatorConfig, SimulatorServer
+
+API_TOKEN = 'very_secret_key'
+HEADERS = {'Bearer': API_TOKEN}
+PRESETS = {
+    'small': {'products': 200, 'vendors': 50, 'vendors_per_product': 5, 'history': 10, 'requests': 200,
+              'concurrency': 4},
+    'medium': {'products': 2000, 'vendors': 200, 'vendors_per_product': 10, 'history': 50, 'requests': 1000,
+               'concurrency': 8},
+    'large': {'products': 20000, 'vendors': 1000, 'vendors_per_product': 20, 'history': 100, 'requests': 2000,
+              'concurrency': 16},
+}
+
+
+def build_app(db_path: str):
+    """
+    Build the API application using given SQLite file
+
+    :param db_path: Path to SQLite DB file (str)
+    :returns: - 'Flask' representing the application
+    """
+    from main import create_app, init_db
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}'})
+    init_db(app)
+    return app
+
+
+def percentile(sorted_values: List[float], fraction: float) -> "float":
+    """
+    Get percentile of sorted values using nearest-rank method
+
+    :param sorted_values: Sorted values (List[float])
+    :param fraction: Requested percentile as a fraction, e.g. 0.99 (float)
+    :returns: - 'float' representing the percentile
+    """
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def run_scenario(app, request_factory: Callable, requests: int, concurrency: int, seed: int) -> "dict":
+    """
+    Send requests created by request_factory from concurrent clients and measure their latency
+
+    :param app: Benchmarked application (Flask)
+    :param request_factory: Function (client, rnd, i) sending i-th request and returning the response (Callable)
+    :param requests: Total number of requests (int)
+    :param concurrency: Number of concurrent clients (int)
+    :param seed: Seed of the random generators of the clients (int)
+    :returns: - 'dict' representing throughput, p50 and p99 latency (in ms) and number of errors
+    """
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def worker(worker_id: int, count: int):
+        client = app.test_client()
+        rnd = random.Random(seed * 1000 + worker_id)
+        own_latencies = []
+        own_errors = 0
+        for i in range(count):
+            start = time.perf_counter()
+            response = request_factory(client, rnd, worker_id * requests + i)
+            own_latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                own_errors += 1
+        with lock:
+            latencies.extend(own_latencies)
+            errors[0] += own_errors
+
+    per_worker = [requests // concurrency + (1 if i < requests % concurrency else 0) for i in range(concurrency)]
+    threads = [threading.Thread(target=worker, args=(i, count)) for i, count in enumerate(per_worker)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {'requests': len(latencies), 'errors': errors[0], 'throughput': len(latencies) / elapsed,
+            'p50_ms': percentile(latencies, 0.5) * 1000, 'p99_ms': percentile(latencies, 0.99) * 1000}
+
+
+def scenarios(params: dict) -> "Dict[str, Callable]":
+    """
+    Define load scenarios covering every endpoint of the API
+
+    :param params: Benchmark parameters (dict)
+    :returns: - 'Dict[str, Callable]' representing request factories by scenario name
+    """
+    products = params['products']
+    vendors = params['vendors']
+    interval = {'date_start': '0001-01-01T00:00:00.000000', 'date_end': '3000-01-01T00:00:00.000000'}
+    return {
+        'product_get': lambda c, r, i: c.get(f'/api/product/{r.randint(1, products)}', headers=HEADERS),
+        'product_patch': lambda c, r, i: c.patch(f'/api/product/{r.randint(1, products)}', headers=HEADERS,
+                                                 json={'description': f'Updated description {i}'}),
+        'products_list': lambda c, r, i: c.get('/api/products', headers=HEADERS),
+        'product_create': lambda c, r, i: c.post('/api/products', headers=HEADERS,
+                                                 json={'name': f'Benchmark product {i}', 'description': 'Benchmark'}),
+        'offers_all': lambda c, r, i: c.get('/api/offers', headers=HEADERS),
+        'offers_active': lambda c, r, i: c.get('/api/offers/active', headers=HEADERS),
+        'offers_product': lambda c, r, i: c.get(f'/api/offers/product/{r.randint(1, products)}', headers=HEADERS),
+        'offers_vendor': lambda c, r, i: c.get(f'/api/offers/vendor/{r.randint(1, vendors)}', headers=HEADERS),
+        'offer_history': lambda c, r, i: c.post(
+            f'/api/offers/product/{r.randint(1, products)}/vendor/{r.randint(1, vendors)}', headers=HEADERS,
+            json=interval),
+        'product_delete': lambda c, r, i: c.delete(f'/api/product/{products - i % products}',
+                                                  headers=HEADERS),
+    }
+
+
+# Scenarios listing whole tables are slow by design, so they are run with fewer requests
+HEAVY_SCENARIOS = ('offers_all', 'offers_active', 'products_list')
+
+
+def run_benchmarks(params: dict, only: List[str] = None) -> "dict":
+    """
+    Generate data, start the offers service simulator and run all scenarios including one poller cycle
+
+    :param params: Benchmark parameters (dict)
+    :param only: Run only these scenarios if provided (List[str])
+    :returns: - 'dict' representing results by scenario name
+    """
+    config = SimulatorConfig(seed=params['seed'], min_vendors=params['vendors_per_product'],
+                             max_vendors=params['vendors_per_product'], vendor_pool=params['vendors'],
+                             churn=params['churn'], latency=params['latency_ms'] / 1000)
+    simulator = SimulatorServer(config)
+    simulator.start()
+    os.environ['OFFER_BASE_URL'] = simulator.base_url
+    os.environ['OFFER_AUTH_CODE'] = config.auth_code
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            app = build_app(os.path.join(tmp_dir, 'benchmark.db'))
+            with app.app_context():
+                results['datagen'] = generate(params['products'], params['vendors'], params['vendors_per_product'],
+                                              params['history'], params['seed'])
+            for name, factory in scenarios(params).items():
+                if only and name not in only:
+                    continue
+                requests = params['requests']
+                if name in HEAVY_SCENARIOS:
+                    requests = max(params['concurrency'], requests // 20)
+                if name == 'product_delete':
+                    requests = min(requests, params['products'] // 2)
+                results[name] = run_scenario(app, factory, requests, params['concurrency'], params['seed'])
+                print_result(name, results[name])
+            if not only or 'poller_cycle' in only:
+                results['poller_cycle'] = run_poller_cycle(app)
+                print_result('poller_cycle', results['poller_cycle'])
+    finally:
+        simulator.shutdown()
+    return results
+
+
+def run_poller_cycle(app) -> "dict":
+    """
+    Measure a single poller cycle over all products against the offers service simulator
+
+    :param app: Benchmarked application (Flask)
+    :returns: - 'dict' representing cycle duration and ingestion throughput
+    """
+    from offers_client import OffersClient
+    client = OffersClient()
+    client.define_app_context(app)
+    with app.app_context():
+        start = time.perf_counter()
+        inserted = client.poll_once()
+        elapsed = time.perf_counter() - start
+    return {'seconds': elapsed, 'inserted': inserted, 'throughput': inserted / elapsed if elapsed else 0.0}
+
+
+def print_result(name: str, result: dict):
+    """
+    Print result of a single scenario
+
+    :param name: Name of the scenario (str)
+    :param result: Result of the scenario (dict)
+    """
+    if 'p50_ms' in result:
+        print(f'{name:<16} {result["throughput"]:>10.1f} req/s   p50 {result["p50_ms"]:>9.2f} ms   '
+              f'p99 {result["p99_ms"]:>9.2f} ms   errors {result["errors"]}')
+    else:
+        print(f'{name:<16} {result["throughput"]:>10.1f} offers/s   cycle {result["seconds"]:.2f} s')
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> "List[str]":
+    """
+    Compare results with saved baseline
+
+    :param results: Current results (dict)
+    :param baseline: Saved baseline (dict)
+    :param tolerance: Allowed relative degradation, e.g. 0.2 for 20 % (float)
+    :returns: - 'List[str]' representing found regressions
+    """
+    regressions = []
+    for name, base in baseline['results'].items():
+        current = results.get(name)
+        if current is None or 'throughput' not in base:
+            continue
+        if current['throughput'] < base['throughput'] * (1 - tolerance):
+            regressions.append(f'{name}: throughput {current["throughput"]:.1f} < baseline {base["throughput"]:.1f}')
+        if 'p99_ms' in base and current['p99_ms'] > base['p99_ms'] * (1 + tolerance):
+            regressions.append(f'{name}: p99 {current["p99_ms"]:.2f} ms > baseline {base["p99_ms"]:.2f} ms')
+    return regressions
+
+
+def main(argv: List[str] = None) -> "int":
+    """
+    Run the benchmark suite from command line
+
+    :param argv: Command line arguments (List[str])
+    :returns: - 'int' representing exit code (1 if a regression against the baseline was found)
+    """
+    parser = argparse.ArgumentParser(description='Benchmark the product API')
+    parser.add_argument('--preset', choices=PRESETS, default='small')
+    parser.add_argument('--products', type=int)
+    parser.add_argument('--vendors', type=int)
+    parser.add_argument('--vendors-per-product', type=int)
+    parser.add_argument('--history', type=int, help='offers per product and vendor pair')
+    parser.add_argument('--requests', type=int, help='requests per scenario')
+    parser.add_argument('--concurrency', type=int)
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='latency of the offers service simulator')
+    parser.add_argument('--churn', type=float, default=0.1, help='probability of offer change per tick')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--scenario', action='append', help='run only given scenario (can be repeated)')
+    parser.add_argument('--save-baseline', metavar='PATH')
+    parser.add_argument('--compare', metavar='PATH')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    params = dict(PRESETS[args.preset])
+    for key in ('products', 'vendors', 'vendors_per_product', 'history', 'requests', 'concurrency'):
+        if getattr(args, key) is not None:
+            params[key] = getattr(args, key)
+    params.update({'latency_ms': args.latency_ms, 'churn': args.churn, 'seed': args.seed})
+
+    results = run_benchmarks(params, args.scenario)
+    report = {'params': params, 'python': platform.python_version(), 'platform': platform.platform(),
+              'results': results}
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f'Baseline saved to {args.save_baseline}')
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline['params'] != params:
+            print('Warning: benchmark parameters differ from the baseline parameters')
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        if regressions:
+            return 1
+        print('No regressions found')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
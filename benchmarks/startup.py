@@ -0,0 +1,73 @@
+"""
+Cold start benchmark of the API - time from interpreter start to the first served request, measured in fresh
+processes, so that nothing is cached in sys.modules. The offers service address points to a closed port, so any
+network I/O during startup shows up as an error
+
+Usage (from the repository root):
+    python -m benchmarks.startup --runs 5 --budget-ms 1500
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import List
+
+# Executed in a fresh interpreter; prints phase durations in seconds as json
+PROBE = '''
+import json, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+app = main.create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://'})
+created = time.perf_counter()
+main.init_db(app)
+response = app.test_client().get('/metrics')
+assert response.status_code == 200, response.status_code
+served = time.perf_counter()
+print(json.dumps({'import': imported - start, 'create_app': created - imported,
+                  'first_request': served - created, 'total': served - start}))
+'''
+
+
+def measure(runs: int) -> "dict":
+    """
+    Measure cold start phases in fresh processes
+
+    :param runs: Number of measured processes (int)
+    :returns: - 'dict' representing median duration of every phase in milliseconds
+    """
+    env = dict(os.environ, OFFER_BASE_URL='http://127.0.0.1:9', POLLER_LEASE='none')
+    env.pop('OFFER_AUTH_CODE', None)
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', PROBE], env=env, check=True, capture_output=True, text=True)
+        samples.append(json.loads(output.stdout.strip().splitlines()[-1]))
+    return {phase: statistics.median(sample[phase] for sample in samples) * 1000 for phase in samples[0]}
+
+
+def main(argv: List[str] = None) -> "int":
+    """
+    Run the benchmark from command line
+
+    :param argv: Command line arguments (List[str])
+    :returns: - 'int' representing exit code, 1 if the budget was exceeded
+    """
+    parser = argparse.ArgumentParser(description='Measure cold start of the API')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=float(os.environ.get('STARTUP_BUDGET_MS', 1500)),
+                        help='maximum median time to the first served request')
+    args = parser.parse_args(argv)
+
+    result = measure(args.runs)
+    for phase, value in result.items():
+        print(f'{phase:<14} {value:>9.1f} ms')
+    if result['total'] > args.budget_ms:
+        print(f'Startup budget of {args.budget_ms:.0f} ms exceeded')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
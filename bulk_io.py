@@ -0,0 +1,197 @@
+"""
+Bulk import and export of products and offers
+
+Tables are exported as NDJSON (one json object per row, gzip compressed if the file name ends with .gz) streamed in
+chunks of --batch-size rows, and imported from NDJSON or CSV (with a header row of column names, optionally gzip
+compressed) with batched inserts, each batch in its own transaction. SQLite is switched to settings tuned for loading
+(no fsync, in-memory temporary storage, larger page cache) during the import. Memory use depends only on the batch
+size, not on the number of rows. Import products before their offers; histories in PRICE_SERIES are not built by the
+import, run python price_series.py --backfill afterwards if the compact history store is used.
+    python bulk_io.py export offers offers.ndjson.gz
+    python bulk_io.py import products products.csv
+"""
+import argparse
+import csv
+import gzip
+import io
+import json
+import sys
+import time
+from datetime import datetime
+from typing import Callable, Dict, IO, Iterable, Iterator, List
+
+import sqlalchemy.exc
+from sqlalchemy import Table, select
+
+from data_version_db_model import DataVersionDbModel, OFFER_DEACTIVATIONS
+from flask_misc import fl_sql
+from offer_db_model import OfferDbModel
+from product_db_model import ProductDbModel
+
+TABLES: Dict[str, Table] = {'products': ProductDbModel.__table__, 'offers': OfferDbModel.__table__}
+BATCH_SIZE = 10000
+LOAD_PRAGMAS = ('PRAGMA synchronous = OFF', 'PRAGMA temp_store = MEMORY', 'PRAGMA cache_size = -200000')
+RESTORED_PRAGMAS = ('PRAGMA synchronous = FULL', 'PRAGMA temp_store = DEFAULT', 'PRAGMA cache_size = -2000')
+
+
+def _open(path: str, mode: str) -> "IO[str]":
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8', newline='')
+    return io.open(path, mode, encoding='utf-8', newline='')
+
+
+def _parse_bool(value: str) -> "bool":
+    if value.lower() in ('1', 'true'):
+        return True
+    if value.lower() in ('0', 'false'):
+        return False
+    raise ValueError(f'Invalid boolean {value}')
+
+
+def _converters(table: Table) -> "Dict[str, Callable[[str], object]]":
+    # values read from CSV (and dates from NDJSON) are strings, converted by the type of their column
+    parsers = {int: int, bool: _parse_bool, datetime: datetime.fromisoformat, str: str}
+    return {column.name: parsers[column.type.python_type] for column in table.columns}
+
+
+def _report(table_name: str, rows: int, start: float):
+    elapsed = time.perf_counter() - start
+    print(f'{table_name}: {rows} rows in {elapsed:.1f} s ({rows / max(elapsed, 1e-9):.0f} rows/s)')
+
+
+def export_table(table_name: str, path: str, batch_size: int = BATCH_SIZE) -> "int":
+    """
+    Export a table to NDJSON, streaming its rows in chunks. Must be called within app context
+
+    :param table_name: One of TABLES (str)
+    :param path: Output file, gzip compressed if it ends with .gz (str)
+    :param batch_size: Number of rows fetched from the DB at once (int)
+    :returns: - 'int' representing number of exported rows
+    """
+    table = TABLES[table_name]
+    start = time.perf_counter()
+    exported = 0
+    with fl_sql.engine.connect() as connection, _open(path, 'w') as output:
+        result = connection.execution_options(stream_results=True) \
+            .execute(select(table).order_by(*table.primary_key.columns))
+        for rows in result.partitions(batch_size):
+            output.writelines(json.dumps(dict(row._mapping), default=datetime.isoformat) + '\n' for row in rows)
+            exported += len(rows)
+            _report(table_name, exported, start)
+    return exported
+
+
+def read_rows(table_name: str, path: str) -> "Iterator[dict]":
+    """
+    Read rows of a table from NDJSON or CSV file (by its extension, .csv or .csv.gz for CSV)
+
+    :param table_name: One of TABLES (str)
+    :param path: Input file, gzip compressed if it ends with .gz (str)
+    :returns: - 'Iterator[dict]' representing rows with values converted to types of their columns
+    :raises ValueError: If a row has a column that is not in the table or an invalid value
+    """
+    converters = _converters(TABLES[table_name])
+    with _open(path, 'r') as source:
+        is_csv = path[:-3].endswith('.csv') if path.endswith('.gz') else path.endswith('.csv')
+        records: Iterable[dict] = csv.DictReader(source) if is_csv else \
+            (json.loads(line) for line in source if line.strip())
+        for number, record in enumerate(records, start=1):
+            unknown = record.keys() - converters.keys()
+            if unknown:
+                raise ValueError(f'Row {number} has unknown columns {", ".join(sorted(unknown))}')
+            # empty CSV values of non-string columns are left to column defaults
+            yield {column: converters[column](value) if isinstance(value, str) else value
+                   for column, value in record.items()
+                   if not (is_csv and value == '' and converters[column] is not str)}
+
+
+def import_rows(table_name: str, rows: Iterable[dict], batch_size: int = BATCH_SIZE) -> "int":
+    """
+    Insert rows into a table in batches, each in its own transaction. Must be called within app context
+
+    :param table_name: One of TABLES (str)
+    :param rows: Rows to insert (Iterable[dict])
+    :param batch_size: Number of rows inserted in one transaction (int)
+    :returns: - 'int' representing number of imported rows
+    """
+    table = TABLES[table_name]
+    start = time.perf_counter()
+    imported = 0
+    sqlite = fl_sql.engine.dialect.name == 'sqlite'
+    with fl_sql.engine.connect() as connection:
+        if sqlite:
+            for pragma in LOAD_PRAGMAS:
+                connection.exec_driver_sql(pragma)
+        try:
+            batch: List[dict] = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    imported += _insert_batch(connection, table, batch)
+                    batch = []
+                    _report(table_name, imported, start)
+            if batch:
+                imported += _insert_batch(connection, table, batch)
+                _report(table_name, imported, start)
+        finally:
+            if sqlite:
+                # the connection returns to the pool
+                for pragma in RESTORED_PRAGMAS:
+                    connection.exec_driver_sql(pragma)
+    if table_name == 'offers' and imported:
+        # readers caching active offers must rebuild them
+        DataVersionDbModel.bump(OFFER_DEACTIVATIONS)
+        fl_sql.session.commit()
+    return imported
+
+
+def _insert_batch(connection, table: Table, batch: List[dict]) -> "int":
+    if table is OfferDbModel.__table__:
+        for row in batch:
+            row.setdefault('active', True)
+            row.setdefault('date_created', datetime.now())
+    with connection.begin():
+        for rows in _group_by_columns(batch):
+            connection.execute(table.insert(), rows)
+    return len(batch)
+
+
+def _group_by_columns(batch: List[dict]) -> "Iterable[List[dict]]":
+    # a single executemany needs rows with the same columns
+    groups: Dict[frozenset, List[dict]] = {}
+    for row in batch:
+        groups.setdefault(frozenset(row), []).append(row)
+    return groups.values()
+
+
+def main(argv: List[str] = None) -> "int":
+    """
+    Import or export products and offers
+
+    :param argv: Command line arguments (List[str])
+    :returns: - 'int' representing exit code
+    """
+    parser = argparse.ArgumentParser(description='Bulk import and export of products and offers')
+    parser.add_argument('command', choices=('import', 'export'))
+    parser.add_argument('table', choices=tuple(TABLES))
+    parser.add_argument('path', help='NDJSON or CSV (import only) file, gzip compressed if it ends with .gz')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    from main import create_app, init_db
+    app = create_app()
+    init_db(app)
+    with app.app_context():
+        if args.command == 'export':
+            export_table(args.table, args.path, args.batch_size)
+            return 0
+        try:
+            import_rows(args.table, read_rows(args.table, args.path), args.batch_size)
+        except (KeyError, ValueError, sqlalchemy.exc.IntegrityError) as e:
+            print(f'Import failed, batches before the invalid row were imported: {e!r}')
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
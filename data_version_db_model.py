@@ -0,0 +1,55 @@
+from flask_misc import fl_sql
+
+# Bumped when offers are deactivated without inserting a newer offer of the same product and vendor, or deleted or
+# archived, i.e. by a change that readers can't detect from new rows in OFFERS
+OFFER_DEACTIVATIONS = 'offer_deactivations'
+# Bumped when price alert watches are added or deleted
+WATCHES = 'watches'
+
+
+class DataVersionDbModel(fl_sql.Model):
+    __tablename__ = 'DATA_VERSIONS'
+
+    name = fl_sql.Column(fl_sql.String(100), primary_key=True)
+    version = fl_sql.Column(fl_sql.Integer, nullable=False, default=0)
+
+    def __init__(self, name: str, version: int = 0):
+        """
+        DataVersionDbModel used for SQLAlchemy database; a row is a counter of changes of some data, used by
+        in-memory copies of the data in all processes to find out that they are stale
+
+        :param name: Name of the counter (str)
+        :param version: Current version (int)
+        """
+        self.name = name
+        self.version = version
+
+    def __repr__(self):
+        """
+        Return string representation of the DataVersionDbModel
+
+        :returns: - 'str' representing data version
+        """
+        return f'Data version name = {self.name}, version = {self.version}'
+
+    @classmethod
+    def bump(cls, name: str):
+        """
+        Increment version of the data as part of the current transaction (the caller commits)
+
+        :param name: Name of the counter (str)
+        """
+        updated = cls.query.filter_by(name=name).update({'version': cls.version + 1}, synchronize_session=False)
+        if not updated:
+            fl_sql.session.add(cls(name=name, version=1))
+
+    @classmethod
+    def get(cls, name: str) -> "int":
+        """
+        Get current version of the data
+
+        :param name: Name of the counter (str)
+        :returns: - 'int' representing the version, 0 if the data was never changed
+        """
+        version = fl_sql.session.query(cls.version).filter_by(name=name).scalar()
+        return version or 0
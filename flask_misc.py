@@ -1,7 +1,8 @@
-from flask_marshmallow import Marshmallow
+from typing import List, Optional
+
+from flask import request
 from flask_sqlalchemy import SQLAlchemy
 
-fl_mar = Marshmallow()
 fl_sql = SQLAlchemy()
 
 RESPONSE200 = 'Ok'
@@ -11,3 +12,24 @@ RESPONSE400 = 'Bad request'
 RESPONSE401 = 'Unauthorized access'
 RESPONSE403 = 'Forbidden access'
 RESPONSE500 = 'Unexpected DB error - multiple products with same product ID found'
+
+
+def fields_arg(model: dict) -> "Optional[List[str]]":
+    """
+    Parse fields query parameter of the current request - comma separated fields of the response model to return
+
+    :param model: Fields of the response model (dict)
+    :returns: - 'Optional[List[str]]' representing requested fields in the order of the request without duplicates
+                or None if all fields are requested
+    :raises ValueError: If a field is not in the model
+    """
+    requested = request.args.get('fields')
+    if requested is None:
+        return None
+    requested = list(dict.fromkeys(field.strip() for field in requested.split(',') if field.strip()))
+    unknown = set(requested) - model.keys()
+    if not requested:
+        raise ValueError(f'No fields requested, use some of {", ".join(model)}')
+    if unknown:
+        raise ValueError(f'Unknown fields {", ".join(sorted(unknown))}, use some of {", ".join(model)}')
+    return requested
@@ -0,0 +1,31 @@
+import multiprocessing
+from os import environ
+
+# Request workers scale across cores; each worker runs a poller supervisor, but only the one holding
+# the poller lease (see POLLER_LEASE) actually polls the offers microservice
+bind = f'0.0.0.0:{environ.get("PORT", 5000)}'
+workers = int(environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(environ.get('GUNICORN_THREADS', 4))
+timeout = int(environ.get('GUNICORN_TIMEOUT', 60))
+# time given to workers (and the poller running in one of them) to finish their work on shutdown
+graceful_timeout = int(environ.get('GUNICORN_GRACEFUL_TIMEOUT', 40))
+accesslog = '-'
+
+
+def on_starting(server):
+    # tables are created once in the master process, so that workers don't race on the first request
+    from wsgi import app
+    from main import init_db
+    init_db(app)
+
+
+def post_worker_init(worker):
+    from wsgi import app
+    from main import start_poller
+    start_poller(app)
+
+
+def worker_exit(server, worker):
+    from wsgi import app
+    from main import stop_poller
+    stop_poller(app)
@@ -0,0 +1,133 @@
+import threading
+import time
+from queue import Empty, Full, Queue
+from typing import Callable, Iterable, List, Optional
+
+from metrics import INGEST_BACKPRESSURE, INGEST_FLUSH_LATENCY, INGEST_FLUSH_SIZE, INGEST_QUEUE_DEPTH
+
+# Put to the queue by every fetcher when it runs out of products
+_FETCHER_DONE = object()
+
+
+class IngestionPipeline:
+    def __init__(self, fetch: Callable[[int], Optional[list]], write: Callable[[list, List[int]], int],
+                 fetch_workers: int = 4,
+                 queue_size: int = 256, batch_size: int = 1000, flush_interval: float = 0.5,
+                 should_stop: Callable[[], bool] = lambda: False):
+        """
+        Initialize IngestionPipeline - fetcher threads request offers of products and pass them through a bounded
+        queue to a single writer, which coalesces offers of many products into large transactions. When the writer
+        lags, the queue fills up and fetchers wait for it (backpressure)
+
+        :param fetch: Function returning offers of a product or None if they could not be fetched
+                      (Callable[[int], Optional[list]])
+        :param write: Function storing offers and reconciling products whose offers were fetched in a single
+                      transaction, returning number of stored offers (Callable[[list, List[int]], int])
+        :param fetch_workers: Number of fetcher threads (int)
+        :param queue_size: Maximum number of fetched products waiting for the writer (int)
+        :param batch_size: Number of offers that triggers a write (int)
+        :param flush_interval: Maximum time in seconds fetched offers wait for a write (float)
+        :param should_stop: Function telling fetchers to stop taking new products (Callable[[], bool])
+        """
+        self.fetch = fetch
+        self.write = write
+        self.fetch_workers = max(1, fetch_workers)
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.should_stop = should_stop
+
+    def run(self, product_ids: Iterable[int]) -> "int":
+        """
+        Fetch and store offers of all products. Writes run in the calling thread, so it must be within app context
+
+        :param product_ids: IDs of fetched products (Iterable[int])
+        :returns: - 'int' representing number of stored offers
+        """
+        queue = Queue(maxsize=self.queue_size)
+        abort = threading.Event()
+        products = iter(product_ids)
+        products_lock = threading.Lock()
+        fetchers = [threading.Thread(target=self._fetch_loop, args=(products, products_lock, queue, abort),
+                                     daemon=True, name=f'OffersFetcher-{i}') for i in range(self.fetch_workers)]
+        for fetcher in fetchers:
+            fetcher.start()
+        try:
+            return self._write_loop(queue)
+        finally:
+            # stops fetchers also when the writer failed
+            abort.set()
+            for fetcher in fetchers:
+                fetcher.join()
+            INGEST_QUEUE_DEPTH.set(value=0)
+
+    def _fetch_loop(self, products: Iterable[int], products_lock: threading.Lock, queue: Queue,
+                    abort: threading.Event):
+        try:
+            while not abort.is_set() and not self.should_stop():
+                with products_lock:
+                    product_id = next(products, None)
+                if product_id is None:
+                    break
+                try:
+                    offers = self.fetch(product_id)
+                except Exception as e:
+                    # a malformed response of one product must not stop the cycle
+                    print(f'Fetching offers of product {product_id} failed: {e!r}')
+                    continue
+                if offers is not None:
+                    # products without offers are passed as well, their stored offers are no longer active
+                    self._put(queue, (product_id, offers), abort)
+        finally:
+            self._put(queue, _FETCHER_DONE, abort)
+
+    @staticmethod
+    def _put(queue: Queue, item, abort: threading.Event):
+        try:
+            queue.put_nowait(item)
+            return
+        except Full:
+            pass
+        start = time.perf_counter()
+        while not abort.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                break
+            except Full:
+                continue
+        INGEST_BACKPRESSURE.inc(amount=time.perf_counter() - start)
+
+    def _write_loop(self, queue: Queue) -> "int":
+        inserted = 0
+        running = self.fetch_workers
+        pending: List = []
+        pending_products: List[int] = []
+        deadline = None
+        while running:
+            timeout = self.flush_interval if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = queue.get(timeout=timeout)
+            except Empty:
+                item = None
+            INGEST_QUEUE_DEPTH.set(value=queue.qsize())
+            if item is _FETCHER_DONE:
+                running -= 1
+            elif item is not None:
+                pending_products.append(item[0])
+                pending.extend(item[1])
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+            if pending_products and (len(pending) >= self.batch_size or time.monotonic() >= deadline):
+                inserted += self._flush(pending, pending_products)
+                pending, pending_products = [], []
+                deadline = None
+        if pending_products:
+            inserted += self._flush(pending, pending_products)
+        return inserted
+
+    def _flush(self, offers: list, product_ids: List[int]) -> "int":
+        start = time.perf_counter()
+        inserted = self.write(offers, product_ids)
+        INGEST_FLUSH_LATENCY.observe(time.perf_counter() - start)
+        INGEST_FLUSH_SIZE.observe(len(offers))
+        return inserted
@@ -1,56 +1,141 @@
 from flask import Flask, Blueprint, jsonify
 from flask_restx import Api
-from flask_misc import fl_sql, fl_mar
+from flask_misc import fl_sql
 from product_api import product_ns, products_ns, Product, ProductList
 from offer_api import offers_ns, OfferList, ActiveOfferList, VendorOfferList, ProductOfferList, \
-    ProductAndVendorOfferHistoryList
+    ProductAndVendorOfferHistoryList, ActiveVendorOfferList, ActiveProductOfferList, PriceComparisonList, \
+    VendorSummary, VendorSummaryList, BulkPriceHistoryList
 from marshmallow import ValidationError
-from offers_client import off_cli
+from offers_client import OffersClient
 from auth_api import auth_ns, RequestToken
+from watch_api import watches_ns, Watch, WatchList, AlertList
+from poller_lease import PollerSupervisor, create_lease
 from os import environ
-
-# Set up the application and API
-app = Flask(__name__)
-bluePrint = Blueprint('api', __name__, url_prefix='/api')
-api = Api(bluePrint, doc='/doc', title='Product API task',
-          description='Methods of the API are using token based authentication.')
-app.register_blueprint(bluePrint)
-
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///data.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['PROPAGATE_EXCEPTIONS'] = True
-
-# Add required namespaces to API
-api.add_namespace(product_ns)
-api.add_namespace(products_ns)
-api.add_namespace(offers_ns)
-api.add_namespace(auth_ns)
+import metrics
+import offer_analytics
+import offer_snapshot
+import profiling
+import response_cache
+import single_flight
+import poller_shards  # noqa: F401 - registers shard lag metrics and POLLER_MEMBERS table
 
 # Add resources to relevant namespace
 product_ns.add_resource(Product, '/<int:prod_id>')
 products_ns.add_resource(ProductList, '')
 offers_ns.add_resource(OfferList, '')
 offers_ns.add_resource(ActiveOfferList, '/active')
+offers_ns.add_resource(PriceComparisonList, '/comparison')
 offers_ns.add_resource(ProductOfferList, '/product/<int:prod_id>')
 offers_ns.add_resource(VendorOfferList, '/vendor/<int:vendor_id>')
+offers_ns.add_resource(ActiveProductOfferList, '/product/<int:prod_id>/active')
+offers_ns.add_resource(ActiveVendorOfferList, '/vendor/<int:vendor_id>/active')
+offers_ns.add_resource(VendorSummary, '/vendor/<int:vendor_id>/summary')
+offers_ns.add_resource(VendorSummaryList, '/vendors/summary')
+offers_ns.add_resource(BulkPriceHistoryList, '/history')
 offers_ns.add_resource(ProductAndVendorOfferHistoryList, '/product/<int:prod_id>/vendor/<int:vendor_id>')
+watches_ns.add_resource(WatchList, '')
+watches_ns.add_resource(AlertList, '/alerts')
+watches_ns.add_resource(Watch, '/<int:watch_id>')
 auth_ns.add_resource(RequestToken, '')
 
 
-@app.before_first_request
-def create_tables():
-    fl_sql.create_all()
+def create_app(config: dict = None) -> "Flask":
+    """
+    Create and configure the application (without starting the offers poller)
 
+    :param config: Values overriding default configuration (dict)
+    :returns: - 'Flask' representing the application
+    """
+    # Set up the application and API
+    app = Flask(__name__)
+    blueprint = Blueprint('api', __name__, url_prefix='/api')
+    api = Api(blueprint, doc='/doc', title='Product API task',
+              description='Methods of the API are using token based authentication.')
+    app.register_blueprint(blueprint)
 
-@api.errorhandler(ValidationError)
-def handle_validation_error(error):
-    return jsonify(error.messages), 400
+    app.config['SQLALCHEMY_DATABASE_URI'] = environ.get('DATABASE_URI', 'sqlite:///data.db')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['PROPAGATE_EXCEPTIONS'] = True
+    app.config.update(config or {})
+    metrics.init_app(app)
+    profiling.init_app(app)
+    offer_snapshot.init_app(app)
+    offer_analytics.init_app(app)
+    single_flight.init_app(app)
+    response_cache.init_app(app)
 
+    # Add required namespaces to API
+    api.add_namespace(product_ns)
+    api.add_namespace(products_ns)
+    api.add_namespace(offers_ns)
+    api.add_namespace(watches_ns)
+    api.add_namespace(auth_ns)
+
+    @app.before_first_request
+    def create_tables():
+        fl_sql.create_all()
+
+    @api.errorhandler(ValidationError)
+    def handle_validation_error(error):
+        return jsonify(error.messages), 400
 
-if __name__ == '__main__':
     fl_sql.init_app(app)
-    fl_mar.init_app(app)
-    off_cli.define_app_context(app)
-    off_cli.start()
-    app.run(port=environ.get("PORT", 5000), debug=False, host='0.0.0.0')
-    off_cli.exit_loop = True
+    return app
+
+
+def init_db(app: Flask):
+    """
+    Create missing DB tables and indexes
+
+    :param app: Application whose DB is initialized (Flask)
+    """
+    with app.app_context():
+        fl_sql.create_all()
+        # create_all() skips indexes added to already existing tables
+        engine = fl_sql.get_engine(app)
+        for table in fl_sql.Model.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=engine, checkfirst=True)
+        # connections must not be shared with processes forked later (e.g. gunicorn workers)
+        fl_sql.get_engine(app).dispose()
+
+
+def start_poller(app: Flask, lease_kind: str = None) -> "PollerSupervisor":
+    """
+    Start supervisor of the offers poller. The poller runs only in the process holding the lease selected
+    by POLLER_LEASE environment variable ('file' for single host, 'db' for multiple hosts, 'none' to disable)
+
+    :param app: App used as context of the poller (Flask)
+    :param lease_kind: Kind of the lease, overrides POLLER_LEASE (str)
+    :returns: - 'PollerSupervisor' representing started supervisor or None if the poller is disabled
+    """
+    lease_kind = lease_kind or environ.get('POLLER_LEASE', 'file')
+    if lease_kind == 'none':
+        return None
+    supervisor = PollerSupervisor(app, create_lease(app, lease_kind), OffersClient,
+                                  interval=float(environ.get('POLLER_LEASE_INTERVAL', 5)))
+    app.extensions['poller_supervisor'] = supervisor
+    supervisor.start()
+    return supervisor
+
+
+def stop_poller(app: Flask):
+    """
+    Stop the offers poller gracefully (the poller finishes its current product and releases the lease)
+
+    :param app: App whose poller is stopped (Flask)
+    """
+    supervisor = app.extensions.pop('poller_supervisor', None)
+    if supervisor is not None:
+        supervisor.stop()
+
+
+if __name__ == '__main__':
+    # development server; use gunicorn with gunicorn.conf.py in production
+    app = create_app()
+    init_db(app)
+    start_poller(app)
+    try:
+        app.run(port=environ.get("PORT", 5000), debug=False, host='0.0.0.0')
+    finally:
+        stop_poller(app)
@@ -0,0 +1,349 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from flask import Flask, Response, current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Buckets (in seconds) suitable for both fast in-memory handlers and slow upstream calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100, 250)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _format_labels(label_names: Tuple[str, ...], label_values: tuple, extra: str = '') -> "str":
+    """
+    Format labels in Prometheus text exposition format
+
+    :param label_names: Names of the labels (Tuple[str])
+    :param label_values: Values of the labels (tuple)
+    :param extra: Already formatted extra label, e.g. le="0.1" (str)
+    :returns: - 'str' representing formatted labels (empty if there are none)
+    """
+    parts = [f'{name}="{str(value)}"' for name, value in zip(label_names, label_values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, label_names: Iterable[str] = ()):
+        """
+        Base class of all metrics kept by the Registry
+
+        :param name: Name of the metric (str)
+        :param documentation: Help text of the metric (str)
+        :param label_names: Names of the labels of the metric (Iterable[str])
+        """
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def render(self) -> "List[str]":
+        """
+        Render the metric in Prometheus text exposition format
+
+        :returns: - 'List[str]' representing rendered lines
+        """
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}'] + self._samples()
+
+    def _samples(self) -> "List[str]":
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, label_names: Iterable[str] = ()):
+        super().__init__(name, documentation, label_names)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, *label_values, amount: float = 1):
+        """
+        Increase counter
+
+        :param label_values: Values of the labels in order of label names
+        :param amount: Amount added to the counter (float)
+        """
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values) -> "float":
+        """
+        Get current value of the counter
+
+        :param label_values: Values of the labels in order of label names
+        :returns: - 'float' representing current value
+        """
+        return self._values.get(label_values, 0)
+
+    def _samples(self) -> "List[str]":
+        with self._lock:
+            items = list(self._values.items())
+        return [f'{self.name}{_format_labels(self.label_names, labels)} {value}' for labels, value in items]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, *label_values, value: float):
+        """
+        Set gauge to given value
+
+        :param label_values: Values of the labels in order of label names
+        :param value: New value of the gauge (float)
+        """
+        with self._lock:
+            self._values[label_values] = value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, label_names: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._values: Dict[tuple, list] = {}
+
+    def observe(self, value: float, *label_values):
+        """
+        Observe single value
+
+        :param value: Observed value (float)
+        :param label_values: Values of the labels in order of label names
+        """
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        with self._lock:
+            state = self._values.get(label_values)
+            if state is None:
+                state = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def count(self, *label_values) -> "int":
+        """
+        Get number of observations
+
+        :param label_values: Values of the labels in order of label names
+        :returns: - 'int' representing number of observations
+        """
+        state = self._values.get(label_values)
+        return 0 if state is None else state[2]
+
+    def _samples(self) -> "List[str]":
+        with self._lock:
+            items = [(labels, list(state[0]), state[1], state[2]) for labels, state in self._values.items()]
+        lines = []
+        for labels, bucket_counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), bucket_counts):
+                cumulative += bucket_count
+                le = 'le="+Inf"' if bound == float('inf') else f'le="{bound}"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.label_names, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.label_names, labels)} {total}')
+            lines.append(f'{self.name}_count{_format_labels(self.label_names, labels)} {count}')
+        return lines
+
+
+class CallbackGauge(Metric):
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, label_names: Iterable[str], callback: Callable):
+        """
+        Initialize CallbackGauge whose values are collected by a callback at render time (e.g. from the DB)
+
+        :param name: Name of the metric (str)
+        :param documentation: Help text of the metric (str)
+        :param label_names: Names of the labels of the metric (Iterable[str])
+        :param callback: Function returning list of (label values, value) pairs (Callable)
+        """
+        super().__init__(name, documentation, label_names)
+        self.callback = callback
+
+    def _samples(self) -> "List[str]":
+        try:
+            items = self.callback()
+        except Exception as e:
+            # one broken collector must not break the whole /metrics endpoint
+            print(f'Collecting metric {self.name} failed: {e!r}')
+            return []
+        return [f'{self.name}{_format_labels(self.label_names, labels)} {value}' for labels, value in items]
+
+
+class Registry:
+    def __init__(self):
+        """
+        Initialize Registry holding all metrics exposed by /metrics endpoint
+        """
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> "Metric":
+        """
+        Register metric; registering metric with already used name returns the existing metric
+
+        :param metric: Metric to be registered (Metric)
+        :returns: - 'Metric' representing registered metric
+        """
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def render(self) -> "str":
+        """
+        Render all registered metrics in Prometheus text exposition format
+
+        :returns: - 'str' representing all metrics
+        """
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+REQUEST_LATENCY = REGISTRY.register(Histogram('api_request_duration_seconds', 'Latency of API requests',
+                                              ('resource', 'method')))
+REQUEST_COUNT = REGISTRY.register(Counter('api_requests_total', 'Number of API requests',
+                                          ('resource', 'method', 'status')))
+REQUEST_DB_QUERIES = REGISTRY.register(Histogram('api_request_db_queries', 'Number of DB queries per API request',
+                                                 ('resource',), buckets=COUNT_BUCKETS))
+REQUEST_DB_TIME = REGISTRY.register(Histogram('api_request_db_duration_seconds', 'DB time per API request',
+                                              ('resource',)))
+PHASE_LATENCY = REGISTRY.register(Histogram('api_phase_duration_seconds',
+                                            'Duration of request phases (query, serialize, ...)',
+                                            ('resource', 'phase')))
+SINGLE_FLIGHT_REQUESTS = REGISTRY.register(Counter('api_single_flight_requests_total',
+                                                   'List requests by whether they computed the response, shared '
+                                                   'the response of an identical request in flight or timed out '
+                                                   'waiting for it', ('resource', 'result')))
+DB_QUERIES = REGISTRY.register(Counter('db_queries_total', 'Number of executed DB queries'))
+DB_TIME = REGISTRY.register(Counter('db_query_duration_seconds_total', 'Total time spent executing DB queries'))
+POLLER_CYCLE = REGISTRY.register(Histogram('poller_cycle_duration_seconds', 'Duration of a single poller cycle',
+                                           buckets=DEFAULT_BUCKETS + (30.0, 60.0, 120.0, 300.0)))
+UPSTREAM_LATENCY = REGISTRY.register(Histogram('upstream_request_duration_seconds',
+                                               'Latency of requests to offers microservice', ('operation',)))
+UPSTREAM_ERRORS = REGISTRY.register(Counter('upstream_errors_total', 'Failed requests to offers microservice',
+                                            ('operation', 'reason')))
+OFFERS_INGESTED = REGISTRY.register(Counter('offers_ingested_total', 'Offers stored by the poller'))
+OFFERS_DEACTIVATED = REGISTRY.register(Counter('offers_deactivated_total',
+                                               'Active offers deactivated by the poller as missing or out of stock'))
+INGEST_QUEUE_DEPTH = REGISTRY.register(Gauge('poller_ingest_queue_depth',
+                                             'Number of fetched products waiting for the DB writer of the poller'))
+INGEST_BACKPRESSURE = REGISTRY.register(Counter('poller_ingest_backpressure_seconds_total',
+                                                'Time fetchers of the poller waited for space in the ingest queue'))
+INGEST_FLUSH_LATENCY = REGISTRY.register(Histogram('poller_ingest_flush_duration_seconds',
+                                                   'Duration of a coalesced DB write of fetched offers'))
+INGEST_FLUSH_SIZE = REGISTRY.register(Histogram('poller_ingest_flush_offers', 'Number of offers per coalesced DB write',
+                                                buckets=(1, 10, 50, 100, 250, 500, 1000, 2500, 5000, 10000)))
+
+# endpoint -> resource class name, so that the lookup is done only once per endpoint
+_resource_names: Dict[str, str] = {}
+_engine_events_registered = False
+
+
+def resource_name() -> "str":
+    """
+    Get name of the resource class handling current request
+
+    :returns: - 'str' representing resource class name (e.g. 'OfferList')
+    """
+    if not has_request_context():
+        return 'none'
+    name = g.get('metrics_resource')
+    if name is not None:
+        return name
+    endpoint = request.endpoint
+    if endpoint is None:
+        return 'unmatched'
+    name = _resource_names.get(endpoint)
+    if name is None:
+        view = current_app.view_functions.get(endpoint)
+        name = getattr(getattr(view, 'view_class', None), '__name__', endpoint)
+        _resource_names[endpoint] = name
+    g.metrics_resource = name
+    return name
+
+
+@contextmanager
+def phase(name: str):
+    """
+    Measure duration of a request phase (e.g. 'query' or 'serialize')
+
+    :param name: Name of the phase (str)
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        PHASE_LATENCY.observe(duration, resource_name(), name)
+        if has_request_context():
+            phases = g.setdefault('metrics_phases', {})
+            phases[name] = phases.get(name, 0.0) + duration
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - conn.info['metrics_query_start'].pop()
+    DB_QUERIES.inc()
+    DB_TIME.inc(amount=duration)
+    if has_request_context():
+        g.metrics_db_queries = g.get('metrics_db_queries', 0) + 1
+        g.metrics_db_time = g.get('metrics_db_time', 0.0) + duration
+
+
+def _before_request():
+    g.metrics_start = time.perf_counter()
+
+
+def _after_request(response: Response) -> "Response":
+    start = g.get('metrics_start')
+    if start is None or request.endpoint == 'metrics':
+        return response
+    resource = resource_name()
+    REQUEST_LATENCY.observe(time.perf_counter() - start, resource, request.method)
+    REQUEST_COUNT.inc(resource, request.method, response.status_code)
+    REQUEST_DB_QUERIES.observe(g.get('metrics_db_queries', 0), resource)
+    REQUEST_DB_TIME.observe(g.get('metrics_db_time', 0.0), resource)
+    return response
+
+
+def metrics_view() -> "Response":
+    """
+    Expose all metrics in Prometheus text exposition format
+
+    :returns: - 'Response' containing rendered metrics
+    """
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+
+def init_app(app: Flask):
+    """
+    Register request hooks, SQLAlchemy event hooks and /metrics endpoint
+
+    :param app: Instrumented application (Flask)
+    """
+    global _engine_events_registered
+    if not _engine_events_registered:
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        _engine_events_registered = True
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
@@ -0,0 +1,169 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from itertools import groupby
+from os import environ
+from statistics import median
+from typing import Any, Callable, Hashable, Iterable, Iterator, List, Tuple
+
+from flask import Flask, current_app
+
+from offer_db_model import OfferDbModel
+from offer_snapshot import OfferSnapshot
+
+COMPARISON_SORT_KEYS = ('spread', 'spread_pct', 'min_price', 'max_price', 'median_price', 'vendors', 'prod_id')
+
+
+def active_prices(snapshot: OfferSnapshot = None, prod_ids: List[int] = None) \
+        -> "Iterator[Tuple[int, List[Tuple[int, int]]]]":
+    """
+    Get prices of active offers grouped by product, from the snapshot of active offers if available or from the DB
+
+    :param snapshot: Up to date snapshot of active offers (OfferSnapshot)
+    :param prod_ids: Only these products if provided (List[int])
+    :returns: - 'Iterator[Tuple[int, List[Tuple[int, int]]]]' representing product ID and (price, vendor ID) pairs
+    """
+    if snapshot is not None:
+        return snapshot.prices_by_product(prod_ids)
+    rows = OfferDbModel.find_active_prices(prod_ids)
+    return ((prod_id, [(price, vendor_id) for _, vendor_id, price in group])
+            for prod_id, group in groupby(rows, key=lambda row: row[0]))
+
+
+def price_stats(prod_id: int, offers: List[Tuple[int, int]]) -> "dict":
+    """
+    Calculate price spread of a product across vendors
+
+    :param prod_id: Product ID (int)
+    :param offers: Price and vendor ID of active offers of the product, in the order of their creation
+                   (List[Tuple[int, int]])
+    :returns: - 'dict' representing min, max and median price, spread, number of vendors and the cheapest vendor
+    """
+    prices = sorted(price for price, _ in offers)
+    min_price, max_price = prices[0], prices[-1]
+    cheapest_vendor = next(vendor_id for price, vendor_id in offers if price == min_price)
+    return {'prod_id': prod_id, 'min_price': min_price, 'max_price': max_price, 'median_price': median(prices),
+            'spread': max_price - min_price,
+            'spread_pct': (max_price - min_price) / min_price * 100 if min_price else 0.0,
+            'vendors': len({vendor_id for _, vendor_id in offers}), 'cheapest_vendor_id': cheapest_vendor}
+
+
+def price_comparison(prices: Iterable[Tuple[int, List[Tuple[int, int]]]], sort: str = 'spread',
+                     descending: bool = True) -> "List[dict]":
+    """
+    Calculate price spread of products across vendors in one pass over active offers
+
+    :param prices: Product ID and (price, vendor ID) pairs of its active offers (Iterable[Tuple[int, List]])
+    :param sort: Key the result is sorted by, one of COMPARISON_SORT_KEYS (str)
+    :param descending: Sort in descending order (bool)
+    :returns: - 'List[dict]' representing price statistics of products having at least one active offer
+    :raises ValueError: If the sort key is not supported
+    """
+    if sort not in COMPARISON_SORT_KEYS:
+        raise ValueError(f'Unsupported sort key {sort}, use one of {", ".join(COMPARISON_SORT_KEYS)}')
+    stats = [price_stats(prod_id, offers) for prod_id, offers in prices if offers]
+    # ties are ordered by product ID in both directions, so that pages are stable
+    stats.sort(key=lambda item: item['prod_id'])
+    stats.sort(key=lambda item: item[sort], reverse=descending)
+    return stats
+
+
+class VersionedCache:
+    def __init__(self, ttl: float, max_entries: int = 1024):
+        """
+        Initialize VersionedCache - cache of computed values that are dropped when the data they were computed from
+        changes (its version differs) or after ttl seconds
+
+        :param ttl: Maximum age of cached values in seconds (float)
+        :param max_entries: Maximum number of cached values, the oldest are dropped first (int)
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key: Hashable, version: Hashable, compute: Callable) -> "Any":
+        """
+        Get cached value or compute and cache it
+
+        :param key: Key of the value (Hashable)
+        :param version: Current version of the data (Hashable)
+        :param compute: Function computing the value (Callable)
+        :returns: - 'Any' representing the value
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and entry[0] == version and entry[1] > now:
+            return entry[2]
+        value = compute()
+        with self._lock:
+            self._entries[key] = (version, now + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        """
+        Drop all cached values
+        """
+        with self._lock:
+            self._entries.clear()
+
+
+def vendor_summaries(window_hours: float, vendor_id: int = None) -> "List[dict]":
+    """
+    Summarize offers of vendors - active offers, stock, prices relative to the lowest price of the same products and
+    frequency of offer and price changes within the window. Must be called within app context
+
+    :param window_hours: Length of the window of offer changes in hours (float)
+    :param vendor_id: Only this vendor if provided (int)
+    :returns: - 'List[dict]' representing summaries ordered by vendor ID
+    """
+    since = datetime.now() - timedelta(hours=window_hours)
+    summaries = {}
+    for vendor, offers, stock, avg_price, avg_ratio in OfferDbModel.vendor_active_aggregates(vendor_id):
+        # no ratio if the lowest price of all products of the vendor is 0
+        summaries[vendor] = {'vendor_id': vendor, 'active_offers': offers, 'total_stock': stock, 'avg_price': avg_price,
+                             'avg_price_vs_market_min_pct': None if avg_ratio is None else (avg_ratio - 1) * 100,
+                             'offer_updates': 0, 'price_changes': 0, 'price_changes_per_offer_per_day': 0.0}
+    for vendor, updates, price_changes in OfferDbModel.vendor_changes_since(since, vendor_id):
+        summary = summaries.get(vendor)
+        if summary is None:
+            # vendor without active offers, e.g. out of stock everywhere
+            summary = summaries[vendor] = {'vendor_id': vendor, 'active_offers': 0, 'total_stock': 0,
+                                           'avg_price': None, 'avg_price_vs_market_min_pct': None}
+        summary['offer_updates'] = updates
+        summary['price_changes'] = price_changes
+        summary['price_changes_per_offer_per_day'] = \
+            price_changes / max(summary['active_offers'], 1) / (window_hours / 24)
+    return [summaries[vendor] for vendor in sorted(summaries)]
+
+
+def cached_vendor_summaries(window_hours: float, vendor_id: int = None) -> "List[dict]":
+    """
+    Get vendor summaries from the cache of the current app, recomputing them when offers were ingested or deactivated
+    since they were cached
+
+    :param window_hours: Length of the window of offer changes in hours (float)
+    :param vendor_id: Only this vendor if provided (int)
+    :returns: - 'List[dict]' representing summaries ordered by vendor ID
+    """
+    cache = current_app.extensions.get('vendor_summary_cache')
+    if cache is None:
+        return vendor_summaries(window_hours, vendor_id)
+    return cache.get_or_compute((window_hours, vendor_id), OfferDbModel.data_version(),
+                                lambda: vendor_summaries(window_hours, vendor_id))
+
+
+def init_app(app: Flask, cache: VersionedCache = None):
+    """
+    Register cache of vendor summaries; cached summaries expire after VENDOR_SUMMARY_TTL seconds (60 by default),
+    so that the window of changes moves even when no offers are ingested
+
+    :param app: Application (Flask)
+    :param cache: Cache to register, created with default settings if not provided (VersionedCache)
+    """
+    app.extensions['vendor_summary_cache'] = cache or VersionedCache(float(environ.get('VENDOR_SUMMARY_TTL', 60)))
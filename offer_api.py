@@ -1,14 +1,30 @@
 import json
-from flask import request
+from datetime import datetime
+from itertools import groupby
+from operator import itemgetter
+from functools import lru_cache
+from typing import Callable, List, Optional, Tuple
+from flask import Response, current_app, request, stream_with_context
 from flask_restx import Resource, fields, Namespace
-from offer_db_model import OfferDbModel
+from offer_db_model import OfferDbModel, DATE_FORMAT
 from offer_db_schema import OfferDbSchema
+from price_series_db_model import PriceSeriesDbModel, series_enabled
 from auth_api import evaluate_token
-from flask_misc import RESPONSE200, RESPONSE401, RESPONSE403
+from flask_misc import RESPONSE200, RESPONSE400, RESPONSE401, RESPONSE403, fields_arg
+from metrics import phase
+from offer_snapshot import get_snapshot
+from offer_analytics import COMPARISON_SORT_KEYS, active_prices, cached_vendor_summaries, price_comparison
+from response_cache import CachedResponse
+from single_flight import shared
 
 # Define namespace and relevant models
 offers_ns = Namespace('offers', description='Offers related operations')
 offer_list_schema = OfferDbSchema(many=True)
+DEFAULT_PER_PAGE = 100
+MAX_PER_PAGE = 1000
+DEFAULT_WINDOW_HOURS = 24
+MAX_WINDOW_HOURS = 24 * 365
+MAX_HISTORY_PAIRS = 1000
 offer_body_res = {'internal_id': fields.Integer('Offer ID'), 'vendor_id': fields.Integer('Vendor ID'),
                   'price': fields.Integer('Offer price'), 'items_in_stock': fields.Integer('Number of available items'),
                   'active': fields.Boolean('Is offer active?'),
@@ -22,16 +38,152 @@ price_history_body = {'prod_id': fields.Integer('Product ID'), 'vendor_id': fiel
                                                                                       'date_created')})))}
 date_interval_body = {'date_start': fields.DateTime('Start of the date interval'),
                       'date_end': fields.DateTime('End of the date interval')}
+price_comparison_body = {'prod_id': fields.Integer('Product ID'), 'min_price': fields.Integer('Lowest price'),
+                         'max_price': fields.Integer('Highest price'), 'median_price': fields.Float('Median price'),
+                         'spread': fields.Integer('Difference between highest and lowest price'),
+                         'spread_pct': fields.Float('Spread as a percentage of the lowest price'),
+                         'vendors': fields.Integer('Number of vendors with an active offer'),
+                         'cheapest_vendor_id': fields.Integer('ID of the vendor offering the lowest price')}
 offer_model_res = offers_ns.model(name='Offer', model=offer_body_res)
+FIELDS_DOC = f'Comma separated fields of offers to return, some of {", ".join(offer_body_res)}'
+bulk_history_item = offers_ns.model(name='BulkHistoryItem', model={
+    'pairs': fields.List(fields.Nested(offers_ns.model(name='ProductAndVendor', model={
+        'prod_id': fields.Integer('Product ID'), 'vendor_id': fields.Integer('Vendor ID')}))),
+    'prod_id': fields.Integer('Product ID, histories of all its vendors are returned if pairs are not provided'),
+    **date_interval_body})
+vendor_summary_body = {'vendor_id': fields.Integer('Vendor ID'),
+                       'active_offers': fields.Integer('Number of active offers'),
+                       'total_stock': fields.Integer('Number of items in stock in active offers'),
+                       'avg_price': fields.Float('Average price of active offers'),
+                       'avg_price_vs_market_min_pct': fields.Float(
+                           'Average percentage by which prices exceed the lowest price of the same product, '
+                           'products whose lowest price is 0 are skipped'),
+                       'offer_updates': fields.Integer('Number of new offers (price or stock changes) in the window'),
+                       'price_changes': fields.Integer('Number of price changes in the window'),
+                       'price_changes_per_offer_per_day': fields.Float('Price changes per active offer and day')}
+vendor_summary_model = offers_ns.model(name='VendorSummary', model=vendor_summary_body)
+vendor_summary_page_model = offers_ns.model(name='VendorSummaryPage', model={
+    'items': fields.List(fields.Nested(vendor_summary_model)), 'page': fields.Integer('Page number'),
+    'per_page': fields.Integer('Items per page'), 'total': fields.Integer('Number of vendors')})
+price_comparison_page_model = offers_ns.model(name='PriceComparisonPage', model={
+    'items': fields.List(fields.Nested(offers_ns.model(name='PriceComparison', model=price_comparison_body))),
+    'page': fields.Integer('Page number'), 'per_page': fields.Integer('Items per page'),
+    'total': fields.Integer('Number of compared products')})
 price_history_model = offers_ns.model(name='PriceHistoryId', model=price_history_body)
 date_interval_item = offers_ns.model(name='DateIntervalItem', model=date_interval_body)
 
 
+def page_args() -> "(int, int)":
+    """
+    Parse pagination query parameters of the current request
+
+    :returns: - '(int, int)' representing page number and number of items per page
+    :raises ValueError: If the parameters are invalid
+    """
+    page = int(request.args.get('page', 1))
+    per_page = int(request.args.get('per_page', DEFAULT_PER_PAGE))
+    if page < 1 or not 1 <= per_page <= MAX_PER_PAGE:
+        raise ValueError('Invalid page or per_page parameter')
+    return page, per_page
+
+
+def paginate(items: list, page: int, per_page: int) -> "dict":
+    """
+    Get a page of items
+
+    :param items: All items (list)
+    :param page: Page number starting at 1 (int)
+    :param per_page: Number of items per page (int)
+    :returns: - 'dict' representing items of the page, page number, items per page and total number of items
+    """
+    start = (page - 1) * per_page
+    return {'items': items[start:start + per_page], 'page': page, 'per_page': per_page, 'total': len(items)}
+
+
+def window_hours_arg() -> "float":
+    """
+    Parse window_hours query parameter of the current request
+
+    :returns: - 'float' representing length of the window in hours
+    :raises ValueError: If the parameter is invalid
+    """
+    window_hours = float(request.args.get('window_hours', DEFAULT_WINDOW_HOURS))
+    if not 0 < window_hours <= MAX_WINDOW_HOURS:
+        raise ValueError(f'window_hours must be between 0 and {MAX_WINDOW_HOURS}')
+    return window_hours
+
+
+@lru_cache(maxsize=None)
+def _offer_list_schema(columns: Tuple[str, ...]) -> "OfferDbSchema":
+    return OfferDbSchema(many=True, only=columns)
+
+
+def dump_offers(offer_list: list, columns: List[str] = None) -> "List[dict]":
+    """
+    Serialize offers, or rows of their selected columns
+
+    :param offer_list: Offers or rows of the columns (list)
+    :param columns: Selected columns, all if not provided (List[str])
+    :returns: - 'List[dict]' representing offers in the format of OfferDbSchema limited to the columns
+    """
+    if columns is None:
+        return offer_list_schema.dump(offer_list)
+    # the schema doesn't keep the order of the fields, one schema serves all orders
+    return project(_offer_list_schema(tuple(sorted(columns))).dump([row._asdict() for row in offer_list]), columns)
+
+
+def project(offers: List[dict], columns: List[str] = None) -> "List[dict]":
+    """
+    Limit serialized offers to given fields
+
+    :param offers: Offers in the format of OfferDbSchema (List[dict])
+    :param columns: Kept fields, all if not provided (List[str])
+    :returns: - 'List[dict]' representing offers with the fields
+    """
+    if columns is None:
+        return offers
+    return [{column: offer[column] for column in columns} for offer in offers]
+
+
+def shared_offer_list(load: Callable[[tuple], list], columns: Optional[List[str]], rebuild: bool = False) \
+        -> "Response":
+    """
+    Respond with a list of offers from the cache of pre-serialized responses, or compute it letting concurrent
+    identical requests share one query and serialization. Requests are identical if they have the same endpoint,
+    path parameters, requested fields and version of offer data; other query parameters are ignored
+
+    :param load: Function of the version of offer data returning offers in the format of OfferDbSchema, a snapshot
+                 it reads must cover the version (Callable[[tuple], list])
+    :param columns: Requested fields as parsed by fields_arg, None for all fields (Optional[List[str]])
+    :param rebuild: Rebuild the cached response in the background after offers are ingested (bool)
+    :returns: - 'Response' representing json list of offers
+    """
+    key = (request.endpoint, tuple(sorted(request.view_args.items())), None if columns is None else tuple(columns))
+    version = OfferDbModel.data_version()
+    cache = current_app.extensions.get('response_cache')
+    cached = cache.get(key, version) if cache is not None else None
+    if cached is not None:
+        return cached.response()
+
+    def build(build_version: tuple) -> "CachedResponse":
+        # the version is read before the query, so the response is never older than its version
+        offer_list = load(build_version)
+        with phase('serialize'):
+            return CachedResponse(build_version, json.dumps(offer_list).encode())
+
+    cached = shared(key + (version,), lambda: build(version))
+    if cache is not None:
+        cache.put(key, cached, (lambda: build(OfferDbModel.data_version())) if rebuild else None)
+    return cached.response()
+
+
 # Define resource classes to be registered to namespace
 class OfferList(Resource):
     @staticmethod
+    @offers_ns.param('fields', FIELDS_DOC)
     @offers_ns.doc('Get all offers')
     @offers_ns.response(200, RESPONSE200, [offer_model_res])
+    @offers_ns.response(400, RESPONSE400)
     @offers_ns.response(401, RESPONSE401)
     @offers_ns.response(403, RESPONSE403)
     def get() -> "(str, int)":
@@ -45,14 +197,26 @@ class OfferList(Resource):
         msg, auth_check = evaluate_token(request.headers.get('Bearer'))
         if auth_check != 200:
             return {'message': msg}, auth_check
-        offer_list = OfferDbModel.find_all()
-        return offer_list_schema.dump(offer_list), 200
+        try:
+            columns = fields_arg(offer_body_res)
+        except ValueError as e:
+            return {'message': f'{RESPONSE400} - {e}'}, 400
+
+        def load(data_version: tuple) -> "list":
+            with phase('query'):
+                offer_list = OfferDbModel.find_all(columns)
+            with phase('serialize'):
+                return dump_offers(offer_list, columns)
+
+        return shared_offer_list(load, columns)
 
 
 class ActiveOfferList(Resource):
     @staticmethod
+    @offers_ns.param('fields', FIELDS_DOC)
     @offers_ns.doc('Get all active offers')
     @offers_ns.response(200, RESPONSE200, [offer_model_res])
+    @offers_ns.response(400, RESPONSE400)
     @offers_ns.response(401, RESPONSE401)
     @offers_ns.response(403, RESPONSE403)
     def get() -> "(str, int)":
@@ -66,14 +230,29 @@ class ActiveOfferList(Resource):
         msg, auth_check = evaluate_token(request.headers.get('Bearer'))
         if auth_check != 200:
             return {'message': msg}, auth_check
-        offer_list = OfferDbModel.find_all_active()
-        return offer_list_schema.dump(offer_list), 200
+        try:
+            columns = fields_arg(offer_body_res)
+        except ValueError as e:
+            return {'message': f'{RESPONSE400} - {e}'}, 400
+
+        def load(data_version: tuple) -> "list":
+            with phase('query'):
+                snapshot = get_snapshot(data_version)
+                offer_list = OfferDbModel.find_all_active(columns) if snapshot is None else None
+            with phase('serialize'):
+                if snapshot is not None:
+                    return project(snapshot.active(), columns)
+                return dump_offers(offer_list, columns)
+
+        return shared_offer_list(load, columns, rebuild=True)
 
 
 class VendorOfferList(Resource):
     @staticmethod
+    @offers_ns.param('fields', FIELDS_DOC)
     @offers_ns.doc('Get all offers by vendor ID')
     @offers_ns.response(200, RESPONSE200, [offer_model_res])
+    @offers_ns.response(400, RESPONSE400)
     @offers_ns.response(401, RESPONSE401)
     @offers_ns.response(403, RESPONSE403)
     def get(vendor_id: int) -> "(str, int)":
@@ -88,14 +267,26 @@ class VendorOfferList(Resource):
         msg, auth_check = evaluate_token(request.headers.get('Bearer'))
         if auth_check != 200:
             return {'message': msg}, auth_check
-        offer_list = OfferDbModel.find_by_vendor_id(vendor_id)
-        return offer_list_schema.dump(offer_list), 200
+        try:
+            columns = fields_arg(offer_body_res)
+        except ValueError as e:
+            return {'message': f'{RESPONSE400} - {e}'}, 400
+
+        def load(data_version: tuple) -> "list":
+            with phase('query'):
+                offer_list = OfferDbModel.find_by_vendor_id(vendor_id, columns)
+            with phase('serialize'):
+                return dump_offers(offer_list, columns)
+
+        return shared_offer_list(load, columns)
 
 
 class ProductOfferList(Resource):
     @staticmethod
+    @offers_ns.param('fields', FIELDS_DOC)
     @offers_ns.doc('Get all offers by product ID')
     @offers_ns.response(200, RESPONSE200, [offer_model_res])
+    @offers_ns.response(400, RESPONSE400)
     @offers_ns.response(401, RESPONSE401)
     @offers_ns.response(403, RESPONSE403)
     def get(prod_id: int) -> "(str, int)":
@@ -110,8 +301,192 @@ class ProductOfferList(Resource):
         msg, auth_check = evaluate_token(request.headers.get('Bearer'))
         if auth_check != 200:
             return {'message': msg}, auth_check
-        offer_list = OfferDbModel.find_by_prod_id(prod_id)
-        return offer_list_schema.dump(offer_list), 200
+        try:
+            columns = fields_arg(offer_body_res)
+        except ValueError as e:
+            return {'message': f'{RESPONSE400} - {e}'}, 400
+
+        def load(data_version: tuple) -> "list":
+            with phase('query'):
+                offer_list = OfferDbModel.find_by_prod_id(prod_id, columns)
+            with phase('serialize'):
+                return dump_offers(offer_list, columns)
+
+        return shared_offer_list(load, columns)
+
+
+class ActiveVendorOfferList(Resource):
+    @staticmethod
+    @offers_ns.param('fields', FIELDS_DOC)
+    @offers_ns.doc('Get active offers by vendor ID')
+    @offers_ns.response(200, RESPONSE200, [offer_model_res])
+    @offers_ns.response(400, RESPONSE400)
+    @offers_ns.response(401, RESPONSE401)
+    @offers_ns.response(403, RESPONSE403)
+    def get(vendor_id: int) -> "(str, int)":
+        """
+        Get list of active offers for given vendor ID
+
+        :param vendor_id: Vendor ID used for searching offers (int)
+        :returns:
+            - info - 'str' json containing list of offers or 'message' info if not successful
+            - sc - 'int' representing HTTP status code
+        """
+        msg, auth_check = evaluate_token(request.headers.get('Bearer'))
+        if auth_check != 200:
+            return {'message': msg}, auth_check
+        try:
+            columns = fields_arg(offer_body_res)
+        except ValueError as e:
+            return {'message': f'{RESPONSE400} - {e}'}, 400
+
+        def load(data_version: tuple) -> "list":
+            with phase('query'):
+                snapshot = get_snapshot(data_version)
+                offer_list = OfferDbModel.find_by_vendor_id_active(vendor_id, columns) if snapshot is None else None
+            with phase('serialize'):
+                if snapshot is not None:
+                    return project(snapshot.by_vendor(vendor_id), columns)
+                return dump_offers(offer_list, columns)
+
+        return shared_offer_list(load, columns)
+
+
+class ActiveProductOfferList(Resource):
+    @staticmethod
+    @offers_ns.param('fields', FIELDS_DOC)
+    @offers_ns.doc('Get active offers by product ID')
+    @offers_ns.response(200, RESPONSE200, [offer_model_res])
+    @offers_ns.response(400, RESPONSE400)
+    @offers_ns.response(401, RESPONSE401)
+    @offers_ns.response(403, RESPONSE403)
+    def get(prod_id: int) -> "(str, int)":
+        """
+        Get list of active offers for given product ID
+
+        :param prod_id: Product ID used for searching offers (int)
+        :returns:
+            - info - 'str' json containing list of offers or 'message' info if not successful
+            - sc - 'int' representing HTTP status code
+        """
+        msg, auth_check = evaluate_token(request.headers.get('Bearer'))
+        if auth_check != 200:
+            return {'message': msg}, auth_check
+        try:
+            columns = fields_arg(offer_body_res)
+        except ValueError as e:
+            return {'message': f'{RESPONSE400} - {e}'}, 400
+
+        def load(data_version: tuple) -> "list":
+            with phase('query'):
+                snapshot = get_snapshot(data_version)
+                offer_list = OfferDbModel.find_by_prod_id_active(prod_id, columns) if snapshot is None else None
+            with phase('serialize'):
+                if snapshot is not None:
+                    return project(snapshot.by_product(prod_id), columns)
+                return dump_offers(offer_list, columns)
+
+        return shared_offer_list(load, columns)
+
+
+class PriceComparisonList(Resource):
+    @staticmethod
+    @offers_ns.doc('Compare prices of products across vendors',
+                   params={'prod_ids': 'Comma separated product IDs, all products by default',
+                           'sort': f'Sort key, one of {", ".join(COMPARISON_SORT_KEYS)} (spread by default)',
+                           'order': 'asc or desc (default)', 'page': 'Page number starting at 1',
+                           'per_page': f'Items per page, at most {MAX_PER_PAGE} ({DEFAULT_PER_PAGE} by default)'})
+    @offers_ns.response(200, RESPONSE200, price_comparison_page_model)
+    @offers_ns.response(400, RESPONSE400)
+    @offers_ns.response(401, RESPONSE401)
+    @offers_ns.response(403, RESPONSE403)
+    def get() -> "(str, int)":
+        """
+        Get price spread (min, max and median price, number of vendors, cheapest vendor) of products across vendors
+        from their active offers
+
+        :returns:
+            - info - 'str' json containing page of price statistics or 'message' info if not successful
+            - sc - 'int' representing HTTP status code
+        """
+        msg, auth_check = evaluate_token(request.headers.get('Bearer'))
+        if auth_check != 200:
+            return {'message': msg}, auth_check
+        try:
+            prod_ids = request.args.get('prod_ids')
+            prod_ids = [int(prod_id) for prod_id in prod_ids.split(',')] if prod_ids else None
+            page, per_page = page_args()
+            order = request.args.get('order', 'desc')
+            if order not in ('asc', 'desc'):
+                raise ValueError('Invalid order parameter')
+            with phase('query'):
+                stats = price_comparison(active_prices(get_snapshot(), prod_ids), request.args.get('sort', 'spread'),
+                                         descending=order == 'desc')
+        except ValueError as e:
+            return {'message': str(e)}, 400
+        return paginate(stats, page, per_page), 200
+
+
+class VendorSummary(Resource):
+    @staticmethod
+    @offers_ns.doc('Get summary of offers of a vendor',
+                   params={'window_hours': f'Window of offer changes in hours ({DEFAULT_WINDOW_HOURS} by default)'})
+    @offers_ns.response(200, RESPONSE200, vendor_summary_model)
+    @offers_ns.response(400, RESPONSE400)
+    @offers_ns.response(401, RESPONSE401)
+    @offers_ns.response(403, RESPONSE403)
+    def get(vendor_id: int) -> "(str, int)":
+        """
+        Get summary of offers of a vendor - active offers, total stock, prices relative to the lowest price of
+        the same products and frequency of changes
+
+        :param vendor_id: Vendor ID (int)
+        :returns:
+            - info - 'str' json containing vendor summary (empty if vendor has no offers) or 'message' info if not
+                     successful
+            - sc - 'int' representing HTTP status code
+        """
+        msg, auth_check = evaluate_token(request.headers.get('Bearer'))
+        if auth_check != 200:
+            return {'message': msg}, auth_check
+        try:
+            window_hours = window_hours_arg()
+        except ValueError as e:
+            return {'message': str(e)}, 400
+        with phase('query'):
+            summaries = cached_vendor_summaries(window_hours, vendor_id)
+        return (summaries[0] if summaries else {}), 200
+
+
+class VendorSummaryList(Resource):
+    @staticmethod
+    @offers_ns.doc('Get summaries of offers of all vendors',
+                   params={'window_hours': f'Window of offer changes in hours ({DEFAULT_WINDOW_HOURS} by default)',
+                           'page': 'Page number starting at 1',
+                           'per_page': f'Items per page, at most {MAX_PER_PAGE} ({DEFAULT_PER_PAGE} by default)'})
+    @offers_ns.response(200, RESPONSE200, vendor_summary_page_model)
+    @offers_ns.response(400, RESPONSE400)
+    @offers_ns.response(401, RESPONSE401)
+    @offers_ns.response(403, RESPONSE403)
+    def get() -> "(str, int)":
+        """
+        Get summaries of offers of all vendors ordered by vendor ID
+
+        :returns:
+            - info - 'str' json containing page of vendor summaries or 'message' info if not successful
+            - sc - 'int' representing HTTP status code
+        """
+        msg, auth_check = evaluate_token(request.headers.get('Bearer'))
+        if auth_check != 200:
+            return {'message': msg}, auth_check
+        try:
+            window_hours = window_hours_arg()
+            page, per_page = page_args()
+        except ValueError as e:
+            return {'message': str(e)}, 400
+        with phase('query'):
+            summaries = cached_vendor_summaries(window_hours)
+        return paginate(summaries, page, per_page), 200
 
 
 class PriceHistoryItem:
@@ -156,6 +531,30 @@ class PriceHistory:
         """
         return json.dumps(self, default=lambda o: o.__dict__, sort_keys=True)
 
+    @classmethod
+    def from_offers(cls, prod_id: int, vendor_id: int, offer_list: "List[OfferDbModel]") -> "PriceHistory":
+        """
+        Create price history from offers ordered by date and calculate price change
+
+        :param prod_id: Offered product ID (int)
+        :param vendor_id: Offer's vendor ID (int)
+        :param offer_list: Offers of the product and vendor ordered by date (List[OfferDbModel])
+        :returns: - 'PriceHistory' representing price history
+        """
+        if len(offer_list) == 0:
+            return cls(prod_id=prod_id, vendor_id=vendor_id, history=[])
+
+        # if offers were found for a given product and vendor ID, create a price history and calculate price change
+        price_history_data = []
+        for offer in offer_list:
+            price_history_data.append(PriceHistoryItem(price=offer.price, date_created=str(offer.date_created)))
+        price_history = cls(prod_id=prod_id, vendor_id=vendor_id, history=price_history_data)
+        if offer.price < offer_list[0].price:
+            price_history.price_change = - (offer.price - offer_list[0].price) / offer.price * 100
+        else:
+            price_history.price_change = (offer.price - offer_list[0].price) / offer_list[0].price * 100
+        return price_history
+
 
 class ProductAndVendorOfferHistoryList(Resource):
     @staticmethod
@@ -180,18 +579,65 @@ class ProductAndVendorOfferHistoryList(Resource):
         date_interval_json = request.get_json()
         date_start = date_interval_json['date_start']
         date_end = date_interval_json['date_end']
-        offer_list = OfferDbModel.find_by_prod_id_and_vendor_id_between_dates(prod_id, vendor_id, date_start, date_end)
-        if len(offer_list) == 0:
-            price_history = PriceHistory(prod_id=prod_id, vendor_id=vendor_id, history=[])
-            return price_history.to_json(), 200
+        with phase('query'):
+            if series_enabled():
+                offer_list = list(PriceSeriesDbModel.find_history_between_dates(
+                    datetime.strptime(date_start, DATE_FORMAT), datetime.strptime(date_end, DATE_FORMAT),
+                    pairs=[(prod_id, vendor_id)]))
+            else:
+                offer_list = OfferDbModel.find_by_prod_id_and_vendor_id_between_dates(prod_id, vendor_id, date_start,
+                                                                                      date_end)
+        with phase('serialize'):
+            return PriceHistory.from_offers(prod_id, vendor_id, offer_list).to_json(), 200
 
-        # if offers were found for a given product and vendor ID, create a price history and calculate price change
-        price_history_data = []
-        for offer in offer_list:
-            price_history_data.append(PriceHistoryItem(price=offer.price, date_created=str(offer.date_created)))
-        price_history = PriceHistory(prod_id=prod_id, vendor_id=vendor_id, history=price_history_data)
-        if offer.price < offer_list[0].price:
-            price_history.price_change = - (offer.price - offer_list[0].price) / offer.price * 100
-        else:
-            price_history.price_change = (offer.price - offer_list[0].price) / offer_list[0].price * 100
-        return price_history.to_json(), 200
+
+class BulkPriceHistoryList(Resource):
+    @staticmethod
+    @offers_ns.expect(bulk_history_item)
+    @offers_ns.doc('Get price histories of many products and vendors')
+    @offers_ns.response(200, RESPONSE200, [price_history_model])
+    @offers_ns.response(400, RESPONSE400)
+    @offers_ns.response(401, RESPONSE401)
+    @offers_ns.response(403, RESPONSE403)
+    def post() -> "(str, int)":
+        """
+        Get price histories of given product and vendor pairs, or of a product with all its vendors, within one date
+        interval. Histories are streamed as a json list ordered by product and vendor ID; pairs without offers in
+        the interval are omitted
+
+        :returns:
+            - info - 'str' json containing list of price histories or 'message' info if not successful
+            - sc - 'int' representing HTTP status code
+        """
+        msg, auth_check = evaluate_token(request.headers.get('Bearer'))
+        if auth_check != 200:
+            return {'message': msg}, auth_check
+        req_data = request.get_json()
+        try:
+            # the interval is parsed once for all pairs
+            from_date = datetime.strptime(req_data['date_start'], DATE_FORMAT)
+            to_date = datetime.strptime(req_data['date_end'], DATE_FORMAT)
+            pairs = req_data.get('pairs')
+            prod_id = req_data.get('prod_id')
+            if pairs is not None:
+                pairs = [(int(pair['prod_id']), int(pair['vendor_id'])) for pair in pairs]
+                if not 0 < len(pairs) <= MAX_HISTORY_PAIRS:
+                    raise ValueError(f'Between 1 and {MAX_HISTORY_PAIRS} pairs must be provided')
+            elif prod_id is None:
+                raise ValueError('Either pairs or prod_id must be provided')
+            else:
+                prod_id = int(prod_id)
+        except (KeyError, TypeError, ValueError) as e:
+            return {'message': f'{RESPONSE400} - {e}'}, 400
+        history_model = PriceSeriesDbModel if series_enabled() else OfferDbModel
+        rows = history_model.find_history_between_dates(from_date, to_date, pairs=pairs, prod_id=prod_id)
+
+        def generate():
+            separator = ''
+            yield '['
+            for (history_prod_id, vendor_id), offer_list in groupby(rows, key=itemgetter(0, 1)):
+                yield separator + PriceHistory.from_offers(history_prod_id, vendor_id, list(offer_list)).to_json()
+                separator = ','
+            yield ']'
+
+        return Response(stream_with_context(generate()), mimetype='application/json')
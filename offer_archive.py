@@ -0,0 +1,155 @@
+"""
+Monthly archive partitions of inactive offers
+
+OFFERS keeps active offers and recent history. The archive job moves inactive offers created in months older than
+--months (OFFER_ARCHIVE_MONTHS, 3 by default) into one table per month (OFFERS_YYYYMM), registered in
+OFFER_PARTITIONS. Offer history lookups read OFFERS plus only the partitions whose month overlaps the requested
+interval, so endpoints return the same offers; vendor summaries only count changes still in OFFERS. A month no longer
+needed is dropped with one DROP TABLE instead of deleting its rows from OFFERS (export it first with bulk_io.py if it
+must be kept):
+    python offer_archive.py archive --months 3
+    python offer_archive.py list
+    python offer_archive.py detach OFFERS_202301
+"""
+import argparse
+import sys
+import time
+from datetime import datetime
+from os import environ
+from typing import List
+
+from sqlalchemy import func, select
+
+from data_version_db_model import DataVersionDbModel, OFFER_DEACTIVATIONS
+from flask_misc import fl_sql
+from offer_db_model import OfferDbModel
+from offer_partition_db_model import OfferPartitionDbModel, OFFER_COLUMNS, partition_table
+
+ARCHIVE_MONTHS = int(environ.get('OFFER_ARCHIVE_MONTHS', 3))
+
+
+def month_start(date: datetime) -> "datetime":
+    """
+    Get start of the month of a date
+
+    :param date: Date within the month (datetime)
+    :returns: - 'datetime' representing midnight of the first day of the month
+    """
+    return datetime(date.year, date.month, 1)
+
+
+def next_month(date: datetime) -> "datetime":
+    """
+    Get start of the month following the month of a date
+
+    :param date: Date within the month (datetime)
+    :returns: - 'datetime' representing midnight of the first day of the next month
+    """
+    return datetime(date.year + date.month // 12, date.month % 12 + 1, 1)
+
+
+def archive_month(start: datetime) -> "int":
+    """
+    Move inactive offers created within a month to its partition in a single transaction. Must be called within app
+    context
+
+    :param start: Start of the month (datetime)
+    :returns: - 'int' representing number of moved offers
+    """
+    end = next_month(start)
+    name = f'OFFERS_{start:%Y%m}'
+    table = partition_table(name)
+    table.create(bind=fl_sql.session.connection(), checkfirst=True)
+    offers = OfferDbModel.__table__
+    criteria = [offers.c.active.is_(False), offers.c.date_created >= start, offers.c.date_created < end]
+    moved = fl_sql.session.execute(table.insert().from_select(
+        list(OFFER_COLUMNS), select(*(offers.c[column] for column in OFFER_COLUMNS)).where(*criteria))).rowcount
+    fl_sql.session.execute(offers.delete().where(*criteria))
+    partition = fl_sql.session.get(OfferPartitionDbModel, name)
+    if partition is None:
+        partition = OfferPartitionDbModel(name, start, end)
+        fl_sql.session.add(partition)
+    partition.rows += moved
+    if moved:
+        # the newest offer may have been moved, lowering max(internal_id) in OfferDbModel.data_version()
+        DataVersionDbModel.bump(OFFER_DEACTIVATIONS)
+    fl_sql.session.commit()
+    return moved
+
+
+def archive(months: int = ARCHIVE_MONTHS, now: datetime = None) -> "int":
+    """
+    Move inactive offers created before the last months to monthly partitions. Must be called within app context
+
+    :param months: Number of recent months (including the current one) kept in OFFERS (int)
+    :param now: Current date (datetime)
+    :returns: - 'int' representing number of moved offers
+    """
+    cutoff = month_start(now or datetime.now())
+    for _ in range(months - 1):
+        cutoff = datetime(cutoff.year - (cutoff.month == 1), (cutoff.month - 2) % 12 + 1, 1)
+    oldest = fl_sql.session.query(func.min(OfferDbModel.date_created)) \
+        .filter(OfferDbModel.active.is_(False), OfferDbModel.date_created < cutoff).scalar()
+    moved = 0
+    start = month_start(oldest) if oldest is not None else cutoff
+    while start < cutoff:
+        moved += archive_month(start)
+        start = next_month(start)
+    return moved
+
+
+def detach(name: str) -> "int":
+    """
+    Drop a partition with its offers. Must be called within app context
+
+    :param name: Name of the partition table (str)
+    :returns: - 'int' representing number of dropped offers
+    :raises KeyError: If the partition doesn't exist
+    """
+    partition = fl_sql.session.get(OfferPartitionDbModel, name)
+    if partition is None:
+        raise KeyError(name)
+    rows = partition.rows
+    fl_sql.session.delete(partition)
+    partition_table(name).drop(bind=fl_sql.session.connection(), checkfirst=True)
+    # cached offer lists must not return the dropped offers
+    DataVersionDbModel.bump(OFFER_DEACTIVATIONS)
+    fl_sql.session.commit()
+    return rows
+
+
+def main(argv: List[str] = None) -> "int":
+    """
+    Archive, list or detach partitions of inactive offers
+
+    :param argv: Command line arguments (List[str])
+    :returns: - 'int' representing exit code
+    """
+    parser = argparse.ArgumentParser(description='Monthly archive partitions of inactive offers')
+    parser.add_argument('command', choices=('archive', 'list', 'detach'))
+    parser.add_argument('name', nargs='?', help='partition to detach')
+    parser.add_argument('--months', type=int, default=ARCHIVE_MONTHS, help='recent months kept in OFFERS')
+    args = parser.parse_args(argv)
+
+    from main import create_app, init_db
+    app = create_app()
+    init_db(app)
+    with app.app_context():
+        if args.command == 'archive':
+            start = time.perf_counter()
+            moved = archive(args.months)
+            print(f'Moved {moved} inactive offers to partitions in {time.perf_counter() - start:.1f} s.')
+        elif args.command == 'list':
+            for partition in OfferPartitionDbModel.find_overlapping():
+                print(partition)
+        else:
+            try:
+                print(f'Dropped partition {args.name} with {detach(args.name)} offers.')
+            except KeyError:
+                print(f'Partition {args.name} does not exist.')
+                return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,137 @@
+"""
+Deletion of offers of deleted products
+
+Deleting a product deactivates its offers in the same transaction, while the offer rows are deleted in the background
+in batches of OFFER_PURGE_BATCH_SIZE, each in its own transaction, so that deleting a product with a long history does
+not lock the DB for long; their archived offers, compact price histories (PRICE_SERIES) and price alert watches
+(WATCHES and ALERTS) are deleted afterwards. Offers left behind (e.g. by a process stopped before it finished, or by
+older versions that did not delete offers at all) are deleted by the one-off job:
+    python offer_cleanup.py --batch-size 5000
+"""
+import argparse
+import queue
+import sys
+import threading
+import time
+from os import environ
+from typing import List
+
+import sqlalchemy.exc
+from flask import Flask, current_app
+
+from flask_misc import fl_sql
+from offer_db_model import OfferDbModel, IN_CHUNK_SIZE
+from offer_partition_db_model import OfferPartitionDbModel
+from price_series_db_model import PriceSeriesDbModel
+from watch_db_model import WatchDbModel
+
+BATCH_SIZE = int(environ.get('OFFER_PURGE_BATCH_SIZE', 1000))
+
+
+def purge_offers(prod_ids: List[int] = None, batch_size: int = BATCH_SIZE, pause: float = 0.0) -> "int":
+    """
+    Delete offers of deleted products in batches. Must be called within app context
+
+    :param prod_ids: Only offers of these products if provided, all orphaned offers otherwise (List[int])
+    :param batch_size: Number of offers deleted in one transaction (int)
+    :param pause: Time in seconds between batches, giving way to other writers (float)
+    :returns: - 'int' representing number of deleted offers
+    """
+    chunks = [None] if prod_ids is None else \
+        [prod_ids[i:i + IN_CHUNK_SIZE] for i in range(0, len(prod_ids), IN_CHUNK_SIZE)]
+    purged = 0
+    for chunk in chunks:
+        while True:
+            deleted = OfferDbModel.delete_orphans(batch_size, chunk)
+            purged += deleted
+            if deleted < batch_size:
+                break
+            time.sleep(pause)
+        # a chunk holds up to CHUNK_POINTS offers, so histories are deleted at once
+        PriceSeriesDbModel.delete_orphans(chunk)
+        # archived offers are indexed by product, deleted at once as well
+        purged += OfferPartitionDbModel.delete_orphans(chunk)
+        WatchDbModel.delete_orphans(chunk)
+    return purged
+
+
+class OfferPurger(threading.Thread):
+    def __init__(self, app: Flask, batch_size: int = BATCH_SIZE, pause: float = 0.05):
+        """
+        Initialize OfferPurger - background thread deleting offers of deleted products
+
+        :param app: App used as context for DB operations (Flask)
+        :param batch_size: Number of offers deleted in one transaction (int)
+        :param pause: Time in seconds between batches (float)
+        """
+        super().__init__(daemon=True, name='OfferPurger')
+        self.app = app
+        self.batch_size = batch_size
+        self.pause = pause
+        self.queue = queue.Queue()
+
+    def schedule(self, prod_ids: List[int]):
+        """
+        Schedule deletion of offers of deleted products
+
+        :param prod_ids: IDs of deleted products (List[int])
+        """
+        self.queue.put(list(prod_ids))
+
+    def run(self):
+        with self.app.app_context():
+            while True:
+                prod_ids = self.queue.get()
+                try:
+                    purged = purge_offers(prod_ids, self.batch_size, self.pause)
+                    print(f'Deleted {purged} offers of {len(prod_ids)} deleted products.')
+                except sqlalchemy.exc.SQLAlchemyError as e:
+                    # left to the next purge of the same products or to the orphan cleanup job
+                    print(f'Deleting offers of deleted products failed: {e!r}')
+                    fl_sql.session.rollback()
+                finally:
+                    self.queue.task_done()
+
+
+_purger_lock = threading.Lock()
+
+
+def schedule_purge(prod_ids: List[int]):
+    """
+    Schedule background deletion of offers of deleted products, starting the purger of the current app if needed
+
+    :param prod_ids: IDs of deleted products (List[int])
+    """
+    app = current_app._get_current_object()
+    with _purger_lock:
+        purger = app.extensions.get('offer_purger')
+        if purger is None or not purger.is_alive():
+            purger = app.extensions['offer_purger'] = OfferPurger(app)
+            purger.start()
+    purger.schedule(prod_ids)
+
+
+def main(argv: List[str] = None) -> "int":
+    """
+    Delete all offers of deleted products in batches
+
+    :param argv: Command line arguments (List[str])
+    :returns: - 'int' representing exit code
+    """
+    parser = argparse.ArgumentParser(description='Delete offers whose product does not exist')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--pause', type=float, default=0.0, help='seconds between batches')
+    args = parser.parse_args(argv)
+
+    from main import create_app, init_db
+    app = create_app()
+    init_db(app)
+    with app.app_context():
+        start = time.perf_counter()
+        purged = purge_offers(batch_size=args.batch_size, pause=args.pause)
+    print(f'Deleted {purged} orphaned offers in {time.perf_counter() - start:.1f} s.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
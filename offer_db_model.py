@@ -1,22 +1,36 @@
+import heapq
 from datetime import datetime
-from operator import and_
+from operator import and_, itemgetter
 
+from sqlalchemy import Table, case, func, select, tuple_
 from sqlalchemy.exc import IntegrityError
-from typing import List
+from typing import Callable, Dict, Iterable, Iterator, List, Set, Tuple
 
+from data_version_db_model import DataVersionDbModel, OFFER_DEACTIVATIONS
 from flask_misc import fl_sql
+from offer_deactivation_db_model import OfferDeactivationDbModel
+from offer_partition_db_model import OfferPartitionDbModel, OFFER_COLUMNS
+from price_series_db_model import PriceSeriesDbModel, series_enabled
+from watch_db_model import AlertDbModel, threshold_index
+
+DATE_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+IN_CHUNK_SIZE = 500
+HISTORY_COLUMNS = ('prod_id', 'vendor_id', 'price', 'date_created', 'internal_id')
+HISTORY_ORDER = ('prod_id', 'vendor_id', 'date_created', 'internal_id')
 
 
 class OfferDbModel(fl_sql.Model):
     __tablename__ = 'OFFERS'
+    # IDs of deleted or archived offers are never reused by SQLite
+    __table_args__ = {'sqlite_autoincrement': True}
 
     internal_id = fl_sql.Column(fl_sql.Integer, primary_key=True)
-    vendor_id = fl_sql.Column(fl_sql.Integer, nullable=False)
+    vendor_id = fl_sql.Column(fl_sql.Integer, nullable=False, index=True)
     price = fl_sql.Column(fl_sql.Integer, nullable=False)
     items_in_stock = fl_sql.Column(fl_sql.Integer, nullable=False)
     active = fl_sql.Column(fl_sql.Boolean, nullable=False)
     date_created = fl_sql.Column(fl_sql.DateTime, nullable=False)
-    prod_id = fl_sql.Column(fl_sql.Integer, fl_sql.ForeignKey('PRODUCTS.prod_id'), nullable=False)
+    prod_id = fl_sql.Column(fl_sql.Integer, fl_sql.ForeignKey('PRODUCTS.prod_id'), nullable=False, index=True)
     product = fl_sql.relationship('ProductDbModel', overlaps='offers, PRODUCTS')
 
     def __init__(self, vendor_id: int, price: int, items_in_stock: int, prod_id: int):
@@ -52,16 +66,26 @@ class OfferDbModel(fl_sql.Model):
 
         :return: - 'bool' representing success of the operation
         """
-        query_data = self.find_by_prod_and_vendor_id_active(prod_id=self.prod_id, vendor_id=self.vendor_id)
-        if query_data is not None:
+        # normally there is at most one active offer, but concurrent pollers may have inserted more of them
+        active_offers = self.query.filter_by(prod_id=self.prod_id, vendor_id=self.vendor_id, active=True) \
+            .order_by(OfferDbModel.internal_id).all()
+        if active_offers:
+            query_data = active_offers[-1]
+            for duplicate in active_offers[:-1]:
+                setattr(duplicate, 'active', False)
             # unless it has the same price and items in stock -> we don't need duplicates
             if query_data.price != self.price or \
                     query_data.items_in_stock != self.items_in_stock:
                 setattr(query_data, 'active', False)
             else:
+                if len(active_offers) > 1:
+                    DataVersionDbModel.bump(OFFER_DEACTIVATIONS)
+                    fl_sql.session.commit()
                 return False
         try:
             fl_sql.session.add(self)
+            if series_enabled():
+                PriceSeriesDbModel.append_many([(self.prod_id, self.vendor_id, self.date_created, self.price)])
             fl_sql.session.commit()
             return True
         except IntegrityError:
@@ -69,24 +93,157 @@ class OfferDbModel(fl_sql.Model):
             return False
 
     @classmethod
-    def find_by_vendor_id(cls, vendor_id) -> "List[OfferDbModel]":
+    def insert_many(cls, offers: List["OfferDbModel"]) -> "int":
+        """
+        Insert offers of many products in a single transaction, skipping offers that don't change price or items in
+        stock of the active offer of the same product and vendor (the same rules as insert())
+
+        :param offers: Offers in the order they were fetched (List[OfferDbModel])
+        :returns: - 'int' representing number of inserted offers
+        """
+        return cls.reconcile_many(offers, [])[0]
+
+    @classmethod
+    def reconcile_many(cls, offers: List["OfferDbModel"], polled_prod_ids: List[int]) -> "Tuple[int, int]":
+        """
+        Insert offers of many products like insert_many() and, in the same transaction, deactivate active offers of
+        polled products whose vendor is not among the offers, i.e. it vanished upstream or has no items in stock
+
+        :param offers: Offers in the order they were fetched (List[OfferDbModel])
+        :param polled_prod_ids: Products whose offers were all fetched, including those without any (List[int])
+        :returns: - 'Tuple[int, int]' representing number of inserted and number of deactivated offers
+        """
+        prod_ids = {offer.prod_id for offer in offers} | set(polled_prod_ids)
+        active_offers = cls._find_active_by_pair(prod_ids)
+        # only watched products are compared, and only their thresholds between the old and new price are checked
+        index = threshold_index()
+        watched = index.prod_ids & prod_ids
+        cheapest = cls._cheapest(active_offers, watched)
+        inserted = 0
+        deactivated_offers = []
+        observations = []
+        for offer in offers:
+            current = active_offers.get((offer.prod_id, offer.vendor_id), [])
+            # normally there is at most one active offer, but concurrent pollers may have inserted more of them
+            for duplicate in current[:-1]:
+                duplicate.active = False
+                deactivated_offers.append(duplicate)
+            if current and current[-1].price == offer.price and current[-1].items_in_stock == offer.items_in_stock:
+                active_offers[(offer.prod_id, offer.vendor_id)] = current[-1:]
+                continue
+            if current:
+                current[-1].active = False
+            fl_sql.session.add(offer)
+            active_offers[(offer.prod_id, offer.vendor_id)] = [offer]
+            observations.append((offer.prod_id, offer.vendor_id, offer.date_created, offer.price))
+            inserted += 1
+        live_pairs = {(offer.prod_id, offer.vendor_id) for offer in offers}
+        missing = cls._deactivate_missing(active_offers, set(polled_prod_ids), live_pairs)
+        deactivated = len(missing)
+        # readers drop offers deactivated without a newer offer incrementally, see OfferSnapshot
+        OfferDeactivationDbModel.log(deactivated_offers + missing)
+        if watched:
+            AlertDbModel.fire_many(index, cheapest, cls._cheapest(active_offers, watched))
+        try:
+            if observations and series_enabled():
+                # the query of open chunks flushes the offers, so it may fail the same way as the commit
+                PriceSeriesDbModel.append_many(observations)
+            fl_sql.session.commit()
+        except IntegrityError:
+            # e.g. an offer of a product deleted in the meantime; store the others one by one
+            fl_sql.session.rollback()
+            inserted = sum(cls(vendor_id=offer.vendor_id, price=offer.price, items_in_stock=offer.items_in_stock,
+                               prod_id=offer.prod_id).insert() for offer in offers)
+            missing = cls._deactivate_missing(cls._find_active_by_pair(polled_prod_ids), set(polled_prod_ids),
+                                              live_pairs)
+            deactivated = len(missing)
+            OfferDeactivationDbModel.log(missing)
+            if watched:
+                AlertDbModel.fire_many(index, cheapest, cls._cheapest(cls._find_active_by_pair(watched), watched))
+            fl_sql.session.commit()
+        return inserted, deactivated
+
+    @classmethod
+    def _find_active_by_pair(cls, prod_ids: Iterable[int]) -> "Dict[Tuple[int, int], List[OfferDbModel]]":
+        prod_ids = sorted(prod_ids)
+        active_offers = {}
+        for i in range(0, len(prod_ids), IN_CHUNK_SIZE):
+            for offer in cls.query.filter(cls.active.is_(True), cls.prod_id.in_(prod_ids[i:i + IN_CHUNK_SIZE])) \
+                    .order_by(cls.internal_id):
+                active_offers.setdefault((offer.prod_id, offer.vendor_id), []).append(offer)
+        return active_offers
+
+    @staticmethod
+    def _cheapest(active_offers: "Dict[Tuple[int, int], List[OfferDbModel]]", prod_ids: Set[int]) \
+            -> "Dict[int, Tuple[int, int]]":
+        # price and vendor of the cheapest active offer in stock of each product, products out of stock are missing
+        cheapest = {}
+        for (prod_id, vendor_id), pair_offers in active_offers.items():
+            if prod_id in prod_ids:
+                for offer in pair_offers:
+                    if offer.active and offer.items_in_stock > 0 and \
+                            (prod_id not in cheapest or (offer.price, vendor_id) < cheapest[prod_id]):
+                        cheapest[prod_id] = (offer.price, vendor_id)
+        return cheapest
+
+    @staticmethod
+    def _deactivate_missing(active_offers: "Dict[Tuple[int, int], List[OfferDbModel]]", polled_prod_ids: Set[int],
+                            live_pairs: Set[Tuple[int, int]]) -> "List[OfferDbModel]":
+        # set difference of active and live vendors of every polled product, in one pass over the active offers
+        deactivated = []
+        for pair in active_offers.keys() - live_pairs:
+            if pair[0] in polled_prod_ids:
+                for offer in active_offers[pair]:
+                    if offer.active:
+                        offer.active = False
+                        deactivated.append(offer)
+        return deactivated
+
+    @classmethod
+    def find_by_vendor_id(cls, vendor_id, columns: List[str] = None) -> "List[OfferDbModel]":
         """
         Find all offers by vendor ID
 
         :param vendor_id: Offers' vendor ID (int)
-        :returns: - 'List[OfferDbModel] representing all offers
+        :param columns: Only these columns are selected if provided (List[str])
+        :returns: - 'List[OfferDbModel] representing all offers (rows of the columns if provided)
         """
-        return cls.query.filter_by(vendor_id=vendor_id).all()
+        return cls._with_archived(cls._select(columns).filter_by(vendor_id=vendor_id).all(), columns,
+                                  lambda table: [table.c.vendor_id == vendor_id])
 
     @classmethod
-    def find_by_prod_id(cls, prod_id) -> "List[OfferDbModel]":
+    def find_by_prod_id(cls, prod_id, columns: List[str] = None) -> "List[OfferDbModel]":
         """
         Find all offers by product ID
 
         :param prod_id: Offers' product ID (int)
-        :returns: - 'List[OfferDbModel] representing all offers
+        :param columns: Only these columns are selected if provided (List[str])
+        :returns: - 'List[OfferDbModel] representing all offers (rows of the columns if provided)
+        """
+        return cls._with_archived(cls._select(columns).filter_by(prod_id=prod_id).all(), columns,
+                                  lambda table: [table.c.prod_id == prod_id])
+
+    @classmethod
+    def find_by_vendor_id_active(cls, vendor_id, columns: List[str] = None) -> "List[OfferDbModel]":
+        """
+        Find all active offers by vendor ID
+
+        :param vendor_id: Offers' vendor ID (int)
+        :param columns: Only these columns are selected if provided (List[str])
+        :returns: - 'List[OfferDbModel] representing all active offers (rows of the columns if provided)
+        """
+        return cls._select(columns).filter_by(vendor_id=vendor_id, active=True).all()
+
+    @classmethod
+    def find_by_prod_id_active(cls, prod_id, columns: List[str] = None) -> "List[OfferDbModel]":
         """
-        return cls.query.filter_by(prod_id=prod_id).all()
+        Find all active offers by product ID
+
+        :param prod_id: Offers' product ID (int)
+        :param columns: Only these columns are selected if provided (List[str])
+        :returns: - 'List[OfferDbModel] representing all active offers (rows of the columns if provided)
+        """
+        return cls._select(columns).filter_by(prod_id=prod_id, active=True).all()
 
     @classmethod
     def find_by_prod_and_vendor_id(cls, prod_id, vendor_id) -> "List[OfferDbModel]":
@@ -97,7 +254,8 @@ class OfferDbModel(fl_sql.Model):
         :param vendor_id: Offers' vendor ID (int)
         :returns: - 'List[OfferDbModel] representing all offers
         """
-        return cls.query.filter_by(prod_id=prod_id, vendor_id=vendor_id).all()
+        return cls._with_archived(cls.query.filter_by(prod_id=prod_id, vendor_id=vendor_id).all(), None,
+                                  lambda table: [table.c.prod_id == prod_id, table.c.vendor_id == vendor_id])
 
     @classmethod
     def find_by_prod_and_vendor_id_active(cls, prod_id, vendor_id) -> "OfferDbModel":
@@ -111,22 +269,130 @@ class OfferDbModel(fl_sql.Model):
         return cls.query.filter_by(prod_id=prod_id, vendor_id=vendor_id, active=True).one_or_none()
 
     @classmethod
-    def find_all_active(cls) -> "List[OfferDbModel]":
+    def find_all_active(cls, columns: List[str] = None) -> "List[OfferDbModel]":
         """
         Find all active offers
 
-        :returns: - 'List[OfferDbModel] representing all active offers
+        :param columns: Only these columns are selected if provided (List[str])
+        :returns: - 'List[OfferDbModel] representing all active offers (rows of the columns if provided)
+        """
+        return cls._select(columns).filter_by(active=True).all()
+
+    @classmethod
+    def find_active_prices(cls, prod_ids: List[int] = None) -> "List[Tuple[int, int, int]]":
         """
-        return cls.query.filter_by(active=True).all()
+        Find product ID, vendor ID and price of active offers, without loading whole offers
+
+        :param prod_ids: Only offers of these products if provided (List[int])
+        :returns: - 'List[Tuple[int, int, int]]' representing offers ordered by product ID and internal ID
+        """
+        query = fl_sql.session.query(cls.prod_id, cls.vendor_id, cls.price).filter_by(active=True) \
+            .order_by(cls.prod_id, cls.internal_id)
+        if prod_ids is None:
+            return [tuple(row) for row in query]
+        # chunks keep the number of bound parameters below the SQLite limit
+        prod_ids = sorted(set(prod_ids))
+        return [tuple(row) for i in range(0, len(prod_ids), IN_CHUNK_SIZE)
+                for row in query.filter(cls.prod_id.in_(prod_ids[i:i + IN_CHUNK_SIZE]))]
 
     @classmethod
-    def find_all(cls) -> "List[OfferDbModel]":
+    def data_version(cls) -> "Tuple[int, int, int]":
+        """
+        Get version of the offer data, which changes with every ingested or deactivated offer, in a single query
+
+        :returns: - 'Tuple[int, int, int]' representing the newest internal ID, the newest logged deactivation and
+                    the offer deactivations version
+        """
+        row = fl_sql.session.query(
+            select(func.max(cls.internal_id)).scalar_subquery(),
+            select(func.max(OfferDeactivationDbModel.seq)).scalar_subquery(),
+            select(DataVersionDbModel.version).filter_by(name=OFFER_DEACTIVATIONS).scalar_subquery()).one()
+        return tuple(value or 0 for value in row)
+
+    @classmethod
+    def vendor_active_aggregates(cls, vendor_id: int = None) -> "List[Tuple[int, int, int, float, float]]":
+        """
+        Aggregate active offers by vendor, comparing vendor prices with the lowest price of the same product
+
+        :param vendor_id: Only this vendor if provided (int)
+        :returns: - 'List[Tuple[int, int, int, float, float]]' representing vendor ID, number of active offers,
+                    total stock, average price and average ratio of price to the lowest price of the product
+                    (products whose lowest price is 0 are skipped, None if there are no other products)
+        """
+        market = fl_sql.session.query(cls.prod_id, func.min(cls.price).label('min_price')).filter(cls.active)
+        if vendor_id is not None:
+            vendor_products = fl_sql.session.query(cls.prod_id).filter(cls.active, cls.vendor_id == vendor_id)
+            market = market.filter(cls.prod_id.in_(vendor_products.scalar_subquery()))
+        market = market.group_by(cls.prod_id).subquery()
+        query = fl_sql.session.query(cls.vendor_id, func.count(cls.internal_id), func.sum(cls.items_in_stock),
+                                     func.avg(cls.price), func.avg(cls.price * 1.0 / market.c.min_price)) \
+            .join(market, market.c.prod_id == cls.prod_id).filter(cls.active)
+        if vendor_id is not None:
+            query = query.filter(cls.vendor_id == vendor_id)
+        return [tuple(row) for row in query.group_by(cls.vendor_id).order_by(cls.vendor_id)]
+
+    @classmethod
+    def vendor_changes_since(cls, since: datetime, vendor_id: int = None) -> "List[Tuple[int, int, int]]":
+        """
+        Count offers created since given date by vendor and how many of them changed the price compared to
+        the previous offer of the same product created in the same period
+
+        :param since: Start of the period (datetime)
+        :param vendor_id: Only this vendor if provided (int)
+        :returns: - 'List[Tuple[int, int, int]]' representing vendor ID, number of new offers and price changes
+        """
+        previous_price = func.lag(cls.price).over(partition_by=(cls.prod_id, cls.vendor_id), order_by=cls.internal_id)
+        window = fl_sql.session.query(cls.vendor_id.label('vendor_id'), cls.price.label('price'),
+                                      previous_price.label('previous_price')).filter(cls.date_created >= since)
+        if vendor_id is not None:
+            window = window.filter(cls.vendor_id == vendor_id)
+        window = window.subquery()
+        changed = case((and_(window.c.previous_price.isnot(None), window.c.previous_price != window.c.price), 1),
+                       else_=0)
+        query = fl_sql.session.query(window.c.vendor_id, func.count(), func.sum(changed)) \
+            .group_by(window.c.vendor_id).order_by(window.c.vendor_id)
+        return [tuple(row) for row in query]
+
+    @classmethod
+    def find_all(cls, columns: List[str] = None) -> "List[OfferDbModel]":
         """
         Find all offers
 
-        :returns: - 'List[OfferDbModel] representing all offers
+        :param columns: Only these columns are selected if provided (List[str])
+        :returns: - 'List[OfferDbModel] representing all offers (rows of the columns if provided)
+        """
+        return cls._with_archived(cls._select(columns).all(), columns)
+
+    @classmethod
+    def _select(cls, columns: List[str] = None):
+        # rows of selected columns are serialized by a schema limited to them, without building ORM instances
+        if columns is None:
+            return cls.query
+        return fl_sql.session.query(*(getattr(cls, column) for column in columns))
+
+    @classmethod
+    def _with_archived(cls, offers: list, columns: List[str] = None, where: Callable[[Table], list] = None,
+                       from_date: datetime = None, to_date: datetime = None) -> "list":
+        # archived offers are older than inactive offers left in OFFERS, so they come first
+        archived = []
+        for partition in OfferPartitionDbModel.find_overlapping(from_date, to_date):
+            rows = partition.select(columns or OFFER_COLUMNS, where)
+            archived.extend(rows if columns is not None else (cls.from_archived(row) for row in rows))
+        return archived + offers if archived else offers
+
+    @classmethod
+    def from_archived(cls, row) -> "OfferDbModel":
         """
-        return cls.query.all()
+        Create transient offer, never added to the session, from a row of an archive partition
+
+        :param row: Row with the columns of OFFERS (Row)
+        :returns: - 'OfferDbModel' representing the archived offer
+        """
+        offer = cls(vendor_id=row.vendor_id, price=row.price, items_in_stock=row.items_in_stock, prod_id=row.prod_id)
+        offer.internal_id = row.internal_id
+        offer.active = row.active
+        offer.date_created = row.date_created
+        return offer
 
     @classmethod
     def find_by_prod_id_and_vendor_id_between_dates(cls, prod_id: int, vendor_id: int, date_start: str,
@@ -140,10 +406,94 @@ class OfferDbModel(fl_sql.Model):
         :param date_end: Ending date of search
         :returns: - 'List[OfferDbModel] representing all offers
         """
-        from_date = datetime.strptime(date_start, '%Y-%m-%dT%H:%M:%S.%f')
-        to_date = datetime.strptime(date_end, '%Y-%m-%dT%H:%M:%S.%f')
-        return cls.query.filter_by(prod_id=prod_id, vendor_id=vendor_id).filter(
+        from_date = datetime.strptime(date_start, DATE_FORMAT)
+        to_date = datetime.strptime(date_end, DATE_FORMAT)
+        offers = cls.query.filter_by(prod_id=prod_id, vendor_id=vendor_id).filter(
             and_(cls.date_created >= from_date, cls.date_created <= to_date)).order_by(cls.date_created.asc()).all()
+        offers = cls._with_archived(
+            offers, None, lambda table: [table.c.prod_id == prod_id, table.c.vendor_id == vendor_id,
+                                         table.c.date_created >= from_date, table.c.date_created <= to_date],
+            from_date, to_date)
+        # stable, offers created at the same time keep their order
+        offers.sort(key=lambda offer: offer.date_created)
+        return offers
+
+    @classmethod
+    def find_history_between_dates(cls, from_date: datetime, to_date: datetime, pairs: List[Tuple[int, int]] = None,
+                                   prod_id: int = None, batch_size: int = 10000) -> "Iterator[Tuple]":
+        """
+        Find price history of many product and vendor pairs (or of a product with all vendors) between two dates
+        with a single ordered query, streaming the rows, merged with archive partitions overlapping the interval
+
+        :param from_date: Start of the interval (datetime)
+        :param to_date: End of the interval (datetime)
+        :param pairs: Product ID and vendor ID pairs (List[Tuple[int, int]])
+        :param prod_id: Product ID, all vendors of the product are returned if pairs are not provided (int)
+        :param batch_size: Number of rows fetched from the DB at once (int)
+        :returns: - 'Iterator[Tuple]' representing rows with prod_id, vendor_id, price, date_created and internal_id
+                    ordered by product ID, vendor ID and date
+        """
+        query = fl_sql.session.query(cls.prod_id, cls.vendor_id, cls.price, cls.date_created, cls.internal_id) \
+            .filter(cls.date_created >= from_date, cls.date_created <= to_date) \
+            .order_by(cls.prod_id, cls.vendor_id, cls.date_created, cls.internal_id)
+        partitions = OfferPartitionDbModel.find_overlapping(from_date, to_date)
+        if pairs is None:
+            chunks = [None]
+        else:
+            # chunks of sorted pairs keep the number of bound parameters low and the rows ordered
+            pairs = sorted(set(pairs))
+            chunks = [pairs[i:i + IN_CHUNK_SIZE // 2] for i in range(0, len(pairs), IN_CHUNK_SIZE // 2)]
+        for chunk in chunks:
+            def where(table: Table, chunk: List[Tuple[int, int]] = chunk) -> "list":
+                return [table.c.date_created >= from_date, table.c.date_created <= to_date,
+                        table.c.prod_id == prod_id if chunk is None else
+                        tuple_(table.c.prod_id, table.c.vendor_id).in_(chunk)]
+
+            rows = query.filter(*where(cls.__table__)).yield_per(batch_size)
+            if not partitions:
+                yield from rows
+                continue
+            archived = [partition.select(list(HISTORY_COLUMNS), where, list(HISTORY_ORDER))
+                        for partition in partitions]
+            yield from heapq.merge(rows, *archived, key=itemgetter(0, 1, 3, 4))
+
+    @classmethod
+    def deactivate_by_prod_ids(cls, prod_ids: List[int]) -> "int":
+        """
+        Deactivate active offers of given products as part of the current transaction (the caller commits)
+
+        :param prod_ids: Product IDs (List[int])
+        :returns: - 'int' representing number of deactivated offers
+        """
+        deactivated = 0
+        for i in range(0, len(prod_ids), IN_CHUNK_SIZE):
+            deactivated += cls.query.filter(cls.active.is_(True), cls.prod_id.in_(prod_ids[i:i + IN_CHUNK_SIZE])) \
+                .update({'active': False}, synchronize_session=False)
+        if deactivated:
+            DataVersionDbModel.bump(OFFER_DEACTIVATIONS)
+        return deactivated
+
+    @classmethod
+    def delete_orphans(cls, batch_size: int, prod_ids: List[int] = None) -> "int":
+        """
+        Delete one batch of offers whose product doesn't exist and commit, so that the DB is not locked for long
+
+        :param batch_size: Maximum number of deleted offers (int)
+        :param prod_ids: Only offers of these (deleted) products if provided, at most IN_CHUNK_SIZE (List[int])
+        :returns: - 'int' representing number of deleted offers
+        """
+        from product_db_model import ProductDbModel
+        orphans = fl_sql.session.query(cls.internal_id) \
+            .filter(~cls.prod_id.in_(fl_sql.session.query(ProductDbModel.prod_id)))
+        if prod_ids is not None:
+            orphans = orphans.filter(cls.prod_id.in_(prod_ids))
+        deleted = cls.query.filter(cls.internal_id.in_(orphans.limit(batch_size).scalar_subquery())) \
+            .delete(synchronize_session=False)
+        if deleted:
+            # deleting the newest offers lowers max(internal_id) in data_version(), which must not repeat
+            DataVersionDbModel.bump(OFFER_DEACTIVATIONS)
+        fl_sql.session.commit()
+        return deleted
 
     # @classmethod
     # def delete_all(cls) -> "(int, str)":
@@ -1,9 +1,12 @@
-from flask_misc import fl_mar
+from marshmallow_sqlalchemy import SQLAlchemyAutoSchema
+from flask_misc import fl_sql
 from offer_db_model import OfferDbModel
+import product_db_model  # noqa: F401 - mapper of OfferDbModel.product needs ProductDbModel
 
 
-class OfferDbSchema(fl_mar.SQLAlchemyAutoSchema):
+class OfferDbSchema(SQLAlchemyAutoSchema):
     class Meta:
         model = OfferDbModel
         load_instance = True
         include_fk = True
+        sqla_session = fl_sql.session
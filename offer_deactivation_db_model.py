@@ -0,0 +1,87 @@
+from datetime import datetime, timedelta
+from os import environ
+from typing import Iterable, List, Tuple
+
+from flask_misc import fl_sql
+
+# Must be longer than OFFER_SNAPSHOT_REBUILD_INTERVAL, snapshots built earlier read entries since their last refresh
+RETENTION = float(environ.get('OFFER_DEACTIVATION_LOG_RETENTION', 3600))
+
+
+class OfferDeactivationDbModel(fl_sql.Model):
+    __tablename__ = 'OFFER_DEACTIVATION_LOG'
+    # sequence numbers are never reused, readers remember the last one they applied
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    seq = fl_sql.Column(fl_sql.Integer, primary_key=True)
+    internal_id = fl_sql.Column(fl_sql.Integer, nullable=False)
+    prod_id = fl_sql.Column(fl_sql.Integer, nullable=False)
+    date_created = fl_sql.Column(fl_sql.DateTime, nullable=False, index=True)
+
+    def __init__(self, internal_id: int, prod_id: int):
+        """
+        OfferDeactivationDbModel used for SQLAlchemy database; a row logs an active offer deactivated by ingestion
+        without a newer offer of the same product and vendor, so that in-memory copies of active offers can drop it
+        incrementally
+
+        :param internal_id: ID of the deactivated offer (int)
+        :param prod_id: ID of the offered product (int)
+        """
+        self.internal_id = internal_id
+        self.prod_id = prod_id
+        self.date_created = datetime.now()
+
+    def __repr__(self):
+        """
+        Return string representation of the OfferDeactivationDbModel
+
+        :returns: - 'str' representing logged deactivation
+        """
+        return f'Offer deactivation seq = {self.seq}, internal_id = {self.internal_id}, prod_id = {self.prod_id}'
+
+    @classmethod
+    def log(cls, offers: Iterable["OfferDbModel"]) -> "int":
+        """
+        Log deactivated offers as part of the current transaction (the caller commits)
+
+        :param offers: Deactivated offers stored in the DB (Iterable[OfferDbModel])
+        :returns: - 'int' representing number of logged offers
+        """
+        entries = [cls(offer.internal_id, offer.prod_id) for offer in offers]
+        fl_sql.session.add_all(entries)
+        return len(entries)
+
+    @classmethod
+    def latest(cls) -> "int":
+        """
+        Get sequence number of the newest logged deactivation
+
+        :returns: - 'int' representing the sequence number, 0 if nothing was logged
+        """
+        return fl_sql.session.query(fl_sql.func.max(cls.seq)).scalar() or 0
+
+    @classmethod
+    def find_since(cls, seq: int) -> "List[Tuple[int, int, int]]":
+        """
+        Find deactivations logged after a sequence number
+
+        :param seq: Sequence number of the last applied deactivation (int)
+        :returns: - 'List[Tuple[int, int, int]]' representing sequence number, offer ID and product ID ordered by
+                    sequence number
+        """
+        return [tuple(row) for row in fl_sql.session.query(cls.seq, cls.internal_id, cls.prod_id)
+                .filter(cls.seq > seq).order_by(cls.seq)]
+
+    @classmethod
+    def prune(cls, retention: float = RETENTION) -> "int":
+        """
+        Delete deactivations older than the retention and commit. The newest deactivation is always kept, because
+        its sequence number is part of OfferDbModel.data_version(), which must never return to an earlier value
+
+        :param retention: Age in seconds of the oldest kept deactivation (float)
+        :returns: - 'int' representing number of deleted deactivations
+        """
+        deleted = cls.query.filter(cls.date_created < datetime.now() - timedelta(seconds=retention),
+                                   cls.seq < cls.latest()).delete(synchronize_session=False)
+        fl_sql.session.commit()
+        return deleted
@@ -0,0 +1,155 @@
+from datetime import datetime
+from typing import Callable, Dict, List
+
+from sqlalchemy import Boolean, Column, DateTime, Index, Integer, MetaData, Table, select
+from sqlalchemy.sql import Select
+
+from data_version_db_model import DataVersionDbModel, OFFER_DEACTIVATIONS
+from flask_misc import fl_sql
+
+# Archive tables are not part of the models' metadata, they are created by the archive job
+_metadata = MetaData()
+_tables: Dict[str, Table] = {}
+OFFER_COLUMNS = ('internal_id', 'vendor_id', 'price', 'items_in_stock', 'active', 'date_created', 'prod_id')
+
+
+def partition_table(name: str) -> "Table":
+    """
+    Get table of an archive partition; it has the columns of OFFERS
+
+    :param name: Name of the partition table (str)
+    :returns: - 'Table' representing the partition table
+    """
+    table = _tables.get(name)
+    if table is None:
+        table = _tables[name] = Table(
+            name, _metadata,
+            Column('internal_id', Integer, primary_key=True, autoincrement=False),
+            Column('vendor_id', Integer, nullable=False, index=True),
+            Column('price', Integer, nullable=False),
+            Column('items_in_stock', Integer, nullable=False),
+            Column('active', Boolean, nullable=False),
+            Column('date_created', DateTime, nullable=False),
+            Column('prod_id', Integer, nullable=False))
+        Index(f'ix_{name}_prod_id_vendor_id_date_created', table.c.prod_id, table.c.vendor_id, table.c.date_created)
+    return table
+
+
+class OfferPartitionDbModel(fl_sql.Model):
+    __tablename__ = 'OFFER_PARTITIONS'
+
+    name = fl_sql.Column(fl_sql.String(100), primary_key=True)
+    date_from = fl_sql.Column(fl_sql.DateTime, nullable=False)
+    date_to = fl_sql.Column(fl_sql.DateTime, nullable=False)
+    rows = fl_sql.Column(fl_sql.Integer, nullable=False)
+
+    def __init__(self, name: str, date_from: datetime, date_to: datetime):
+        """
+        OfferPartitionDbModel used for SQLAlchemy database; a row registers a table of inactive offers created
+        within [date_from, date_to) that were moved out of OFFERS
+
+        :param name: Name of the partition table (str)
+        :param date_from: Start of the period of the partition (datetime)
+        :param date_to: End of the period of the partition, exclusive (datetime)
+        """
+        self.name = name
+        self.date_from = date_from
+        self.date_to = date_to
+        self.rows = 0
+
+    def __repr__(self):
+        """
+        Return string representation of the OfferPartitionDbModel
+
+        :returns: - 'str' representing the partition
+        """
+        return f'Offer partition {self.name} from {self.date_from} to {self.date_to}, rows = {self.rows}'
+
+    @property
+    def table(self) -> "Table":
+        """
+        Table of the partition
+        """
+        return partition_table(self.name)
+
+    def select(self, columns: List[str], where: Callable[[Table], list] = None, order_by: List[str] = None) \
+            -> "List[tuple]":
+        """
+        Select rows of the partition
+
+        :param columns: Selected columns (List[str])
+        :param where: Function returning criteria for the partition table (Callable[[Table], list])
+        :param order_by: Columns the rows are ordered by, internal_id if not provided (List[str])
+        :returns: - 'List[tuple]' representing rows of the columns
+        """
+        return fl_sql.session.execute(self.select_statement(columns, where, order_by)).all()
+
+    def select_statement(self, columns: List[str], where: Callable[[Table], list] = None,
+                         order_by: List[str] = None) -> "Select":
+        """
+        Create statement selecting rows of the partition, shared by select() and the async application
+
+        :param columns: Selected columns (List[str])
+        :param where: Function returning criteria for the partition table (Callable[[Table], list])
+        :param order_by: Columns the rows are ordered by, internal_id if not provided (List[str])
+        :returns: - 'Select' representing the statement
+        """
+        table = self.table
+        query = select(*(table.c[column] for column in columns)) \
+            .order_by(*(table.c[column] for column in order_by or ['internal_id']))
+        if where is not None:
+            query = query.where(*where(table))
+        return query
+
+    @classmethod
+    def find_overlapping(cls, date_from: datetime = None, date_to: datetime = None) \
+            -> "List[OfferPartitionDbModel]":
+        """
+        Find partitions whose period overlaps the interval - partitions outside of it are pruned
+
+        :param date_from: Start of the interval, unbounded if not provided (datetime)
+        :param date_to: End of the interval (inclusive), unbounded if not provided (datetime)
+        :returns: - 'List[OfferPartitionDbModel]' representing partitions ordered by their period
+        """
+        return fl_sql.session.execute(cls.overlapping_statement(date_from, date_to)).scalars().all()
+
+    @classmethod
+    def overlapping_statement(cls, date_from: datetime = None, date_to: datetime = None) -> "Select":
+        """
+        Create statement selecting partitions whose period overlaps the interval, shared by find_overlapping() and
+        the async application
+
+        :param date_from: Start of the interval, unbounded if not provided (datetime)
+        :param date_to: End of the interval (inclusive), unbounded if not provided (datetime)
+        :returns: - 'Select' representing the statement, partitions are ordered by their period
+        """
+        query = select(cls)
+        if date_from is not None:
+            query = query.filter(cls.date_to > date_from)
+        if date_to is not None:
+            query = query.filter(cls.date_from <= date_to)
+        return query.order_by(cls.date_from)
+
+    @classmethod
+    def delete_orphans(cls, prod_ids: List[int] = None) -> "int":
+        """
+        Delete archived offers of products that don't exist and commit
+
+        :param prod_ids: Only offers of these (deleted) products if provided (List[int])
+        :returns: - 'int' representing number of deleted offers
+        """
+        from product_db_model import ProductDbModel
+        deleted = 0
+        for partition in cls.find_overlapping():
+            table = partition.table
+            query = table.delete().where(~table.c.prod_id.in_(select(ProductDbModel.prod_id)))
+            if prod_ids is not None:
+                query = query.where(table.c.prod_id.in_(prod_ids))
+            partition_deleted = fl_sql.session.execute(query).rowcount
+            partition.rows -= partition_deleted
+            deleted += partition_deleted
+        if deleted:
+            # offer lists include archived offers
+            DataVersionDbModel.bump(OFFER_DEACTIVATIONS)
+        fl_sql.session.commit()
+        return deleted
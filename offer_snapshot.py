@@ -0,0 +1,343 @@
+"""
+Compact in-memory snapshot of active offers
+
+Active offers are held in column arrays (internal_id, prod_id, vendor_id, price, items_in_stock, date_created as
+microseconds since epoch) instead of ORM instances, with per-product and per-vendor indexes of row positions. A row
+takes 6 * 8 B of columns, 1 B alive flag and 2 * 8 B of index positions, plus the index arrays and dicts of every
+product and vendor. Measured with tracemalloc, a million active offers of 200k products and 1000 vendors take about
+95 MB, while even a transient OfferDbModel takes about 1 kB (more once it is in the identity map of a session).
+
+The snapshot is refreshed incrementally - new active offers (internal_id above the last seen one) are appended and
+replace alive rows of the same product and vendor, offers deactivated by ingestion without a newer offer are read
+from OFFER_DEACTIVATION_LOG and their rows marked dead. Refreshes work on a copy that is published once loaded, so
+readers never see a half applied refresh; the copy shares the append-only column arrays and copies only the alive
+flags, the index dicts and the index arrays of products and vendors with new offers. Other changes that don't add
+a newer offer (deleted products, purged or archived offers, imports) bump the offer_deactivations data version and
+trigger a full rebuild, as does a large share of replaced rows or OFFER_SNAPSHOT_REBUILD_INTERVAL. Readers refresh
+the snapshot when offers were written in this process, it is older than OFFER_SNAPSHOT_MAX_AGE or it didn't load
+the version of offer data a cached response computed from it is stored under.
+"""
+import threading
+import time
+from array import array
+from datetime import datetime, timedelta
+from os import environ
+from typing import Dict, Iterable, Iterator, List, Set, Tuple
+
+from flask import Flask, current_app
+from sqlalchemy import event
+
+from flask_misc import fl_sql
+from offer_db_model import OfferDbModel
+from offer_deactivation_db_model import OfferDeactivationDbModel
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+COLUMNS = (OfferDbModel.internal_id, OfferDbModel.prod_id, OfferDbModel.vendor_id, OfferDbModel.price,
+           OfferDbModel.items_in_stock, OfferDbModel.date_created)
+
+# Number of ORM writes of offers done in this process, so that readers in the same process never see stale data
+_local_writes = 0
+
+
+def _count_write(mapper, connection, target):
+    global _local_writes
+    _local_writes += 1
+
+
+event.listen(OfferDbModel, 'after_insert', _count_write)
+event.listen(OfferDbModel, 'after_update', _count_write)
+
+
+class _Columns:
+    def __init__(self):
+        """
+        Initialize _Columns - column arrays and indexes of a single version of the snapshot. A published version is
+        never modified; refreshes append to a copy(), which shares the append-only column arrays with it
+        """
+        self.internal_id = array('q')
+        self.prod_id = array('q')
+        self.vendor_id = array('q')
+        self.price = array('q')
+        self.items_in_stock = array('q')
+        self.date_created = array('q')
+        self.alive = bytearray()
+        self.by_product: Dict[int, array] = {}
+        self.by_vendor: Dict[int, array] = {}
+        self.dead = 0
+        # index arrays still shared with the copied version are copied before they are appended to
+        self._shared = False
+        self._own_products: Set[int] = set()
+        self._own_vendors: Set[int] = set()
+
+    def copy(self) -> "_Columns":
+        """
+        Get a copy to be modified while readers use this version. Rows appended to the copy are not visible here,
+        as readers only reach rows through the alive flags and indexes, which are copied
+
+        :returns: - '_Columns' representing the copy
+        """
+        columns = _Columns()
+        columns.internal_id, columns.prod_id, columns.vendor_id = self.internal_id, self.prod_id, self.vendor_id
+        columns.price, columns.items_in_stock, columns.date_created = self.price, self.items_in_stock, \
+            self.date_created
+        columns.alive = bytearray(self.alive)
+        columns.by_product = dict(self.by_product)
+        columns.by_vendor = dict(self.by_vendor)
+        columns.dead = self.dead
+        columns._shared = True
+        return columns
+
+    def _index(self, index: "Dict[int, array]", own: "Set[int]", key: int) -> "array":
+        rows = index.get(key)
+        if rows is None:
+            rows = index[key] = array('q')
+            own.add(key)
+        elif self._shared and key not in own:
+            rows = index[key] = array('q', rows)
+            own.add(key)
+        return rows
+
+    def append(self, internal_id: int, prod_id: int, vendor_id: int, price: int, items_in_stock: int,
+               date_created: datetime):
+        """
+        Append an active offer, replacing alive offers of the same product and vendor
+
+        :param internal_id: Offer ID (int)
+        :param prod_id: Offered product ID (int)
+        :param vendor_id: Vendor ID (int)
+        :param price: Offered price (int)
+        :param items_in_stock: Number of available items (int)
+        :param date_created: Datetime of offer registration (datetime)
+        """
+        product_rows = self._index(self.by_product, self._own_products, prod_id)
+        for row in product_rows:
+            if self.alive[row] and self.vendor_id[row] == vendor_id:
+                self.alive[row] = 0
+                self.dead += 1
+        row = len(self.internal_id)
+        self.internal_id.append(internal_id)
+        self.prod_id.append(prod_id)
+        self.vendor_id.append(vendor_id)
+        self.price.append(price)
+        self.items_in_stock.append(items_in_stock)
+        self.date_created.append((date_created - EPOCH) // MICROSECOND)
+        self.alive.append(1)
+        product_rows.append(row)
+        self._index(self.by_vendor, self._own_vendors, vendor_id).append(row)
+
+    def kill(self, internal_id: int, prod_id: int):
+        """
+        Mark an offer deactivated without a newer offer as replaced
+
+        :param internal_id: Offer ID (int)
+        :param prod_id: Offered product ID (int)
+        """
+        for row in self.by_product.get(prod_id, ()):
+            if self.alive[row] and self.internal_id[row] == internal_id:
+                self.alive[row] = 0
+                self.dead += 1
+
+    def rows(self, rows: Iterable[int]) -> "List[dict]":
+        """
+        Get offers in given rows in the format of OfferDbSchema, skipping replaced rows
+
+        :param rows: Row positions (Iterable[int])
+        :returns: - 'List[dict]' representing offers
+        """
+        alive = self.alive
+        return [{'internal_id': self.internal_id[row], 'vendor_id': self.vendor_id[row], 'price': self.price[row],
+                 'items_in_stock': self.items_in_stock[row], 'active': True,
+                 'date_created': (EPOCH + self.date_created[row] * MICROSECOND).isoformat(),
+                 'prod_id': self.prod_id[row]}
+                for row in rows if alive[row]]
+
+    def __len__(self):
+        return len(self.internal_id) - self.dead
+
+
+class OfferSnapshot:
+    def __init__(self, max_age: float = None, rebuild_interval: float = None, batch_size: int = 10000):
+        """
+        Initialize OfferSnapshot - in-memory copy of active offers of the offer DB
+
+        :param max_age: Maximum age in seconds of the snapshot served to readers, OFFER_SNAPSHOT_MAX_AGE (1 s)
+                        by default (float)
+        :param rebuild_interval: Interval of full rebuilds in seconds, OFFER_SNAPSHOT_REBUILD_INTERVAL (300 s)
+                                 by default (float)
+        :param batch_size: Number of rows fetched from the DB at once (int)
+        """
+        self.max_age = float(environ.get('OFFER_SNAPSHOT_MAX_AGE', 1)) if max_age is None else max_age
+        self.rebuild_interval = float(environ.get('OFFER_SNAPSHOT_REBUILD_INTERVAL', 300)) \
+            if rebuild_interval is None else rebuild_interval
+        self.batch_size = batch_size
+        self._columns = None
+        self._watermark = 0
+        self._log_watermark = 0
+        self._version = 0
+        self._data_version = None
+        self._local_writes = -1
+        self._refreshed_at = 0.0
+        self._built_at = 0.0
+        self._lock = threading.Lock()
+
+    def refresh(self, force: bool = False, data_version: tuple = None) -> "bool":
+        """
+        Bring the snapshot up to date with the DB if it is stale. Must be called within app context
+
+        :param force: Refresh even if the snapshot is not stale (bool)
+        :param data_version: Version of the offer data (OfferDbModel.data_version()) the snapshot must cover, e.g.
+                             because a response computed from it is cached under the version (tuple)
+        :returns: - 'bool' representing whether the DB was queried
+        """
+        if not force and not self._stale(data_version):
+            return False
+        with self._lock:
+            if not force and not self._stale(data_version):
+                return False
+            local_writes = _local_writes
+            now = time.monotonic()
+            # read before the offers, so that the snapshot is never older than its data version
+            data_version = OfferDbModel.data_version()
+            version = data_version[2]
+            columns = self._columns
+            if columns is None or version != self._version or now - self._built_at > self.rebuild_interval or \
+                    columns.dead > max(len(columns), self.batch_size):
+                self._rebuild(version)
+            else:
+                # readers keep using the published version while the copy is loaded
+                columns = columns.copy()
+                watermark = self._load(columns, self._watermark)
+                log_watermark = self._drop_deactivated(columns, self._log_watermark)
+                self._columns, self._watermark, self._log_watermark = columns, watermark, log_watermark
+            self._data_version = data_version
+            # the read transaction must not stay open between requests
+            fl_sql.session.commit()
+            self._local_writes = local_writes
+            self._refreshed_at = now
+            return True
+
+    @property
+    def built(self) -> "bool":
+        """
+        Whether the snapshot was already built, i.e. it is used by readers in this process
+        """
+        return self._columns is not None
+
+    def _stale(self, data_version: tuple = None) -> "bool":
+        return self._columns is None or self._local_writes != _local_writes or \
+            time.monotonic() - self._refreshed_at > self.max_age or \
+            (data_version is not None and data_version != self._data_version)
+
+    def _rebuild(self, version: int):
+        columns = _Columns()
+        # offers deactivated later are logged after this entry; the read transaction sees both queries consistently
+        log_watermark = OfferDeactivationDbModel.latest()
+        watermark = self._load(columns)
+        self._version = version
+        self._built_at = time.monotonic()
+        # readers holding the previous build keep using it until they finish
+        self._columns, self._watermark, self._log_watermark = columns, watermark, log_watermark
+
+    @staticmethod
+    def _drop_deactivated(columns: _Columns, log_watermark: int) -> "int":
+        # returns sequence number of the last applied deactivation
+        for seq, internal_id, prod_id in OfferDeactivationDbModel.find_since(log_watermark):
+            columns.kill(internal_id, prod_id)
+            log_watermark = seq
+        return log_watermark
+
+    def _load(self, columns: _Columns, watermark: int = 0) -> "int":
+        # returns internal_id of the last loaded offer, the watermark moves only once the columns are published
+        query = fl_sql.session.query(*COLUMNS) \
+            .filter(OfferDbModel.active.is_(True), OfferDbModel.internal_id > watermark) \
+            .order_by(OfferDbModel.internal_id).yield_per(self.batch_size)
+        for row in query:
+            columns.append(*row)
+            watermark = row[0]
+        return watermark
+
+    def active(self) -> "List[dict]":
+        """
+        Get all active offers ordered by internal_id
+
+        :returns: - 'List[dict]' representing offers in the format of OfferDbSchema
+        """
+        columns = self._columns
+        # alive flags are appended after the other columns of a row
+        return columns.rows(range(len(columns.alive)))
+
+    def by_product(self, prod_id: int) -> "List[dict]":
+        """
+        Get active offers of a product ordered by internal_id
+
+        :param prod_id: Product ID (int)
+        :returns: - 'List[dict]' representing offers in the format of OfferDbSchema
+        """
+        columns = self._columns
+        return columns.rows(columns.by_product.get(prod_id, ()))
+
+    def by_vendor(self, vendor_id: int) -> "List[dict]":
+        """
+        Get active offers of a vendor ordered by internal_id
+
+        :param vendor_id: Vendor ID (int)
+        :returns: - 'List[dict]' representing offers in the format of OfferDbSchema
+        """
+        columns = self._columns
+        return columns.rows(columns.by_vendor.get(vendor_id, ()))
+
+    def prices_by_product(self, prod_ids: List[int] = None) -> "Iterator[Tuple[int, List[Tuple[int, int]]]]":
+        """
+        Get prices of active offers grouped by product, without building offer dicts
+
+        :param prod_ids: Only these products if provided, all products otherwise (List[int])
+        :returns: - 'Iterator[Tuple[int, List[Tuple[int, int]]]]' representing product ID and (price, vendor ID)
+                    pairs of its active offers ordered by internal_id
+        """
+        # the version read once is never modified by refreshes, so its index can be iterated while they publish
+        # new versions (analytics consume the generator lazily)
+        columns = self._columns
+        alive, price, vendor_id, by_product = columns.alive, columns.price, columns.vendor_id, columns.by_product
+        for prod_id in (by_product if prod_ids is None else prod_ids):
+            offers = [(price[row], vendor_id[row]) for row in by_product.get(prod_id, ()) if alive[row]]
+            if offers:
+                yield prod_id, offers
+
+    def stats(self) -> "dict":
+        """
+        Get size of the snapshot
+
+        :returns: - 'dict' representing number of active offers, stored rows and size of column arrays in bytes
+        """
+        columns = self._columns
+        if columns is None:
+            return {'offers': 0, 'rows': 0, 'bytes': 0}
+        rows = len(columns.internal_id)
+        return {'offers': len(columns), 'rows': rows, 'bytes': rows * (6 * 8 + 1)}
+
+
+def get_snapshot(data_version: tuple = None) -> "OfferSnapshot":
+    """
+    Get up to date snapshot of active offers of the current app
+
+    :param data_version: Version of the offer data the snapshot must cover, otherwise it may be up to
+                         OFFER_SNAPSHOT_MAX_AGE old (tuple)
+    :returns: - 'OfferSnapshot' representing the snapshot or None if the snapshot is disabled
+    """
+    snapshot = current_app.extensions.get('offer_snapshot')
+    if snapshot is not None:
+        snapshot.refresh(data_version=data_version)
+    return snapshot
+
+
+def init_app(app: Flask, snapshot: OfferSnapshot = None):
+    """
+    Register snapshot of active offers used by active offer resources, unless disabled by OFFER_SNAPSHOT=0
+
+    :param app: Application (Flask)
+    :param snapshot: Snapshot to register, created with default settings if not provided (OfferSnapshot)
+    """
+    if not app.config.get('OFFER_SNAPSHOT', environ.get('OFFER_SNAPSHOT', '1') != '0'):
+        return
+    app.extensions['offer_snapshot'] = snapshot or OfferSnapshot()
@@ -2,11 +2,17 @@ import threading
 import time
 import requests
 import sqlalchemy.exc
-from flask import Flask
+from typing import List, Optional
+from flask import Flask, current_app
 from product_db_schema import ProductDbSchema
 from offer_db_model import OfferDbModel
+from offer_deactivation_db_model import OfferDeactivationDbModel
 from offer_db_schema import OfferDbSchema
 from product_db_model import ProductDbModel
+from flask_misc import fl_sql
+from ingestion import IngestionPipeline
+from response_cache import rebuild_cached_responses
+from metrics import OFFERS_DEACTIVATED, OFFERS_INGESTED, POLLER_CYCLE, UPSTREAM_ERRORS, UPSTREAM_LATENCY
 from os import environ
 
 product_schema = ProductDbSchema()
@@ -16,29 +22,46 @@ offer_schema = OfferDbSchema()
 class OffersClient(threading.Thread):
     def __init__(self):
         """
-        Initialize OffersClient object that acts as a client to external offers API
-
-        :raises KeyError: If authorization code for external API was not retrieved
+        Initialize OffersClient object that acts as a client to external offers API. The authorization code
+        is requested on first use, so that creating the client does not block on network I/O
         """
-        super().__init__()
+        super().__init__(daemon=True, name='OffersClient')
         self.exit_loop = False
+        self._stop_event = threading.Event()
+        self._auth_lock = threading.Lock()
+        self.timeout = float(environ.get('OFFER_REQUEST_TIMEOUT', 10))
+        # fetched offers are coalesced into transactions of up to batch_size offers, see IngestionPipeline
+        self.fetch_workers = int(environ.get('OFFER_FETCH_WORKERS', 4))
+        self.queue_size = int(environ.get('OFFER_INGEST_QUEUE_SIZE', 256))
+        self.batch_size = int(environ.get('OFFER_WRITE_BATCH_SIZE', 1000))
+        self.flush_interval = float(environ.get('OFFER_WRITE_INTERVAL', 0.5))
         self.base_url = environ['OFFER_BASE_URL']
         if self.base_url == '':
             raise ValueError('OFFER_BASE_URL variable provided, but it an empty string')
-        try:
-            self.auth_code = environ['OFFER_AUTH_CODE']
-            if self.auth_code == '':
-                raise ValueError('OFFER_AUTH_CODE variable provided, but it an empty string')
-        except KeyError as e:
-            print('Requesting new authorization code.')
-            response = requests.post(self.base_url + '/auth')
-            if response.status_code == 201:
-                self.auth_code = response.json()
-            else:
-                print('Could not retrieve new authorization code.')
-                raise e
+        self._auth_code = environ.get('OFFER_AUTH_CODE')
+        if self._auth_code == '':
+            raise ValueError('OFFER_AUTH_CODE variable provided, but it an empty string')
         self.app = None
 
+    @property
+    def auth_code(self) -> "str":
+        """
+        Authorization code for external API, requested from the API on first use if OFFER_AUTH_CODE is not set
+
+        :raises KeyError: If authorization code for external API was not retrieved
+        :returns: - 'str' representing the authorization code
+        """
+        if self._auth_code is None:
+            with self._auth_lock:
+                if self._auth_code is None:
+                    print('Requesting new authorization code.')
+                    response = requests.post(self.base_url + '/auth', timeout=self.timeout)
+                    if response.status_code != 201:
+                        print('Could not retrieve new authorization code.')
+                        raise KeyError('OFFER_AUTH_CODE')
+                    self._auth_code = response.json()
+        return self._auth_code
+
     def define_app_context(self, app: Flask):
         """
         Define app context for DB operations
@@ -50,30 +73,112 @@ class OffersClient(threading.Thread):
     def run(self, *args, **kwargs):
         """
         Thread function that periodically requests new offers for each product in product database.
-        Offers that have at least one item in stock are then inserted to offer database
+        Offers that have at least one item in stock are then inserted to offer database, other active offers of
+        the product are deactivated
         """
-        self.exit_loop = False
         with self.app.app_context():
             while not self.exit_loop:
                 try:
-                    product_list = ProductDbModel.find_all()
+                    self.poll_once()
                 except sqlalchemy.exc.OperationalError:
-                    time.sleep(1)
-                    continue
-                for product in product_list:
-                    product_id = product.prod_id
-                    response = requests.get(self.base_url + f'/products/{product_id}/offers',
-                                            headers={'Bearer': f'{self.auth_code}'})
-                    if response.status_code == 200:
-                        for item in response.json():
-                            offer_data = OfferDbModel(vendor_id=item['id'], price=item['price'],
-                                                      items_in_stock=item['items_in_stock'], prod_id=product_id)
-                            if offer_data.items_in_stock == 0:
-                                continue
-                            offer_data.insert()
-                    else:
-                        print(f'Offers service request returned {response.status_code} status code!')
-                time.sleep(1)
+                    fl_sql.session.rollback()
+                except sqlalchemy.exc.SQLAlchemyError as e:
+                    # the poller must survive unexpected DB errors, the next cycle starts with a clean session
+                    print(f'Poller cycle failed: {e!r}')
+                    fl_sql.session.rollback()
+                except KeyError as e:
+                    # authorization is deferred to the first request, retry it in the next cycle
+                    print(f'Poller cycle failed: {e!r}')
+                self._stop_event.wait(1)
+
+    def stop(self, timeout: float = None):
+        """
+        Stop polling gracefully - the product being processed is finished before the thread exits
+
+        :param timeout: Maximum time to wait for the thread in seconds, wait indefinitely if None (float)
+        """
+        self.exit_loop = True
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
+
+    def poll_once(self) -> "int":
+        """
+        Request new offers for each product in product database once and insert offers that have
+        at least one item in stock to offer database, deactivating active offers of vendors that are missing
+        upstream or have no items in stock. Offers are fetched by OFFER_FETCH_WORKERS threads and
+        written in coalesced transactions by the calling thread. Must be called within app context
+
+        :returns: - 'int' representing number of inserted offers
+        """
+        cycle_start = time.perf_counter()
+        deactivated = 0
+
+        def write(offers: List[OfferDbModel], prod_ids: List[int]) -> "int":
+            nonlocal deactivated
+            batch_inserted, batch_deactivated = OfferDbModel.reconcile_many(offers, prod_ids)
+            OFFERS_DEACTIVATED.inc(amount=batch_deactivated)
+            deactivated += batch_deactivated
+            return batch_inserted
+
+        pipeline = IngestionPipeline(self._fetch_offers, write, fetch_workers=self.fetch_workers,
+                                     queue_size=self.queue_size, batch_size=self.batch_size,
+                                     flush_interval=self.flush_interval, should_stop=lambda: self.exit_loop)
+        inserted = pipeline.run(self.product_ids())
+        OFFERS_INGESTED.inc(amount=inserted)
+        POLLER_CYCLE.observe(time.perf_counter() - cycle_start)
+        snapshot = current_app.extensions.get('offer_snapshot')
+        if snapshot is not None and snapshot.built and (inserted or deactivated):
+            # readers in this process get the new offers without waiting for the refresh
+            snapshot.refresh(force=True)
+        if inserted or deactivated:
+            rebuild_cached_responses()
+        OfferDeactivationDbModel.prune()
+        return inserted
+
+    def product_ids(self) -> "List[int]":
+        """
+        Get IDs of products polled in the current cycle
+
+        :returns: - 'List[int]' representing product IDs
+        """
+        return ProductDbModel.find_all_ids()
+
+    def _fetch_offers(self, product_id: int) -> "Optional[List[OfferDbModel]]":
+        """
+        Request offers of a single product and keep those that have at least one item in stock
+
+        :param product_id: ID of the product (int)
+        :returns: - 'List[OfferDbModel]' representing all live offers of the product or None if the request failed
+        """
+        response = self._get_offers(product_id)
+        if response is None:
+            return None
+        if response.status_code != 200:
+            UPSTREAM_ERRORS.inc('offers', response.status_code)
+            print(f'Offers service request returned {response.status_code} status code!')
+            return None
+        return [OfferDbModel(vendor_id=item['id'], price=item['price'], items_in_stock=item['items_in_stock'],
+                             prod_id=product_id) for item in response.json() if item['items_in_stock'] != 0]
+
+    def _get_offers(self, product_id: int) -> "Optional[requests.Response]":
+        """
+        Request offers of a single product from external API
+
+        :param product_id: ID of the product (int)
+        :returns: - 'requests.Response' representing the response or None if the request failed
+        """
+        start = time.perf_counter()
+        try:
+            response = requests.get(self.base_url + f'/products/{product_id}/offers',
+                                    headers={'Bearer': f'{self.auth_code}'}, timeout=self.timeout)
+        except requests.RequestException as e:
+            UPSTREAM_ERRORS.inc('offers', type(e).__name__)
+            print(f'Offers service request failed: {e}')
+            return None
+        finally:
+            UPSTREAM_LATENCY.observe(time.perf_counter() - start, 'offers')
+        return response
 
     def register_product(self, product: ProductDbModel) -> "bool":
         """
@@ -82,10 +187,34 @@ class OffersClient(threading.Thread):
         :param product: json representation of the product (ProductDbModel)
         :returns: 'bool' representing the success of the operation
         """
-        response = requests.post(self.base_url + '/products/register',
-                                 headers={'Bearer': f'{self.auth_code}'},
-                                 json=product_schema.dump(product), verify=False)
+        start = time.perf_counter()
+        try:
+            response = requests.post(self.base_url + '/products/register',
+                                     headers={'Bearer': f'{self.auth_code}'},
+                                     json=product_schema.dump(product), verify=False, timeout=self.timeout)
+        except requests.RequestException as e:
+            UPSTREAM_ERRORS.inc('register', type(e).__name__)
+            raise
+        finally:
+            UPSTREAM_LATENCY.observe(time.perf_counter() - start, 'register')
+        if response.status_code != 201:
+            UPSTREAM_ERRORS.inc('register', response.status_code)
         return response.status_code == 201
 
 
-off_cli = OffersClient()
+_offers_client = None
+_offers_client_lock = threading.Lock()
+
+
+def get_offers_client() -> "OffersClient":
+    """
+    Get client of the external offers API shared by request handlers, created on first use
+
+    :returns: - 'OffersClient' representing the shared client
+    """
+    global _offers_client
+    if _offers_client is None:
+        with _offers_client_lock:
+            if _offers_client is None:
+                _offers_client = OffersClient()
+    return _offers_client
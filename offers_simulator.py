@@ -0,0 +1,350 @@
+"""
+Configurable simulator of the external offers microservice
+
+Offers are not stored; they are computed from (seed, prod_id, vendor_id, tick), so the simulator serves any number of
+products in constant memory and the same configuration always produces the same offers. Run it with e.g.:
+    python offers_simulator.py --port 5001 --latency-ms 20 --error-rate 0.01
+and point OFFER_BASE_URL of the product API to it.
+"""
+import argparse
+import random
+import threading
+import time
+from typing import List
+
+from flask import Flask, jsonify, request
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+MASK64 = (1 << 64) - 1
+CONFIG_KEYS = ('seed', 'min_vendors', 'max_vendors', 'vendor_pool', 'min_price', 'max_price', 'churn',
+               'vanish_rate', 'out_of_stock_rate', 'tick_seconds', 'latency', 'jitter', 'error_rate',
+               'timeout_rate', 'timeout_delay', 'require_registration')
+
+
+def _mix(*values: int) -> "int":
+    """
+    Deterministically hash integers into a 64-bit integer (splitmix64 finalizer applied to each value)
+
+    :param values: Hashed values (int)
+    :returns: - 'int' representing the hash
+    """
+    h = 0x9E3779B97F4A7C15
+    for value in values:
+        h = (h ^ (value & MASK64)) * 0xBF58476D1CE4E5B9 & MASK64
+        h = (h ^ (h >> 31)) * 0x94D049BB133111EB & MASK64
+        h ^= h >> 29
+    return h
+
+
+def _unit(*values: int) -> "float":
+    """
+    Deterministically hash integers into a float from interval [0, 1)
+
+    :param values: Hashed values (int)
+    :returns: - 'float' representing the hash
+    """
+    return (_mix(*values) >> 11) / float(1 << 53)
+
+
+class SimulatorConfig:
+    def __init__(self, seed: int = 0, min_vendors: int = 3, max_vendors: int = 10, vendor_pool: int = 1000,
+                 min_price: int = 100, max_price: int = 100000, churn: float = 0.1, vanish_rate: float = 0.0,
+                 out_of_stock_rate: float = 0.05, tick_seconds: float = 1.0, latency: float = 0.0,
+                 jitter: float = 0.0, error_rate: float = 0.0, timeout_rate: float = 0.0, timeout_delay: float = 30.0,
+                 auth_code: str = 'simulator_auth_code', require_registration: bool = False):
+        """
+        Initialize SimulatorConfig describing behaviour of the offers service simulator
+
+        :param seed: Seed of generated offers (int)
+        :param min_vendors: Minimum number of vendors offering a product (int)
+        :param max_vendors: Maximum number of vendors offering a product (int)
+        :param vendor_pool: Vendor IDs are chosen from 1..vendor_pool (int)
+        :param min_price: Minimum offered price (int)
+        :param max_price: Maximum offered price (int)
+        :param churn: Probability that an offer changes its price and stock in a tick (float)
+        :param vanish_rate: Probability that a vendor is missing from the response in a churn period (float)
+        :param out_of_stock_rate: Probability that an offer has zero items in stock (float)
+        :param tick_seconds: Length of a tick in seconds, 0 means that ticks are advanced only manually (float)
+        :param latency: Delay of each response in seconds (float)
+        :param jitter: Maximum random delay added to latency in seconds (float)
+        :param error_rate: Probability that a request fails with 500 status code (float)
+        :param timeout_rate: Probability that a request is delayed by timeout_delay (float)
+        :param timeout_delay: Delay of timed out requests in seconds (float)
+        :param auth_code: Token returned by /auth and required by other endpoints (str)
+        :param require_registration: Return 404 for offers of products that were not registered (bool)
+        """
+        if min_vendors > max_vendors or max_vendors > vendor_pool:
+            raise ValueError('Parameters should satisfy min_vendors <= max_vendors <= vendor_pool')
+        if not 0 < churn <= 1:
+            raise ValueError('Parameter churn should be from interval (0, 1]')
+        self.seed = seed
+        self.min_vendors = min_vendors
+        self.max_vendors = max_vendors
+        self.vendor_pool = vendor_pool
+        self.min_price = min_price
+        self.max_price = max_price
+        self.churn = churn
+        self.vanish_rate = vanish_rate
+        self.out_of_stock_rate = out_of_stock_rate
+        self.tick_seconds = tick_seconds
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.timeout_delay = timeout_delay
+        self.auth_code = auth_code
+        self.require_registration = require_registration
+
+    def to_json(self) -> "dict":
+        """
+        Convert SimulatorConfig to json
+
+        :returns: 'dict' json representation of SimulatorConfig (without auth code)
+        """
+        return {key: getattr(self, key) for key in CONFIG_KEYS}
+
+
+class OffersSimulator:
+    def __init__(self, config: SimulatorConfig):
+        """
+        Initialize OffersSimulator generating offers of any product
+
+        :param config: Configuration of the simulator (SimulatorConfig)
+        """
+        self.config = config
+        self.started = time.monotonic()
+        self.manual_ticks = 0
+        self.registered = set()
+        self.requests = 0
+        self.errors = 0
+        self.timeouts = 0
+        self._lock = threading.Lock()
+
+    def tick(self) -> "int":
+        """
+        Get current tick
+
+        :returns: - 'int' representing current tick
+        """
+        tick = self.manual_ticks
+        if self.config.tick_seconds > 0:
+            tick += int((time.monotonic() - self.started) / self.config.tick_seconds)
+        return tick
+
+    def advance(self, ticks: int = 1) -> "int":
+        """
+        Manually advance ticks
+
+        :param ticks: Number of ticks (int)
+        :returns: - 'int' representing current tick
+        """
+        with self._lock:
+            self.manual_ticks += ticks
+        return self.tick()
+
+    def vendors(self, prod_id: int) -> "List[int]":
+        """
+        Get IDs of all vendors that may offer given product
+
+        :param prod_id: Product ID (int)
+        :returns: - 'List[int]' representing vendor IDs
+        """
+        cfg = self.config
+        count = cfg.min_vendors + _mix(cfg.seed, prod_id) % (cfg.max_vendors - cfg.min_vendors + 1)
+        # random.Random seeded with int is deterministic across runs and platforms
+        return sorted(random.Random(_mix(cfg.seed, prod_id, 1)).sample(range(1, cfg.vendor_pool + 1), count))
+
+    def offers(self, prod_id: int, tick: int = None) -> "List[dict]":
+        """
+        Get offers of given product in given tick. Each offer changes once per its churn period (1 / churn ticks);
+        periods of different offers are shifted so that a churn fraction of offers changes in every tick
+
+        :param prod_id: Product ID (int)
+        :param tick: Tick, current tick is used if not provided (int)
+        :returns: - 'List[dict]' representing offers in format of the offers service
+        """
+        cfg = self.config
+        if tick is None:
+            tick = self.tick()
+        period = max(1, round(1 / cfg.churn))
+        offers = []
+        for vendor_id in self.vendors(prod_id):
+            epoch = (tick + _mix(cfg.seed, prod_id, vendor_id, 2) % period) // period
+            if cfg.vanish_rate and _unit(cfg.seed, prod_id, vendor_id, epoch, 3) < cfg.vanish_rate:
+                continue
+            base = cfg.min_price + _mix(cfg.seed, prod_id, vendor_id) % (cfg.max_price - cfg.min_price + 1)
+            # prices move within +-20 % of the base price of the offer
+            price = max(1, int(base * (0.8 + 0.4 * _unit(cfg.seed, prod_id, vendor_id, epoch, 4))))
+            if _unit(cfg.seed, prod_id, vendor_id, epoch, 5) < cfg.out_of_stock_rate:
+                stock = 0
+            else:
+                stock = 1 + _mix(cfg.seed, prod_id, vendor_id, epoch, 6) % 1000
+            offers.append({'id': vendor_id, 'price': price, 'items_in_stock': stock})
+        return offers
+
+    def inject_faults(self) -> "bool":
+        """
+        Sleep for configured latency and decide whether the request should fail
+
+        :returns: - 'bool' representing whether the request should fail with server error
+        """
+        cfg = self.config
+        delay = cfg.latency + (random.random() * cfg.jitter if cfg.jitter else 0)
+        failed = False
+        with self._lock:
+            self.requests += 1
+            if cfg.timeout_rate and random.random() < cfg.timeout_rate:
+                self.timeouts += 1
+                delay += cfg.timeout_delay
+            elif cfg.error_rate and random.random() < cfg.error_rate:
+                self.errors += 1
+                failed = True
+        if delay > 0:
+            time.sleep(delay)
+        return failed
+
+    def stats(self) -> "dict":
+        """
+        Get statistics of the simulator
+
+        :returns: - 'dict' representing statistics
+        """
+        return {'tick': self.tick(), 'requests': self.requests, 'errors': self.errors, 'timeouts': self.timeouts,
+                'registered_products': len(self.registered)}
+
+
+def create_simulator_app(simulator: OffersSimulator) -> "Flask":
+    """
+    Create application serving the API of the offers service (/auth, /products/register, /products/<id>/offers)
+    and simulator control endpoints (/simulator/config, /simulator/stats, /simulator/tick)
+
+    :param simulator: Simulator used to generate offers (OffersSimulator)
+    :returns: - 'Flask' representing the application
+    """
+    app = Flask(__name__)
+
+    def authorized() -> "bool":
+        return request.headers.get('Bearer') == simulator.config.auth_code
+
+    @app.route('/auth', methods=['POST'])
+    def auth():
+        if simulator.inject_faults():
+            return jsonify({'msg': 'Simulated server error'}), 500
+        return jsonify(simulator.config.auth_code), 201
+
+    @app.route('/products/register', methods=['POST'])
+    def register():
+        if not authorized():
+            return jsonify({'msg': 'Unauthorized'}), 401
+        if simulator.inject_faults():
+            return jsonify({'msg': 'Simulated server error'}), 500
+        product = request.get_json(silent=True) or {}
+        if 'prod_id' not in product:
+            return jsonify({'msg': 'Missing prod_id'}), 400
+        simulator.registered.add(product['prod_id'])
+        return jsonify({'id': product['prod_id']}), 201
+
+    @app.route('/products/<int:prod_id>/offers', methods=['GET'])
+    def offers(prod_id: int):
+        if not authorized():
+            return jsonify({'msg': 'Unauthorized'}), 401
+        if simulator.inject_faults():
+            return jsonify({'msg': 'Simulated server error'}), 500
+        if simulator.config.require_registration and prod_id not in simulator.registered:
+            return jsonify({'msg': 'Product not registered'}), 404
+        return jsonify(simulator.offers(prod_id)), 200
+
+    @app.route('/simulator/config', methods=['GET', 'PATCH'])
+    def config():
+        if request.method == 'PATCH':
+            for key, value in (request.get_json(silent=True) or {}).items():
+                if key not in CONFIG_KEYS:
+                    return jsonify({'msg': f'Unknown parameter {key}'}), 400
+                setattr(simulator.config, key, value)
+        return jsonify(simulator.config.to_json()), 200
+
+    @app.route('/simulator/stats', methods=['GET'])
+    def stats():
+        return jsonify(simulator.stats()), 200
+
+    @app.route('/simulator/tick', methods=['POST'])
+    def tick():
+        return jsonify({'tick': simulator.advance(int(request.args.get('ticks', 1)))}), 200
+
+    return app
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        # access log of every request would dominate the output under load
+        pass
+
+
+class SimulatorServer(threading.Thread):
+    def __init__(self, config: SimulatorConfig = None, host: str = '127.0.0.1', port: int = 0, quiet: bool = True):
+        """
+        Initialize SimulatorServer serving the simulator in a background thread
+
+        :param config: Configuration of the simulator, default configuration is used if not provided (SimulatorConfig)
+        :param host: Host to bind to (str)
+        :param port: Port to bind to, random free port is chosen if 0 (int)
+        :param quiet: Do not log every request (bool)
+        """
+        super().__init__(daemon=True)
+        self.simulator = OffersSimulator(config or SimulatorConfig())
+        handler = QuietRequestHandler if quiet else WSGIRequestHandler
+        self.server = make_server(host, port, create_simulator_app(self.simulator), threaded=True,
+                                  request_handler=handler)
+        self.base_url = f'http://{host}:{self.server.server_port}'
+
+    def run(self):
+        self.server.serve_forever()
+
+    def shutdown(self):
+        """
+        Stop the server
+        """
+        self.server.shutdown()
+
+
+def main():
+    """
+    Run the simulator from command line
+    """
+    parser = argparse.ArgumentParser(description='Simulator of the external offers microservice')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5001)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--min-vendors', type=int, default=3)
+    parser.add_argument('--max-vendors', type=int, default=10)
+    parser.add_argument('--vendor-pool', type=int, default=1000)
+    parser.add_argument('--churn', type=float, default=0.1)
+    parser.add_argument('--vanish-rate', type=float, default=0.0)
+    parser.add_argument('--out-of-stock-rate', type=float, default=0.05)
+    parser.add_argument('--tick-seconds', type=float, default=1.0)
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    parser.add_argument('--jitter-ms', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--timeout-rate', type=float, default=0.0)
+    parser.add_argument('--timeout-delay', type=float, default=30.0)
+    parser.add_argument('--auth-code', default='simulator_auth_code')
+    parser.add_argument('--require-registration', action='store_true')
+    parser.add_argument('--verbose', action='store_true', help='log every request')
+    args = parser.parse_args()
+    config = SimulatorConfig(seed=args.seed, min_vendors=args.min_vendors, max_vendors=args.max_vendors,
+                             vendor_pool=args.vendor_pool, churn=args.churn, vanish_rate=args.vanish_rate,
+                             out_of_stock_rate=args.out_of_stock_rate, tick_seconds=args.tick_seconds,
+                             latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000,
+                             error_rate=args.error_rate, timeout_rate=args.timeout_rate,
+                             timeout_delay=args.timeout_delay, auth_code=args.auth_code,
+                             require_registration=args.require_registration)
+    server = SimulatorServer(config, host=args.host, port=args.port, quiet=not args.verbose)
+    print(f'Offers service simulator listening on {server.base_url}')
+    try:
+        server.run()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
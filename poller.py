@@ -0,0 +1,72 @@
+"""
+Sharded offers poller running in separate processes
+
+Products are partitioned among all poller workers (on all nodes) by consistent hashing on prod_id. Start it on every
+node, e.g.:
+    python poller.py --workers 4
+and run the API with POLLER_LEASE=none, so that request workers don't start their own poller.
+"""
+import argparse
+import multiprocessing
+import signal
+import socket
+import threading
+from os import getpid
+
+
+def run_worker(worker_id: str):
+    """
+    Run a single sharded poller worker until it receives SIGTERM or SIGINT
+
+    :param worker_id: Unique ID of the worker (str)
+    """
+    # imported here, so that every spawned process creates its own app and DB engine
+    from main import create_app, init_db
+    from poller_shards import ShardedOffersClient
+
+    app = create_app()
+    init_db(app)
+    client = ShardedOffersClient(worker_id)
+    client.define_app_context(app)
+    stopped = threading.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda signum, frame: stopped.set())
+    client.start()
+    print(f'Poller worker {worker_id} started.')
+    while not stopped.wait(1):
+        if not client.is_alive():
+            print(f'Poller worker {worker_id} died.')
+            return
+    client.stop()
+    print(f'Poller worker {worker_id} stopped.')
+
+
+def main():
+    """
+    Start given number of poller worker processes and stop them gracefully on SIGTERM or SIGINT
+    """
+    parser = argparse.ArgumentParser(description='Run sharded offers poller workers')
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('--node-id', default=socket.gethostname(), help='prefix of worker IDs, unique per node')
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context('spawn')
+    processes = [context.Process(target=run_worker, args=(f'{args.node_id}:{getpid()}:{i}',),
+                                 name=f'poller-{i}') for i in range(args.workers)]
+    for process in processes:
+        process.start()
+    stopped = threading.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda signum, frame: stopped.set())
+    while not stopped.wait(1):
+        if not any(process.is_alive() for process in processes):
+            break
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+    for process in processes:
+        process.join()
+
+
+if __name__ == '__main__':
+    main()
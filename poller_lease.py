@@ -0,0 +1,199 @@
+import fcntl
+import os
+import socket
+import tempfile
+import threading
+import time
+from typing import Callable, Optional
+
+import sqlalchemy.exc
+from flask import Flask
+
+from poller_lease_db_model import PollerLeaseDbModel
+
+POLLER_LEASE_NAME = 'offers_poller'
+
+
+def default_owner() -> "str":
+    """
+    Get identifier of current process usable as lease owner
+
+    :returns: - 'str' representing host:pid
+    """
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+class FileLease:
+    def __init__(self, path: str):
+        """
+        Initialize FileLease - exclusive lock of a file shared by all processes on a single host. The lock is released
+        by the OS when the holding process dies, so another process takes over on the next attempt
+
+        :param path: Path to the lock file (str)
+        """
+        self.path = path
+        self._fd = None
+
+    def acquire(self) -> "bool":
+        """
+        Acquire or keep the lease without blocking
+
+        :returns: - 'bool' representing whether the lease is held
+        """
+        if self._fd is not None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._fd = fd
+        return True
+
+    def release(self):
+        """
+        Release the lease
+        """
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+
+class DbLease:
+    def __init__(self, app: Flask, name: str = POLLER_LEASE_NAME, owner: str = None, ttl: float = 15.0):
+        """
+        Initialize DbLease - lease stored in the database, usable across hosts. The holder has to renew it before
+        ttl elapses, otherwise another process takes over
+
+        :param app: App used as context for DB operations (Flask)
+        :param name: Name of the lease (str)
+        :param owner: Identifier of the lease owner, host:pid by default (str)
+        :param ttl: Validity of the lease in seconds (float)
+        """
+        self.app = app
+        self.name = name
+        self.owner = owner or default_owner()
+        self.ttl = ttl
+        # monotonic time the last successful renewal started, None if the lease is not held
+        self._renewed_at = None
+
+    def acquire(self) -> "bool":
+        """
+        Acquire or renew the lease. If the DB fails transiently, e.g. it is locked by the batch writes of the poller,
+        a held lease is kept until ttl elapses since its last renewal, because no other process can take it over
+        before that
+
+        :returns: - 'bool' representing whether the lease is held
+        """
+        start = time.monotonic()
+        with self.app.app_context():
+            try:
+                held = PollerLeaseDbModel.acquire(self.name, self.owner, self.ttl)
+            except sqlalchemy.exc.OperationalError as e:
+                if self._renewed_at is not None and start - self._renewed_at < self.ttl:
+                    return True
+                print(f'Poller lease could not be renewed: {e!r}')
+                self._renewed_at = None
+                return False
+        self._renewed_at = start if held else None
+        return held
+
+    def release(self):
+        """
+        Release the lease
+        """
+        self._renewed_at = None
+        with self.app.app_context():
+            try:
+                PollerLeaseDbModel.release(self.name, self.owner)
+            except sqlalchemy.exc.OperationalError:
+                pass
+
+
+class PollerSupervisor(threading.Thread):
+    def __init__(self, app: Flask, lease, client_factory: Callable, interval: float = 5.0,
+                 drain_timeout: float = 30.0):
+        """
+        Initialize PollerSupervisor that runs the offers poller only while it holds the lease. Every request worker
+        runs its own supervisor and exactly one of them wins the lease; when the winner dies, the lease is freed
+        (file lease) or expires (DB lease) and another supervisor starts a new poller
+
+        :param app: App used as context of the poller (Flask)
+        :param lease: Lease deciding which process runs the poller (FileLease or DbLease)
+        :param client_factory: Function creating a new (not started) OffersClient (Callable)
+        :param interval: Period of lease acquisition and renewal in seconds (float)
+        :param drain_timeout: Maximum time to wait for the poller to finish its current work on stop (float)
+        """
+        super().__init__(daemon=True, name='PollerSupervisor')
+        self.app = app
+        self.lease = lease
+        self.client_factory = client_factory
+        self.interval = interval
+        self.drain_timeout = drain_timeout
+        self.client = None
+        self._stop_event = threading.Event()
+
+    @property
+    def is_leader(self) -> "bool":
+        """
+        Check whether this process currently runs the poller
+
+        :returns: - 'bool' representing whether the poller is running here
+        """
+        return self.client is not None and self.client.is_alive()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            if self.lease.acquire():
+                if not self.is_leader:
+                    self._start_client()
+            elif self.client is not None:
+                print('Poller lease lost, stopping poller.')
+                self._stop_client()
+            self._stop_event.wait(self.interval)
+        self._stop_client()
+        self.lease.release()
+
+    def _start_client(self):
+        try:
+            client = self.client_factory()
+        except (KeyError, ValueError) as e:
+            print(f'Could not create offers client: {e!r}')
+            return
+        client.define_app_context(self.app)
+        client.start()
+        self.client = client
+        print(f'Poller started in process {os.getpid()}.')
+
+    def _stop_client(self):
+        if self.client is not None:
+            self.client.stop(timeout=self.drain_timeout)
+            self.client = None
+
+    def stop(self, timeout: Optional[float] = None):
+        """
+        Stop the supervisor; the poller finishes the product it is processing, then the lease is released
+
+        :param timeout: Maximum time to wait in seconds, drain_timeout + interval by default (float)
+        """
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout if timeout is not None else self.drain_timeout + self.interval)
+
+
+def create_lease(app: Flask, kind: str):
+    """
+    Create lease of given kind configured by environment variables POLLER_LOCK_FILE and POLLER_LEASE_TTL
+
+    :param app: App used as context for DB operations (Flask)
+    :param kind: 'file' or 'db' (str)
+    :returns: - 'FileLease' or 'DbLease' representing the lease
+    """
+    if kind == 'file':
+        return FileLease(os.environ.get('POLLER_LOCK_FILE',
+                                        os.path.join(tempfile.gettempdir(), 'product_api_poller.lock')))
+    elif kind == 'db':
+        return DbLease(app, ttl=float(os.environ.get('POLLER_LEASE_TTL', 15)))
+    raise ValueError(f'Unknown poller lease kind {kind}, use "file" or "db"')
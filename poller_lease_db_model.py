@@ -0,0 +1,81 @@
+import time
+
+from sqlalchemy.exc import IntegrityError
+
+from flask_misc import fl_sql
+
+
+class PollerLeaseDbModel(fl_sql.Model):
+    __tablename__ = 'POLLER_LEASES'
+
+    name = fl_sql.Column(fl_sql.String(100), primary_key=True)
+    owner = fl_sql.Column(fl_sql.String(200), nullable=False)
+    expires_at = fl_sql.Column(fl_sql.Float, nullable=False)
+
+    def __init__(self, name: str, owner: str, expires_at: float):
+        """
+        PollerLeaseDbModel used for SQLAlchemy database; a row is a lease held by a single owner until it expires
+
+        :param name: Name of the lease (str)
+        :param owner: Identifier of the lease owner, e.g. host:pid (str)
+        :param expires_at: UNIX time when the lease expires unless renewed (float)
+        """
+        self.name = name
+        self.owner = owner
+        self.expires_at = expires_at
+
+    def __repr__(self):
+        """
+        Return string representation of the PollerLeaseDbModel
+
+        :returns: - 'str' representing lease
+        """
+        return f'Lease name = {self.name}, owner = {self.owner}, expires_at = {self.expires_at}'
+
+    @classmethod
+    def acquire(cls, name: str, owner: str, ttl: float) -> "bool":
+        """
+        Acquire or renew lease. The lease is granted if it does not exist, has expired or is already held by the owner
+
+        :param name: Name of the lease (str)
+        :param owner: Identifier of the lease owner (str)
+        :param ttl: Validity of the lease in seconds (float)
+        :returns: - 'bool' representing whether the owner holds the lease
+        """
+        now = time.time()
+        # single conditional UPDATE, so that two contenders can never both succeed
+        updated = cls.query.filter(cls.name == name, (cls.owner == owner) | (cls.expires_at < now)) \
+            .update({'owner': owner, 'expires_at': now + ttl}, synchronize_session=False)
+        if updated:
+            fl_sql.session.commit()
+            return True
+        try:
+            fl_sql.session.add(cls(name=name, owner=owner, expires_at=now + ttl))
+            fl_sql.session.commit()
+            return True
+        except IntegrityError:
+            fl_sql.session.rollback()
+            return False
+
+    @classmethod
+    def release(cls, name: str, owner: str) -> "bool":
+        """
+        Release lease held by the owner, so that another contender can take over immediately
+
+        :param name: Name of the lease (str)
+        :param owner: Identifier of the lease owner (str)
+        :returns: - 'bool' representing success of the operation
+        """
+        updated = cls.query.filter_by(name=name, owner=owner).update({'expires_at': 0}, synchronize_session=False)
+        fl_sql.session.commit()
+        return bool(updated)
+
+    @classmethod
+    def find_by_name(cls, name: str) -> "PollerLeaseDbModel":
+        """
+        Find lease by name
+
+        :param name: Name of the lease (str)
+        :returns: - 'PollerLeaseDbModel' representing lease
+        """
+        return cls.query.filter_by(name=name).one_or_none()
@@ -0,0 +1,97 @@
+import time
+from typing import List
+
+from flask_misc import fl_sql
+
+
+class PollerMemberDbModel(fl_sql.Model):
+    __tablename__ = 'POLLER_MEMBERS'
+
+    worker_id = fl_sql.Column(fl_sql.String(200), primary_key=True)
+    heartbeat = fl_sql.Column(fl_sql.Float, nullable=False)
+    products = fl_sql.Column(fl_sql.Integer, nullable=False, default=0)
+    last_cycle_start = fl_sql.Column(fl_sql.Float, nullable=True)
+    last_cycle_seconds = fl_sql.Column(fl_sql.Float, nullable=True)
+
+    def __init__(self, worker_id: str, heartbeat: float):
+        """
+        PollerMemberDbModel used for SQLAlchemy database; a row represents a live sharded poller worker
+
+        :param worker_id: Unique ID of the worker, e.g. host:pid:index (str)
+        :param heartbeat: UNIX time of the last heartbeat (float)
+        """
+        self.worker_id = worker_id
+        self.heartbeat = heartbeat
+        self.products = 0
+
+    def __repr__(self):
+        """
+        Return string representation of the PollerMemberDbModel
+
+        :returns: - 'str' representing poller worker
+        """
+        return f'Poller worker_id = {self.worker_id}, heartbeat = {self.heartbeat}, products = {self.products}'
+
+    @classmethod
+    def beat(cls, worker_id: str) -> "bool":
+        """
+        Record heartbeat of the worker (registering the worker if needed)
+
+        :param worker_id: Unique ID of the worker (str)
+        :returns: - 'bool' representing success of the operation
+        """
+        now = time.time()
+        updated = cls.query.filter_by(worker_id=worker_id).update({'heartbeat': now}, synchronize_session=False)
+        if not updated:
+            fl_sql.session.add(cls(worker_id=worker_id, heartbeat=now))
+        fl_sql.session.commit()
+        return True
+
+    @classmethod
+    def record_cycle(cls, worker_id: str, products: int, cycle_start: float, cycle_seconds: float):
+        """
+        Record statistics of a finished poller cycle of the worker
+
+        :param worker_id: Unique ID of the worker (str)
+        :param products: Number of products in the shard of the worker (int)
+        :param cycle_start: UNIX time when the cycle started (float)
+        :param cycle_seconds: Duration of the cycle in seconds (float)
+        """
+        cls.query.filter_by(worker_id=worker_id).update({'products': products, 'last_cycle_start': cycle_start,
+                                                         'last_cycle_seconds': cycle_seconds},
+                                                        synchronize_session=False)
+        fl_sql.session.commit()
+
+    @classmethod
+    def find_live(cls, ttl: float) -> "List[PollerMemberDbModel]":
+        """
+        Find workers whose last heartbeat is not older than ttl
+
+        :param ttl: Maximum age of the heartbeat in seconds (float)
+        :returns: - 'List[PollerMemberDbModel]' representing live workers ordered by worker ID
+        """
+        return cls.query.filter(cls.heartbeat >= time.time() - ttl).order_by(cls.worker_id).all()
+
+    @classmethod
+    def delete_by_id(cls, worker_id: str) -> "bool":
+        """
+        Remove worker, so that its shard is taken over without waiting for its heartbeat to expire
+
+        :param worker_id: Unique ID of the worker (str)
+        :returns: - 'bool' representing success of the operation
+        """
+        deleted = cls.query.filter_by(worker_id=worker_id).delete(synchronize_session=False)
+        fl_sql.session.commit()
+        return bool(deleted)
+
+    @classmethod
+    def delete_expired(cls, max_age: float) -> "int":
+        """
+        Remove workers whose heartbeat is older than max_age
+
+        :param max_age: Maximum age of the heartbeat in seconds (float)
+        :returns: - 'int' representing number of removed workers
+        """
+        deleted = cls.query.filter(cls.heartbeat < time.time() - max_age).delete(synchronize_session=False)
+        fl_sql.session.commit()
+        return deleted
@@ -0,0 +1,154 @@
+import hashlib
+import threading
+import time
+from bisect import bisect_right
+from os import environ
+from typing import Iterable, List
+
+import sqlalchemy.exc
+
+from flask_misc import fl_sql
+from metrics import REGISTRY, CallbackGauge
+from offers_client import OffersClient
+from poller_member_db_model import PollerMemberDbModel
+from product_db_model import ProductDbModel
+
+SHARD_TTL = float(environ.get('POLLER_SHARD_TTL', 15))
+VIRTUAL_NODES = 64
+
+
+def _hash(key: str) -> "int":
+    """
+    Hash key to a position on the ring (stable across processes, unlike built-in hash())
+
+    :param key: Hashed key (str)
+    :returns: - 'int' representing 64-bit position
+    """
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], 'big')
+
+
+class HashRing:
+    def __init__(self, members: Iterable[str], virtual_nodes: int = VIRTUAL_NODES):
+        """
+        Initialize HashRing assigning products to poller workers by consistent hashing; when a worker joins or leaves,
+        only products of its own shard are moved
+
+        :param members: IDs of the workers (Iterable[str])
+        :param virtual_nodes: Number of ring positions of each worker, more positions mean more even shards (int)
+        """
+        self.members = tuple(sorted(set(members)))
+        points = sorted((_hash(f'{member}#{i}'), member) for member in self.members for i in range(virtual_nodes))
+        self._positions = [position for position, _ in points]
+        self._owners = [member for _, member in points]
+
+    def owner(self, prod_id: int) -> "str":
+        """
+        Find worker owning given product
+
+        :param prod_id: Product ID (int)
+        :returns: - 'str' representing worker ID or None if the ring is empty
+        """
+        if not self._positions:
+            return None
+        index = bisect_right(self._positions, _hash(str(prod_id)))
+        return self._owners[index % len(self._owners)]
+
+
+class ShardedOffersClient(OffersClient):
+    def __init__(self, worker_id: str, ttl: float = SHARD_TTL):
+        """
+        Initialize ShardedOffersClient polling only products of its own shard. Workers announce themselves by
+        heartbeats in POLLER_MEMBERS table and the shards are recomputed from live workers at the start of every
+        cycle, so shards of a dead worker are taken over once its heartbeat expires
+
+        :param worker_id: Unique ID of the worker, e.g. host:pid:index (str)
+        :param ttl: Time in seconds after which a worker without heartbeat is considered dead (float)
+        """
+        super().__init__()
+        self.name = f'ShardedOffersClient-{worker_id}'
+        self.worker_id = worker_id
+        self.ttl = ttl
+        self.ring = HashRing([worker_id])
+        self.shard_size = 0
+        self._heartbeat_thread = None
+        self._first_heartbeat = threading.Event()
+
+    def run(self, *args, **kwargs):
+        self._heartbeat_thread = threading.Thread(target=self._heartbeat_loop, daemon=True,
+                                                  name=f'Heartbeat-{self.worker_id}')
+        self._heartbeat_thread.start()
+        try:
+            self._wait_for_peers()
+            super().run(*args, **kwargs)
+        finally:
+            self._stop_event.set()
+            self._heartbeat_thread.join()
+            with self.app.app_context():
+                try:
+                    # leave the group immediately, so that other workers take over the shard in their next cycle
+                    PollerMemberDbModel.delete_by_id(self.worker_id)
+                except sqlalchemy.exc.OperationalError:
+                    pass
+
+    def _heartbeat_loop(self):
+        with self.app.app_context():
+            while not self._stop_event.is_set():
+                try:
+                    PollerMemberDbModel.beat(self.worker_id)
+                    self._first_heartbeat.set()
+                except sqlalchemy.exc.OperationalError as e:
+                    fl_sql.session.rollback()
+                    print(f'Heartbeat of poller {self.worker_id} failed: {e!r}')
+                self._stop_event.wait(self.ttl / 3)
+
+    def _wait_for_peers(self):
+        # workers started at the same time have to see each other before the first cycle,
+        # otherwise each of them would poll the whole catalogue
+        self._first_heartbeat.wait(self.ttl)
+        self._stop_event.wait(self.ttl / 3)
+
+    def product_ids(self) -> "List[int]":
+        """
+        Get IDs of products in the shard of this worker
+
+        :returns: - 'List[int]' representing product IDs
+        """
+        members = [member.worker_id for member in PollerMemberDbModel.find_live(self.ttl)]
+        if self.worker_id not in members:
+            members.append(self.worker_id)
+        if tuple(sorted(members)) != self.ring.members:
+            self.ring = HashRing(members)
+            print(f'Poller {self.worker_id}: shards rebalanced among {len(self.ring.members)} workers.')
+        product_ids = [prod_id for prod_id in ProductDbModel.find_all_ids()
+                       if self.ring.owner(prod_id) == self.worker_id]
+        self.shard_size = len(product_ids)
+        return product_ids
+
+    def poll_once(self) -> "int":
+        """
+        Poll all products of the shard once and record cycle statistics used for shard lag metrics
+
+        :returns: - 'int' representing number of inserted offers
+        """
+        cycle_start = time.time()
+        inserted = super().poll_once()
+        PollerMemberDbModel.record_cycle(self.worker_id, self.shard_size, cycle_start, time.time() - cycle_start)
+        return inserted
+
+
+def _shard_lag_samples() -> "list":
+    now = time.time()
+    return [((member.worker_id,), now - member.last_cycle_start)
+            for member in PollerMemberDbModel.find_live(SHARD_TTL) if member.last_cycle_start is not None]
+
+
+def _shard_size_samples() -> "list":
+    return [((member.worker_id,), member.products) for member in PollerMemberDbModel.find_live(SHARD_TTL)]
+
+
+# Collected from POLLER_MEMBERS when /metrics is rendered, so that any API worker reports all shards
+REGISTRY.register(CallbackGauge('poller_shard_lag_seconds',
+                                'Time since the start of the last finished poller cycle of the shard',
+                                ('worker',), _shard_lag_samples))
+REGISTRY.register(CallbackGauge('poller_shard_products', 'Number of products in the shard', ('worker',),
+                                _shard_size_samples))
@@ -0,0 +1,92 @@
+"""
+Compact price history store
+
+With PRICE_SERIES=1 every stored offer also appends its timestamp and price to the history of its product and vendor
+in PRICE_SERIES, where chunks of up to CHUNK_POINTS observations are delta encoded into binary blobs, and the price
+history endpoints decode these chunks instead of scanning OFFERS. An observation usually takes 4-6 B of the blob
+(microsecond time delta and price delta as varints), while an OFFERS row takes about 50 B plus its indexes.
+
+Histories of offers stored before the store was enabled are built by the one-off job, which must not run together
+with the poller:
+    python price_series.py --backfill
+"""
+import argparse
+import sys
+import time
+from operator import itemgetter
+from typing import List
+
+from sqlalchemy import select
+
+from flask_misc import fl_sql
+from offer_db_model import OfferDbModel, IN_CHUNK_SIZE
+from offer_partition_db_model import OfferPartitionDbModel
+from price_series_db_model import PriceSeriesDbModel, CHUNK_POINTS
+
+
+def backfill(batch_size: int = IN_CHUNK_SIZE) -> "int":
+    """
+    Rebuild all compact price histories from OFFERS and its archive partitions, committing after every batch of
+    products. Must be called within app context
+
+    :param batch_size: Number of products whose histories are built in one transaction (int)
+    :returns: - 'int' representing number of stored price observations
+    """
+    PriceSeriesDbModel.query.delete(synchronize_session=False)
+    partitions = OfferPartitionDbModel.find_overlapping()
+    prod_ids = {prod_id for prod_id, in fl_sql.session.query(OfferDbModel.prod_id).distinct()}
+    for partition in partitions:
+        prod_ids.update(fl_sql.session.execute(select(partition.table.c.prod_id).distinct()).scalars())
+    prod_ids = sorted(prod_ids)
+    points = 0
+    for i in range(0, len(prod_ids), batch_size):
+        batch = prod_ids[i:i + batch_size]
+        rows = fl_sql.session.query(OfferDbModel.prod_id, OfferDbModel.vendor_id, OfferDbModel.date_created,
+                                    OfferDbModel.internal_id, OfferDbModel.price) \
+            .filter(OfferDbModel.prod_id.in_(batch)).all()
+        for partition in partitions:
+            rows.extend(partition.select(['prod_id', 'vendor_id', 'date_created', 'internal_id', 'price'],
+                                         lambda table: [table.c.prod_id.in_(batch)]))
+        rows.sort(key=itemgetter(0, 1, 2, 3))
+        series = None
+        for prod_id, vendor_id, date_created, _, price in rows:
+            same_pair = series is not None and (series.prod_id, series.vendor_id) == (prod_id, vendor_id)
+            if same_pair and series.count < CHUNK_POINTS:
+                series.append(date_created, price)
+            else:
+                series = PriceSeriesDbModel(prod_id, vendor_id, series.chunk + 1 if same_pair else 0, date_created,
+                                            price)
+                fl_sql.session.add(series)
+        fl_sql.session.commit()
+        points += len(rows)
+    return points
+
+
+def main(argv: List[str] = None) -> "int":
+    """
+    Build or inspect compact price histories
+
+    :param argv: Command line arguments (List[str])
+    :returns: - 'int' representing exit code
+    """
+    parser = argparse.ArgumentParser(description='Compact price history store')
+    parser.add_argument('--backfill', action='store_true', help='rebuild histories from all stored offers')
+    args = parser.parse_args(argv)
+
+    from main import create_app, init_db
+    app = create_app()
+    init_db(app)
+    with app.app_context():
+        if args.backfill:
+            start = time.perf_counter()
+            points = backfill()
+            print(f'Stored {points} price observations in {time.perf_counter() - start:.1f} s.')
+        stats = PriceSeriesDbModel.storage_stats()
+        offers = OfferDbModel.query.count()
+    print(f'{stats["points"]} price observations in {stats["chunks"]} chunks take {stats["bytes"]} B of deltas '
+          f'({stats["bytes"] / max(stats["points"], 1):.1f} B per observation), OFFERS has {offers} rows.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
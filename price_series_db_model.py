@@ -0,0 +1,235 @@
+from datetime import datetime, timedelta
+from os import environ
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Tuple
+
+from flask import current_app
+from sqlalchemy import tuple_
+
+from flask_misc import fl_sql
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+# Number of price observations in a chunk; appending rewrites the open chunk, so it must stay small
+CHUNK_POINTS = 256
+IN_CHUNK_SIZE = 250
+
+
+class PricePoint(NamedTuple):
+    prod_id: int
+    vendor_id: int
+    price: int
+    date_created: datetime
+
+
+def series_enabled() -> "bool":
+    """
+    Whether price observations are stored in PRICE_SERIES and histories read from it, enabled by PRICE_SERIES=1.
+    Must be called within app context
+
+    :returns: - 'bool' representing whether the compact history store is used
+    """
+    return bool(current_app.config.get('PRICE_SERIES', environ.get('PRICE_SERIES', '0') != '0'))
+
+
+def _to_us(date: datetime) -> "int":
+    return (date - EPOCH) // MICROSECOND
+
+
+def _encode(values: Iterable[int]) -> "bytes":
+    """
+    Encode integers as zigzag varints - small values of both signs take a single byte
+
+    :param values: Encoded integers (Iterable[int])
+    :returns: - 'bytes' representing encoded integers
+    """
+    out = bytearray()
+    for value in values:
+        value = value * 2 if value >= 0 else -value * 2 - 1
+        while value > 0x7f:
+            out.append(value & 0x7f | 0x80)
+            value >>= 7
+        out.append(value)
+    return bytes(out)
+
+
+def _decode(data: bytes) -> "Iterator[int]":
+    """
+    Decode integers encoded by _encode
+
+    :param data: Encoded integers (bytes)
+    :returns: - 'Iterator[int]' representing decoded integers
+    """
+    value = shift = 0
+    for byte in data:
+        value |= (byte & 0x7f) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        yield value >> 1 if not value & 1 else -(value >> 1) - 1
+        value = shift = 0
+
+
+class PriceSeriesDbModel(fl_sql.Model):
+    __tablename__ = 'PRICE_SERIES'
+
+    prod_id = fl_sql.Column(fl_sql.Integer, primary_key=True, autoincrement=False)
+    vendor_id = fl_sql.Column(fl_sql.Integer, primary_key=True, autoincrement=False)
+    chunk = fl_sql.Column(fl_sql.Integer, primary_key=True, autoincrement=False)
+    count = fl_sql.Column(fl_sql.Integer, nullable=False)
+    first_us = fl_sql.Column(fl_sql.BigInteger, nullable=False)
+    first_price = fl_sql.Column(fl_sql.Integer, nullable=False)
+    last_us = fl_sql.Column(fl_sql.BigInteger, nullable=False)
+    last_price = fl_sql.Column(fl_sql.Integer, nullable=False)
+    # (time delta in microseconds, price delta) of every point after the first one, as zigzag varints
+    data = fl_sql.Column(fl_sql.LargeBinary, nullable=False)
+
+    def __init__(self, prod_id: int, vendor_id: int, chunk: int, date_created: datetime, price: int):
+        """
+        PriceSeriesDbModel used for SQLAlchemy database; a row is a chunk of the price history of a product offered
+        by a vendor, with timestamps and prices delta encoded in a binary blob
+
+        :param prod_id: Product ID (int)
+        :param vendor_id: Vendor ID (int)
+        :param chunk: Sequence number of the chunk in the history (int)
+        :param date_created: Datetime of the first price observation (datetime)
+        :param price: First price (int)
+        """
+        self.prod_id = prod_id
+        self.vendor_id = vendor_id
+        self.chunk = chunk
+        self.count = 1
+        self.first_us = self.last_us = _to_us(date_created)
+        self.first_price = self.last_price = price
+        self.data = b''
+
+    def __repr__(self):
+        """
+        Return string representation of the PriceSeriesDbModel
+
+        :returns: - 'str' representing chunk of price history
+        """
+        return f'Price series prod_id = {self.prod_id}, vendor_id = {self.vendor_id}, chunk = {self.chunk}, ' \
+               f'count = {self.count}, bytes = {len(self.data)}'
+
+    def points(self) -> "Iterator[Tuple[int, int]]":
+        """
+        Decode price observations of the chunk
+
+        :returns: - 'Iterator[Tuple[int, int]]' representing microseconds since epoch and price
+        """
+        timestamp, price = self.first_us, self.first_price
+        yield timestamp, price
+        deltas = _decode(self.data)
+        for time_delta in deltas:
+            timestamp += time_delta
+            price += next(deltas)
+            yield timestamp, price
+
+    def append(self, date_created: datetime, price: int):
+        """
+        Append a price observation to the chunk
+
+        :param date_created: Datetime of the observation (datetime)
+        :param price: Observed price (int)
+        """
+        timestamp = _to_us(date_created)
+        self.data = self.data + _encode((timestamp - self.last_us, price - self.last_price))
+        self.count += 1
+        self.last_us = timestamp
+        self.last_price = price
+
+    @classmethod
+    def append_many(cls, points: Iterable[Tuple[int, int, datetime, int]]):
+        """
+        Append price observations to histories of products and vendors as part of the current transaction
+        (the caller commits)
+
+        :param points: Product ID, vendor ID, datetime and price of observations in the order they were made
+                       (Iterable[Tuple[int, int, datetime, int]])
+        """
+        points = list(points)
+        pairs = sorted({(prod_id, vendor_id) for prod_id, vendor_id, _, _ in points})
+        open_chunks: Dict[Tuple[int, int], PriceSeriesDbModel] = {}
+        for i in range(0, len(pairs), IN_CHUNK_SIZE):
+            chunk_pairs = pairs[i:i + IN_CHUNK_SIZE]
+            # the newest chunk of each pair, full chunks are replaced by a new one below
+            newest = fl_sql.session.query(cls.prod_id, cls.vendor_id, fl_sql.func.max(cls.chunk).label('chunk')) \
+                .filter(tuple_(cls.prod_id, cls.vendor_id).in_(chunk_pairs)) \
+                .group_by(cls.prod_id, cls.vendor_id).subquery()
+            for series in cls.query.join(newest, (cls.prod_id == newest.c.prod_id) &
+                                         (cls.vendor_id == newest.c.vendor_id) & (cls.chunk == newest.c.chunk)):
+                open_chunks[(series.prod_id, series.vendor_id)] = series
+        for prod_id, vendor_id, date_created, price in points:
+            series = open_chunks.get((prod_id, vendor_id))
+            if series is not None and series.count < CHUNK_POINTS:
+                series.append(date_created, price)
+                continue
+            series = cls(prod_id, vendor_id, 0 if series is None else series.chunk + 1, date_created, price)
+            fl_sql.session.add(series)
+            open_chunks[(prod_id, vendor_id)] = series
+
+    @classmethod
+    def find_history_between_dates(cls, from_date: datetime, to_date: datetime, pairs: List[Tuple[int, int]] = None,
+                                   prod_id: int = None) -> "Iterator[PricePoint]":
+        """
+        Find price history of many product and vendor pairs (or of a product with all vendors) between two dates,
+        decoding only chunks overlapping the interval
+
+        :param from_date: Start of the interval (datetime)
+        :param to_date: End of the interval (datetime)
+        :param pairs: Product ID and vendor ID pairs (List[Tuple[int, int]])
+        :param prod_id: Product ID, all vendors of the product are returned if pairs are not provided (int)
+        :returns: - 'Iterator[PricePoint]' representing price observations ordered by product ID, vendor ID and date
+        """
+        from_us, to_us = _to_us(from_date), _to_us(to_date)
+        query = cls.query.filter(cls.first_us <= to_us, cls.last_us >= from_us) \
+            .order_by(cls.prod_id, cls.vendor_id, cls.chunk)
+        if pairs is None:
+            queries = [query.filter(cls.prod_id == prod_id)]
+        else:
+            pairs = sorted(set(pairs))
+            queries = [query.filter(tuple_(cls.prod_id, cls.vendor_id).in_(pairs[i:i + IN_CHUNK_SIZE]))
+                       for i in range(0, len(pairs), IN_CHUNK_SIZE)]
+        for chunk_query in queries:
+            series_points = []
+            series_key = None
+            for series in chunk_query:
+                if (series.prod_id, series.vendor_id) != series_key:
+                    yield from cls._sorted_points(series_key, series_points)
+                    series_key, series_points = (series.prod_id, series.vendor_id), []
+                series_points.extend(point for point in series.points() if from_us <= point[0] <= to_us)
+            yield from cls._sorted_points(series_key, series_points)
+
+    @staticmethod
+    def _sorted_points(series_key: Tuple[int, int], points: List[Tuple[int, int]]) -> "Iterator[PricePoint]":
+        # points are appended in the order of observation, sorting only guards against clock changes
+        points.sort(key=lambda point: point[0])
+        for timestamp, price in points:
+            yield PricePoint(series_key[0], series_key[1], price, EPOCH + timestamp * MICROSECOND)
+
+    @classmethod
+    def delete_orphans(cls, prod_ids: List[int] = None) -> "int":
+        """
+        Delete histories of products that don't exist and commit
+
+        :param prod_ids: Only histories of these (deleted) products if provided (List[int])
+        :returns: - 'int' representing number of deleted chunks
+        """
+        from product_db_model import ProductDbModel
+        query = cls.query.filter(~cls.prod_id.in_(fl_sql.session.query(ProductDbModel.prod_id)))
+        if prod_ids is not None:
+            query = query.filter(cls.prod_id.in_(prod_ids))
+        deleted = query.delete(synchronize_session=False)
+        fl_sql.session.commit()
+        return deleted
+
+    @classmethod
+    def storage_stats(cls) -> "dict":
+        """
+        Get size of the stored histories
+
+        :returns: - 'dict' representing number of chunks, price observations and bytes of encoded deltas
+        """
+        chunks, points, data_bytes = fl_sql.session.query(fl_sql.func.count(), fl_sql.func.sum(cls.count),
+                                                          fl_sql.func.sum(fl_sql.func.length(cls.data))).one()
+        return {'chunks': chunks, 'points': points or 0, 'bytes': data_bytes or 0}
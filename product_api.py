@@ -4,9 +4,12 @@ from sqlalchemy.exc import MultipleResultsFound
 from product_db_model import ProductDbModel
 from product_db_schema import ProductDbSchema
 from marshmallow import ValidationError
-from offers_client import off_cli
+from offers_client import get_offers_client
 from auth_api import evaluate_token
-from flask_misc import RESPONSE200, RESPONSE201, RESPONSE204, RESPONSE400, RESPONSE401, RESPONSE403, RESPONSE500
+from flask_misc import RESPONSE200, RESPONSE201, RESPONSE204, RESPONSE400, RESPONSE401, RESPONSE403, RESPONSE500, \
+    fields_arg
+from metrics import phase
+from offer_cleanup import schedule_purge
 import os
 
 product_ns = Namespace('product', description='Product related operations')
@@ -14,6 +17,7 @@ products_ns = Namespace('products', description='Products related operations')
 
 product_schema = ProductDbSchema()
 product_list_schema = ProductDbSchema(many=True)
+MAX_DELETED_PRODUCTS = 10000
 
 product_body = {'name': fields.String('Name of the Product'),
                 'description': fields.String('Description of the Product')}
@@ -21,6 +25,10 @@ product_body_res = {'prod_id': fields.Integer('Product ID'), 'name': fields.Stri
                     'description': fields.String('Product description')}
 
 product_model = products_ns.model(name='Product', model=product_body)
+product_ids_model = products_ns.model(name='ProductIds', model={
+    'prod_ids': fields.List(fields.Integer('Product ID'))})
+product_delete_model_res = products_ns.model(name='DeletedProducts', model={
+    'deleted': fields.Integer('Number of deleted products')})
 product_model_res = products_ns.model(name='ProductWithId', model=product_body_res)
 
 
@@ -44,11 +52,13 @@ class Product(Resource):
         if auth_check != 200:
             return {'message': msg}, auth_check
         try:
-            product = ProductDbModel.find_by_id(prod_id)
+            with phase('query'):
+                product = ProductDbModel.find_by_id(prod_id)
         except MultipleResultsFound:
             return {'message': RESPONSE500}, 500
 
-        return product_schema.dump(product), 200
+        with phase('serialize'):
+            return product_schema.dump(product), 200
 
     @staticmethod
     @product_ns.doc('Delete a product')
@@ -70,6 +80,7 @@ class Product(Resource):
             return {'message': msg}, auth_check
         is_deleted = ProductDbModel.delete_by_id(prod_id)
         if is_deleted:
+            schedule_purge([prod_id])
             return {'message': RESPONSE204}, 204
         else:
             return {'message': f'No product with prod_id={prod_id} was found and therefore was not deleted'}, 200
@@ -115,8 +126,10 @@ class Product(Resource):
 
 class ProductList(Resource):
     @staticmethod
+    @products_ns.param('fields', f'Comma separated fields of products to return, some of {", ".join(product_body_res)}')
     @products_ns.doc('Get all products')
     @products_ns.response(200, RESPONSE200, [product_model_res])
+    @products_ns.response(400, RESPONSE400)
     @products_ns.response(401, RESPONSE401)
     @products_ns.response(403, RESPONSE403)
     def get() -> "(str, int)":
@@ -130,8 +143,51 @@ class ProductList(Resource):
         msg, auth_check = evaluate_token(request.headers.get('Bearer'))
         if auth_check != 200:
             return {'message': msg}, auth_check
-        product_list = ProductDbModel.find_all()
-        return product_list_schema.dump(product_list), 200
+        try:
+            columns = fields_arg(product_body_res)
+        except ValueError as e:
+            return {'message': f'{RESPONSE400} - {e}'}, 400
+        with phase('query'):
+            product_list = ProductDbModel.find_all(columns)
+        with phase('serialize'):
+            if columns is None:
+                return product_list_schema.dump(product_list), 200
+            product_list = ProductDbSchema(many=True, only=columns).dump([row._asdict() for row in product_list])
+            # the schema doesn't keep the order of the fields
+            return [{column: product[column] for column in columns} for product in product_list], 200
+
+    @staticmethod
+    @products_ns.expect(product_ids_model)
+    @products_ns.doc('Delete products')
+    @products_ns.response(200, RESPONSE200, product_delete_model_res)
+    @products_ns.response(400, RESPONSE400)
+    @products_ns.response(401, RESPONSE401)
+    @products_ns.response(403, RESPONSE403)
+    def delete() -> "(str, int)":
+        """
+        Delete products by product IDs in a single transaction; offers of deleted products are deactivated
+        immediately and deleted in the background
+
+        :returns:
+            - info - 'str' json representing number of deleted products or 'message' info if not successful
+            - sc - 'int' representing HTTP status code
+        """
+        msg, auth_check = evaluate_token(request.headers.get('Bearer'))
+        if auth_check != 200:
+            return {'message': msg}, auth_check
+        try:
+            prod_ids = request.get_json()['prod_ids']
+            if not isinstance(prod_ids, list) or \
+                    not all(isinstance(prod_id, int) and not isinstance(prod_id, bool) for prod_id in prod_ids):
+                raise TypeError('prod_ids must be a list of integers')
+        except (KeyError, TypeError) as e:
+            return {'message': f'{RESPONSE400} - {e!r}'}, 400
+        if not 0 < len(prod_ids) <= MAX_DELETED_PRODUCTS:
+            return {'message': f'Between 1 and {MAX_DELETED_PRODUCTS} product IDs must be provided'}, 400
+        deleted = ProductDbModel.delete_many(prod_ids)
+        if deleted:
+            schedule_purge(prod_ids)
+        return {'deleted': deleted}, 200
 
     @products_ns.expect(product_model)
     @products_ns.doc('Create a product')
@@ -169,7 +225,7 @@ class ProductList(Resource):
         is_created = product_data.insert()
         if not is_created:
             return {'message': 'Internal server error - object not created'}, 500
-        if off_cli.register_product(product_data):
+        if get_offers_client().register_product(product_data):
             return product_schema.dump(product_data), 201
         else:
             return {'message': 'Internal server error - object not registered'}, 500
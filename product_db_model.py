@@ -1,6 +1,7 @@
 from sqlalchemy.exc import IntegrityError
 from typing import List
 from flask_misc import fl_sql
+from offer_db_model import OfferDbModel, IN_CHUNK_SIZE
 
 NAME_MAX_LENGTH = 100
 DESCRIPTION_MAX_LENGTH = 200
@@ -8,6 +9,8 @@ DESCRIPTION_MAX_LENGTH = 200
 
 class ProductDbModel(fl_sql.Model):
     __tablename__ = 'PRODUCTS'
+    # IDs of deleted products are never reused, their offers, histories and watches are purged in the background
+    __table_args__ = {'sqlite_autoincrement': True}
 
     prod_id = fl_sql.Column(fl_sql.Integer, primary_key=True)
     # We don't want to have multiple DB items with the same name
@@ -101,24 +104,55 @@ class ProductDbModel(fl_sql.Model):
         return cls.query.filter_by(name=name).one_or_none()
 
     @classmethod
-    def find_all(cls) -> "List[ProductDbModel]":
+    def find_all(cls, columns: List[str] = None) -> "List[ProductDbModel]":
         """
         Find all products
 
-        :returns: - 'List[ProductDbModel] representing all products
+        :param columns: Only these columns are selected if provided (List[str])
+        :returns: - 'List[ProductDbModel] representing all products (rows of the columns if provided)
         """
-        return cls.query.all()
+        if columns is None:
+            return cls.query.all()
+        return fl_sql.session.query(*(getattr(cls, column) for column in columns)).all()
+
+    @classmethod
+    def find_all_ids(cls) -> "List[int]":
+        """
+        Find IDs of all products (without loading whole products)
+
+        :returns: - 'List[int]' representing IDs of all products
+        """
+        return [prod_id for prod_id, in fl_sql.session.query(cls.prod_id).order_by(cls.prod_id).all()]
 
     @classmethod
     def delete_by_id(cls, prod_id: int) -> "bool":
         """
-        Delete product by product ID
+        Delete product by product ID. Its offers are deactivated immediately and deleted later in batches,
+        see offer_cleanup
 
         :param prod_id: Product ID (int)
         :returns: - 'bool' representing success of the operation
         """
-        deleted = cls.query.filter_by(prod_id=prod_id).delete(synchronize_session='fetch')
-        if deleted:
-            fl_sql.session.commit()
-            return True
-        return False
+        return cls.delete_many([prod_id]) > 0
+
+    @classmethod
+    def delete_many(cls, prod_ids: List[int]) -> "int":
+        """
+        Delete products by product IDs in a single transaction. Their offers are deactivated immediately and deleted
+        later in batches, see offer_cleanup
+
+        :param prod_ids: Product IDs (List[int])
+        :returns: - 'int' representing number of deleted products
+        """
+        prod_ids = sorted(set(prod_ids))
+        deleted = 0
+        for i in range(0, len(prod_ids), IN_CHUNK_SIZE):
+            # products loaded in the session are matched in Python instead of selecting deleted rows first
+            deleted += cls.query.filter(cls.prod_id.in_(prod_ids[i:i + IN_CHUNK_SIZE])) \
+                .delete(synchronize_session='evaluate')
+        if not deleted:
+            fl_sql.session.rollback()
+            return 0
+        OfferDbModel.deactivate_by_prod_ids(prod_ids)
+        fl_sql.session.commit()
+        return deleted
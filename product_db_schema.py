@@ -1,10 +1,12 @@
-from flask_misc import fl_mar
+from marshmallow_sqlalchemy import SQLAlchemyAutoSchema
+from flask_misc import fl_sql
 from offer_db_schema import OfferDbSchema
 from product_db_model import ProductDbModel
 
 
-class ProductDbSchema(fl_mar.SQLAlchemyAutoSchema):
+class ProductDbSchema(SQLAlchemyAutoSchema):
     class Meta:
         model = ProductDbModel
         load_instance = True
         include_fk = True
+        sqla_session = fl_sql.session
@@ -0,0 +1,275 @@
+import cProfile
+import io
+import itertools
+import logging
+import pstats
+import random
+import threading
+import time
+from collections import deque
+from os import environ
+from typing import Dict, List, Optional
+
+from flask import Flask, Response, g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from auth_api import evaluate_token
+from metrics import resource_name
+
+PROFILE_HEADER = 'X-Profile'
+SORT_KEYS = ('cumulative', 'tottime', 'ncalls', 'time')
+
+slow_query_logger = logging.getLogger('slow_query')
+
+_slow_query_events_registered = False
+
+
+class ProfileRecord:
+    def __init__(self, profile_id: int, resource: str, method: str, path: str, status: int,
+                 phases: Dict[str, float], stats: Optional[pstats.Stats]):
+        """
+        Initialize ProfileRecord holding profiling results of a single request
+
+        :param profile_id: Sequential ID of the profile (int)
+        :param resource: Name of the resource class that handled the request (str)
+        :param method: HTTP method of the request (str)
+        :param path: Path of the request (str)
+        :param status: HTTP status code of the response (int)
+        :param phases: Phase timings in seconds, e.g. {'db': 0.01, 'serialize': 0.02} (Dict[str, float])
+        :param stats: cProfile statistics of the request or None if profiler was not available (pstats.Stats)
+        """
+        self.profile_id = profile_id
+        self.resource = resource
+        self.method = method
+        self.path = path
+        self.status = status
+        self.phases = phases
+        self.stats = stats
+        self.timestamp = time.time()
+
+    def summary(self) -> "str":
+        """
+        Return one line summary of the profile
+
+        :returns: - 'str' representing the profile
+        """
+        timings = ' '.join(f'{name}={value * 1000:.2f}ms'
+                           for name, value in self.phases.items() if name != 'queries')
+        return f'#{self.profile_id} {self.method} {self.path} ({self.resource}) -> {self.status}: {timings} ' \
+               f'queries={self.phases.get("queries", 0)}'
+
+
+class ProfileStore:
+    def __init__(self, max_length: int):
+        """
+        Initialize ProfileStore keeping profiles of the last N profiled requests
+
+        :param max_length: Maximum number of kept profiles (int)
+        """
+        self._profiles = deque(maxlen=max_length)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def next_id(self) -> "int":
+        """
+        Get ID for a new profile
+
+        :returns: - 'int' representing the ID
+        """
+        return next(self._ids)
+
+    def add(self, record: ProfileRecord):
+        """
+        Add profile to the store; the oldest profile is dropped if the store is full
+
+        :param record: Profile to be stored (ProfileRecord)
+        """
+        with self._lock:
+            self._profiles.append(record)
+
+    def last(self, n: int, resource: Optional[str] = None) -> "List[ProfileRecord]":
+        """
+        Get last N profiles
+
+        :param n: Number of profiles (int)
+        :param resource: Return only profiles of this resource class if provided (str)
+        :returns: - 'List[ProfileRecord]' representing profiles, the newest last
+        """
+        with self._lock:
+            profiles = [p for p in self._profiles if resource is None or p.resource == resource]
+        return profiles[-n:] if n > 0 else []
+
+    def report(self, n: int, resource: Optional[str] = None, sort: str = 'cumulative', limit: int = 40) -> "str":
+        """
+        Create text report with phase timings of the last N profiles and their aggregated cProfile statistics
+
+        :param n: Number of profiles (int)
+        :param resource: Use only profiles of this resource class if provided (str)
+        :param sort: pstats sort key (str)
+        :param limit: Maximum number of printed functions (int)
+        :returns: - 'str' representing the report
+        """
+        profiles = self.last(n, resource)
+        if not profiles:
+            return 'No profiles recorded.\n'
+        out = io.StringIO()
+        out.write(f'Last {len(profiles)} profiled requests:\n')
+        for record in profiles:
+            out.write(record.summary() + '\n')
+        recorded_stats = [record.stats for record in profiles if record.stats is not None]
+        if recorded_stats:
+            stats = pstats.Stats(stream=out)
+            stats.add(*recorded_stats)
+            out.write('\nAggregated cProfile statistics:\n')
+            stats.sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+
+def _profiling_requested(sample_rate: float) -> "bool":
+    """
+    Decide whether current request should be profiled. Profiling is requested either by the client
+    using X-Profile header (together with a valid bearer token) or by random sampling
+
+    :param sample_rate: Fraction of requests that are profiled without being requested (float)
+    :returns: - 'bool' representing the decision
+    """
+    if request.headers.get(PROFILE_HEADER, '').lower() in ('1', 'true', 'yes'):
+        return evaluate_token(request.headers.get('Bearer'))[1] == 200
+    return sample_rate > 0 and random.random() < sample_rate
+
+
+def _phase_timings(total: float) -> "Dict[str, float]":
+    """
+    Collect phase timings of current request. The 'hydrate' phase is the part of the 'query' phase that was not spent
+    in the DB driver, i.e. mostly creation of ORM objects
+
+    :param total: Total duration of the request (float)
+    :returns: - 'Dict[str, float]' representing phase timings in seconds
+    """
+    phases = dict(g.get('metrics_phases', {}))
+    db_time = g.get('metrics_db_time', 0.0)
+    timings = {'total': total, 'db': db_time}
+    if 'query' in phases:
+        timings['hydrate'] = max(phases['query'] - db_time, 0.0)
+    timings.update(phases)
+    timings['queries'] = g.get('metrics_db_queries', 0)
+    return timings
+
+
+def init_app(app: Flask, store: Optional[ProfileStore] = None):
+    """
+    Register opt-in request profiling, slow query log and /debug/profiles endpoint
+
+    :param app: Profiled application (Flask)
+    :param store: Store for the profiles, new one is created if not provided (ProfileStore)
+    """
+    sample_rate = float(environ.get('PROFILE_SAMPLE_RATE', 0))
+    if store is None:
+        store = ProfileStore(int(environ.get('PROFILE_HISTORY', 100)))
+    app.extensions['profile_store'] = store
+
+    def before_request():
+        if not _profiling_requested(sample_rate):
+            return
+        g.profile_start = time.perf_counter()
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # another profiler is already active in this process (e.g. concurrently profiled request)
+            profiler = None
+        g.profiler = profiler
+
+    def after_request(response: Response) -> "Response":
+        start = g.get('profile_start')
+        if start is None:
+            return response
+        profiler = g.get('profiler')
+        stats = None
+        if profiler is not None:
+            profiler.disable()
+            stats = pstats.Stats(profiler)
+        timings = _phase_timings(time.perf_counter() - start)
+        record = ProfileRecord(store.next_id(), resource_name(), request.method, request.path,
+                               response.status_code, timings, stats)
+        store.add(record)
+        response.headers['Server-Timing'] = ', '.join(f'{name};dur={value * 1000:.3f}'
+                                                      for name, value in timings.items() if name != 'queries')
+        response.headers['X-Profile-Id'] = str(record.profile_id)
+        return response
+
+    def teardown_request(exception: Optional[BaseException]):
+        # after_request is skipped when the handler raises, the profiler must not stay installed on the thread
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+
+    def profiles_view() -> "Response":
+        msg, auth_check = evaluate_token(request.headers.get('Bearer'))
+        if auth_check != 200:
+            return Response(msg, status=auth_check, content_type='text/plain')
+        sort = request.args.get('sort', 'cumulative')
+        if sort not in SORT_KEYS:
+            return Response(f'Parameter sort should be one of {", ".join(SORT_KEYS)}', status=400,
+                            content_type='text/plain')
+        try:
+            n = int(request.args.get('n', 10))
+            limit = int(request.args.get('limit', 40))
+        except ValueError:
+            return Response('Parameters n and limit should be integers', status=400, content_type='text/plain')
+        report = store.report(n, resource=request.args.get('resource'), sort=sort, limit=limit)
+        return Response(report, content_type='text/plain')
+
+    app.before_request(before_request)
+    app.after_request(after_request)
+    app.teardown_request(teardown_request)
+    app.add_url_rule('/debug/profiles', 'profiles', profiles_view)
+    register_slow_query_log(float(environ.get('SLOW_QUERY_MS', 200)) / 1000)
+
+
+def _explain_query_plan(cursor, statement: str, parameters) -> "str":
+    """
+    Get EXPLAIN QUERY PLAN of a SQLite statement using the same DBAPI connection
+
+    :param cursor: DBAPI cursor that executed the statement
+    :param statement: Executed SQL statement (str)
+    :param parameters: Parameters of the statement
+    :returns: - 'str' representing the query plan
+    """
+    explain_cursor = cursor.connection.cursor()
+    try:
+        explain_cursor.execute('EXPLAIN QUERY PLAN ' + statement, parameters)
+        return '\n'.join(f'  {row[-1]}' for row in explain_cursor.fetchall())
+    finally:
+        explain_cursor.close()
+
+
+def register_slow_query_log(threshold: float):
+    """
+    Log all SQL queries that took longer than threshold, together with their query plan
+
+    :param threshold: Threshold in seconds (float)
+    """
+    global _slow_query_events_registered
+    if _slow_query_events_registered:
+        return
+    _slow_query_events_registered = True
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('slow_query_start', []).append(time.perf_counter())
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - conn.info['slow_query_start'].pop()
+        if duration < threshold:
+            return
+        plan = ''
+        if conn.dialect.name == 'sqlite' and not executemany and statement.lstrip().upper().startswith('SELECT'):
+            try:
+                plan = '\n' + _explain_query_plan(cursor, statement, parameters)
+            except Exception as e:
+                plan = f'\n  (query plan not available: {e})'
+        slow_query_logger.warning('Slow query (%.1f ms): %s %r%s', duration * 1000, statement, parameters, plan)
+
+    event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', after_cursor_execute)
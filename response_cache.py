@@ -0,0 +1,200 @@
+"""
+Cache of pre-serialized responses of offer list endpoints
+
+Responses are cached as encoded json (and its gzip, served to clients accepting it) with the version of offer data
+they were computed from, so a request whose version matches is answered by copying the bytes. The cache is an LRU
+bounded by RESPONSE_CACHE_MAX_BYTES (64 MB by default) of bodies. The hottest responses (e.g. all active offers) are
+marked for rebuilding - when the poller of this process stores or deactivates offers, they are recomputed in the
+background, so that readers don't wait for the query after ingestion. At most RESPONSE_CACHE_MAX_REBUILT (64 by
+default) recently used responses are rebuilt, rebuilding doesn't make a response recently used, so responses nobody
+reads are evicted and no longer rebuilt. Other variants (per product, per vendor) are recomputed by the first request
+after the data changed.
+"""
+import gzip
+import threading
+from collections import OrderedDict
+from os import environ
+from typing import Callable, Hashable, Optional, Tuple
+
+from flask import Flask, Response, current_app, request
+
+# Smaller bodies are not worth compressing
+MIN_GZIP_SIZE = 1024
+
+
+class CachedResponse:
+    def __init__(self, version: Hashable, body: bytes):
+        """
+        Initialize CachedResponse - encoded json response body and its gzip
+
+        :param version: Version of data the body was computed from (Hashable)
+        :param body: Encoded json (bytes)
+        """
+        self.version = version
+        self.body = body
+        self.gzipped = gzip.compress(body, compresslevel=5) if len(body) >= MIN_GZIP_SIZE else None
+
+    @property
+    def size(self) -> "int":
+        """
+        Number of bytes held by the response
+        """
+        return len(self.body) + (len(self.gzipped) if self.gzipped is not None else 0)
+
+    def response(self) -> "Response":
+        """
+        Create response for the current request, compressed if the client accepts gzip
+
+        :returns: - 'Response' representing json response
+        """
+        if self.gzipped is not None and 'gzip' in request.headers.get('Accept-Encoding', ''):
+            response = Response(self.gzipped, mimetype='application/json')
+            response.headers['Content-Encoding'] = 'gzip'
+        else:
+            response = Response(self.body, mimetype='application/json')
+        response.vary.add('Accept-Encoding')
+        return response
+
+
+class ResponseCache:
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, max_rebuilt: int = 64):
+        """
+        Initialize ResponseCache - LRU cache of pre-serialized responses bounded by size of their bodies
+
+        :param max_bytes: Maximum number of bytes of cached bodies (int)
+        :param max_rebuilt: Maximum number of responses rebuilt after ingestion, the least recently used ones are
+                            no longer rebuilt (int)
+        """
+        self.max_bytes = max_bytes
+        self.max_rebuilt = max_rebuilt
+        self.bytes = 0
+        self._entries: "OrderedDict[Hashable, CachedResponse]" = OrderedDict()
+        # key -> path of the request and function computing the response, for responses rebuilt on ingestion,
+        # in the order of their use
+        self._rebuilt: "OrderedDict[Hashable, Tuple[str, Callable[[], CachedResponse]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        self._rebuild_pending = threading.Event()
+
+    def get(self, key: Hashable, version: Hashable) -> "Optional[CachedResponse]":
+        """
+        Get cached response computed from the given version of data
+
+        :param key: Key of the response (Hashable)
+        :param version: Current version of the data (Hashable)
+        :returns: - 'Optional[CachedResponse]' representing the response or None if it is not cached or outdated
+        """
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is None or cached.version != version:
+                return None
+            self._entries.move_to_end(key)
+            if key in self._rebuilt:
+                self._rebuilt.move_to_end(key)
+            return cached
+
+    def put(self, key: Hashable, cached: CachedResponse, rebuild: Callable[[], CachedResponse] = None):
+        """
+        Cache response, dropping the least recently used ones over the size limit
+
+        :param key: Key of the response, it must contain all parameters of the request the response depends on
+                    (Hashable)
+        :param cached: The response (CachedResponse)
+        :param rebuild: Function computing the response within a request context, if it is to be rebuilt after
+                        ingestion; it must not read query parameters, the context has only the path of the request
+                        (Callable[[], CachedResponse])
+        """
+        with self._lock:
+            if rebuild is not None:
+                self._rebuilt[key] = (request.path, rebuild)
+                self._rebuilt.move_to_end(key)
+                while len(self._rebuilt) > self.max_rebuilt:
+                    self._rebuilt.popitem(last=False)
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous.size
+            if cached.size > self.max_bytes:
+                self._rebuilt.pop(key, None)
+                return
+            self._entries[key] = cached
+            self.bytes += cached.size
+            self._evict()
+
+    def _replace(self, key: Hashable, cached: CachedResponse):
+        # a rebuilt response keeps its position, so that responses nobody reads are evicted
+        with self._lock:
+            previous = self._entries.get(key)
+            if previous is None or key not in self._rebuilt:
+                return
+            self._entries[key] = cached
+            self.bytes += cached.size - previous.size
+            self._evict()
+
+    def _evict(self):
+        while self.bytes > self.max_bytes:
+            key, cached = self._entries.popitem(last=False)
+            self.bytes -= cached.size
+            self._rebuilt.pop(key, None)
+
+    def rebuild_async(self, app: Flask):
+        """
+        Recompute responses marked for rebuilding in a background thread; requests made while a rebuild runs are
+        merged into one more rebuild
+
+        :param app: App used as context of the rebuild (Flask)
+        """
+        self._rebuild_pending.set()
+        if not self._rebuild_lock.acquire(blocking=False):
+            return
+        threading.Thread(target=self._rebuild_loop, args=(app,), daemon=True, name='ResponseCacheRebuild').start()
+
+    def _rebuild_loop(self, app: Flask):
+        try:
+            while self._rebuild_pending.is_set():
+                self._rebuild_pending.clear()
+                with self._lock:
+                    rebuilt = list(self._rebuilt.items())
+                for key, (path, rebuild) in rebuilt:
+                    try:
+                        with app.test_request_context(path):
+                            self._replace(key, rebuild())
+                    except Exception as e:
+                        # the next request computes the response itself
+                        print(f'Rebuilding cached response of {path} failed: {e!r}')
+        finally:
+            self._rebuild_lock.release()
+        if self._rebuild_pending.is_set():
+            # requested after the loop ended, but before the lock was released
+            self.rebuild_async(app)
+
+    def clear(self):
+        """
+        Drop all cached responses
+        """
+        with self._lock:
+            self._entries.clear()
+            self._rebuilt.clear()
+            self.bytes = 0
+
+
+def rebuild_cached_responses():
+    """
+    Rebuild cached responses of the current app in the background after offers were stored or deactivated
+    """
+    cache = current_app.extensions.get('response_cache')
+    if cache is not None:
+        cache.rebuild_async(current_app._get_current_object())
+
+
+def init_app(app: Flask, cache: ResponseCache = None):
+    """
+    Register cache of pre-serialized responses, unless disabled by RESPONSE_CACHE=0
+
+    :param app: Application (Flask)
+    :param cache: Cache to register, created with default settings if not provided (ResponseCache)
+    """
+    if not app.config.get('RESPONSE_CACHE', environ.get('RESPONSE_CACHE', '1') != '0'):
+        return
+    app.extensions['response_cache'] = cache or \
+        ResponseCache(int(environ.get('RESPONSE_CACHE_MAX_BYTES', 64 * 1024 * 1024)),
+                      int(environ.get('RESPONSE_CACHE_MAX_REBUILT', 64)))
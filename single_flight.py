@@ -0,0 +1,93 @@
+import threading
+from os import environ
+from typing import Any, Callable, Dict, Hashable
+
+from flask import Flask, current_app
+
+from metrics import SINGLE_FLIGHT_REQUESTS, resource_name
+
+
+class _Call:
+    def __init__(self):
+        """
+        Initialize _Call - computation in flight and its outcome
+        """
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self, timeout: float = 30.0):
+        """
+        Initialize SingleFlight - concurrent calls with the same key share one computation; the first call computes
+        the value while the others wait for it
+
+        :param timeout: Maximum time in seconds a call waits for the shared computation before computing the value
+                        itself (float)
+        """
+        self.timeout = timeout
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, compute: Callable) -> "Any":
+        """
+        Compute value or wait for the computation with the same key that is already in flight
+
+        :param key: Key of the computation, it must contain everything the value depends on (Hashable)
+        :param compute: Function computing the value (Callable)
+        :returns: - 'Any' representing the value
+        :raises Exception: Exception raised by the shared computation
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            if call.done.wait(self.timeout):
+                SINGLE_FLIGHT_REQUESTS.inc(resource_name(), 'coalesced')
+                if call.error is not None:
+                    raise call.error
+                return call.value
+            SINGLE_FLIGHT_REQUESTS.inc(resource_name(), 'timeout')
+            return compute()
+        SINGLE_FLIGHT_REQUESTS.inc(resource_name(), 'computed')
+        try:
+            call.value = compute()
+            return call.value
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+def shared(key: Hashable, compute: Callable) -> "Any":
+    """
+    Compute value with the single flight of the current app, or directly if it is disabled
+
+    :param key: Key of the computation (Hashable)
+    :param compute: Function computing the value (Callable)
+    :returns: - 'Any' representing the value
+    """
+    single_flight = current_app.extensions.get('single_flight')
+    if single_flight is None:
+        return compute()
+    return single_flight.do(key, compute)
+
+
+def init_app(app: Flask, single_flight: SingleFlight = None):
+    """
+    Register single flight of list resources, unless disabled by SINGLE_FLIGHT=0; waiting for a shared computation
+    is limited by SINGLE_FLIGHT_TIMEOUT seconds (30 by default)
+
+    :param app: Application (Flask)
+    :param single_flight: Single flight to register, created with default settings if not provided (SingleFlight)
+    """
+    if not app.config.get('SINGLE_FLIGHT', environ.get('SINGLE_FLIGHT', '1') != '0'):
+        return
+    app.extensions['single_flight'] = single_flight or \
+        SingleFlight(float(environ.get('SINGLE_FLIGHT_TIMEOUT', 30)))
@@ -0,0 +1,27 @@
+import os
+
+import pytest
+
+from offers_simulator import SimulatorConfig, SimulatorServer
+
+_simulator_server = None
+
+
+def pytest_configure(config):
+    # Tests never talk to the real offers microservice; the simulator is started before test modules are imported,
+    # so that every OffersClient created by the tests reads its address
+    global _simulator_server
+    _simulator_server = SimulatorServer(SimulatorConfig(tick_seconds=0))
+    _simulator_server.start()
+    os.environ['OFFER_BASE_URL'] = _simulator_server.base_url
+    os.environ['OFFER_AUTH_CODE'] = _simulator_server.simulator.config.auth_code
+
+
+def pytest_unconfigure(config):
+    if _simulator_server is not None:
+        _simulator_server.shutdown()
+
+
+@pytest.fixture(scope='session')
+def simulator_server() -> "SimulatorServer":
+    return _simulator_server
@@ -0,0 +1,90 @@
+import json
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip('starlette')
+pytest.importorskip('aiosqlite')
+
+from starlette.testclient import TestClient  # noqa: E402
+from asgi_app import create_asgi_app, to_async_uri  # noqa: E402
+from offer_archive import archive  # noqa: E402
+from offer_db_model import OfferDbModel  # noqa: E402
+from price_series import backfill  # noqa: E402
+from product_db_model import ProductDbModel  # noqa: E402
+from test_basic import run_app, path_to_db, API_TOKEN  # noqa: E402
+from test_offer_archive import INTERVAL, create_offers  # noqa: E402
+
+HEADERS = {'Bearer': API_TOKEN}
+
+
+def test_to_async_uri():
+    assert to_async_uri('sqlite:///data.db') == 'sqlite+aiosqlite:///data.db'
+    assert to_async_uri('sqlite+aiosqlite:///data.db') == 'sqlite+aiosqlite:///data.db'
+
+
+def test_async_product_api():
+    run_app()
+    with TestClient(create_asgi_app(f'sqlite:///{path_to_db}')) as client:
+        assert client.get('/api/products').status_code == 401
+        assert client.post('/api/auth').status_code == 201
+        assert client.get('/api/products', headers={'Bearer': 'wrong'}).status_code == 403
+        response = client.post('/api/products', headers=HEADERS,
+                               json={'name': 'Watermelon', 'description': 'A big juicy watermelon'})
+        assert response.status_code == 201
+        w_id = response.json()['prod_id']
+        assert client.post('/api/products', headers=HEADERS,
+                           json={'name': 'Watermelon', 'description': 'Another'}).status_code == 400
+        response = client.patch(f'/api/product/{w_id}', headers=HEADERS, json={'description': 'Old watermelon'})
+        assert response.json()['description'] == 'Old watermelon'
+        assert client.patch(f'/api/product/{w_id}', headers=HEADERS, json={'color': 'red'}).status_code == 400
+        assert client.get('/api/products', headers=HEADERS).json()[0]['name'] == 'Watermelon'
+        assert client.delete(f'/api/product/{w_id}', headers=HEADERS).status_code == 204
+        assert client.delete(f'/api/product/{w_id}', headers=HEADERS).status_code == 200
+        assert client.get(f'/api/product/{w_id}', headers=HEADERS).json() == {}
+
+
+def test_async_offer_api_matches_sync_api():
+    app = run_app()
+    app.testing = True
+    sync_client = app.test_client()
+    with app.app_context():
+        OfferDbModel(vendor_id=1000, price=100, items_in_stock=10, prod_id=1).insert()
+        OfferDbModel(vendor_id=2000, price=200, items_in_stock=20, prod_id=2).insert()
+        OfferDbModel(vendor_id=1000, price=300, items_in_stock=30, prod_id=1).insert()
+    interval = {'date_start': '0001-01-01T00:00:00.000000', 'date_end': '3000-01-01T00:00:00.000000'}
+    with TestClient(create_asgi_app(f'sqlite:///{path_to_db}')) as client:
+        for path in ('/api/offers', '/api/offers/active', '/api/offers/product/1', '/api/offers/vendor/1000'):
+            response = client.get(path, headers=HEADERS)
+            assert response.status_code == 200
+            assert response.json() == sync_client.get(path, headers=HEADERS).json
+        response = client.post('/api/offers/product/1/vendor/1000', headers=HEADERS, json=interval)
+        assert json.loads(response.json())['price_change'] == 200
+
+
+def test_async_delete_deactivates_offers():
+    app = run_app()
+    with app.app_context():
+        assert ProductDbModel(name='Apple', description='This is a red apple.').insert()
+        OfferDbModel(vendor_id=1000, price=100, items_in_stock=10, prod_id=1).insert()
+    with TestClient(create_asgi_app(f'sqlite:///{path_to_db}')) as client:
+        assert client.delete('/api/product/1', headers=HEADERS).status_code == 204
+        assert client.get('/api/offers/active', headers=HEADERS).json() == []
+
+
+@pytest.mark.parametrize('price_series', ['0', '1'])
+def test_async_history_matches_sync_api_after_archiving(monkeypatch, price_series):
+    monkeypatch.setenv('PRICE_SERIES', price_series)
+    app = run_app()
+    sync_client = app.test_client()
+    with app.app_context():
+        create_offers()
+        assert archive(months=2, now=datetime(2024, 4, 15)) == 4
+        # histories of archived offers are read from the series once it is backfilled
+        backfill()
+    with TestClient(create_asgi_app(f'sqlite:///{path_to_db}')) as client:
+        for path in ('/api/offers', '/api/offers/active', '/api/offers/product/1', '/api/offers/vendor/1'):
+            assert client.get(path, headers=HEADERS).json() == sync_client.get(path, headers=HEADERS).json, path
+        history = client.post('/api/offers/product/1/vendor/1', headers=HEADERS, json=INTERVAL).json()
+        assert history == sync_client.post('/api/offers/product/1/vendor/1', headers=HEADERS, json=INTERVAL).json
+        assert len(json.loads(history)['history']) == 3
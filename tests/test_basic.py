@@ -1,14 +1,9 @@
 import json
 
 import pytest
-from flask import Flask, Blueprint
-from flask_restx import Api
-from flask_misc import fl_sql
-from product_api import product_ns, products_ns, Product, ProductList
-from offer_api import offers_ns, OfferList, ActiveOfferList, VendorOfferList, ProductOfferList, \
-    ProductAndVendorOfferHistoryList, offer_list_schema
-from auth_api import auth_ns, RequestToken
+from main import create_app, init_db
 from product_db_model import ProductDbModel
+from offer_api import offer_list_schema
 from offer_db_model import OfferDbModel
 import os
 
@@ -23,33 +18,8 @@ def run_app():
     if os.path.exists(path_to_db):
         os.remove(path_to_db)
 
-    app = Flask(__name__)
-    bluePrint = Blueprint('api', __name__, url_prefix='/api')
-    api = Api(bluePrint, doc='/doc', title='Product API task')
-    app.register_blueprint(bluePrint)
-
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///data.db'
-    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-    app.config['PROPAGATE_EXCEPTIONS'] = True
-
-    api.add_namespace(product_ns)
-    api.add_namespace(products_ns)
-    api.add_namespace(offers_ns)
-    api.add_namespace(auth_ns)
-
-    product_ns.add_resource(Product, '/<int:prod_id>')
-    products_ns.add_resource(ProductList, '')
-    offers_ns.add_resource(OfferList, '')
-    offers_ns.add_resource(ActiveOfferList, '/active')
-    offers_ns.add_resource(ProductOfferList, '/product/<int:prod_id>')
-    offers_ns.add_resource(VendorOfferList, '/vendor/<int:vendor_id>')
-    offers_ns.add_resource(ProductAndVendorOfferHistoryList, '/product/<int:prod_id>/vendor/<int:vendor_id>')
-    auth_ns.add_resource(RequestToken, '')
-
-    with app.app_context():
-        fl_sql.init_app(app)
-        fl_sql.create_all()
-
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path_to_db}'})
+    init_db(app)
     return app
 
 
@@ -0,0 +1,46 @@
+import json
+
+from offer_db_model import OfferDbModel
+from test_basic import run_app, API_TOKEN
+
+HEADERS = {'Bearer': API_TOKEN}
+INTERVAL = {'date_start': '0001-01-01T00:00:00.000000', 'date_end': '3000-01-01T00:00:00.000000'}
+
+
+def test_bulk_history_matches_single_pair_history():
+    app = run_app()
+    client = app.test_client()
+    with app.app_context():
+        for prod_id, vendor_id, price in ((1, 10, 100), (1, 20, 200), (1, 10, 150), (2, 10, 300), (1, 10, 120),
+                                          (1, 20, 180), (3, 30, 50)):
+            OfferDbModel(vendor_id=vendor_id, price=price, items_in_stock=5, prod_id=prod_id).insert()
+    single = {(prod_id, vendor_id): json.loads(client.post(f'/api/offers/product/{prod_id}/vendor/{vendor_id}',
+                                                           headers=HEADERS, json=INTERVAL).json)
+              for prod_id, vendor_id in ((1, 10), (1, 20), (2, 10))}
+
+    response = client.post('/api/offers/history', headers=HEADERS,
+                           json={'pairs': [{'prod_id': 2, 'vendor_id': 10}, {'prod_id': 1, 'vendor_id': 20},
+                                           {'prod_id': 1, 'vendor_id': 10}, {'prod_id': 5, 'vendor_id': 10}],
+                                 **INTERVAL})
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.json == [single[(1, 10)], single[(1, 20)], single[(2, 10)]]
+    assert [price['price'] for price in response.json[0]['history']] == [100, 150, 120]
+
+    response = client.post('/api/offers/history', headers=HEADERS, json={'prod_id': 1, **INTERVAL})
+    assert response.json == [single[(1, 10)], single[(1, 20)]]
+    response = client.post('/api/offers/history', headers=HEADERS,
+                           json={'prod_id': 1, 'date_start': '3000-01-01T00:00:00.000000',
+                                 'date_end': '3000-01-02T00:00:00.000000'})
+    assert response.json == []
+
+
+def test_bulk_history_validation():
+    client = run_app().test_client()
+    assert client.post('/api/offers/history', headers=HEADERS, json=INTERVAL).status_code == 400
+    assert client.post('/api/offers/history', headers=HEADERS, json={'pairs': [], **INTERVAL}).status_code == 400
+    assert client.post('/api/offers/history', headers=HEADERS,
+                       json={'prod_id': 1, 'date_start': '2020-01-01', 'date_end': 'x'}).status_code == 400
+    assert client.post('/api/offers/history', headers=HEADERS,
+                       json={'pairs': [{'prod_id': 1}], **INTERVAL}).status_code == 400
+    assert client.post('/api/offers/history', json=INTERVAL).status_code == 401
@@ -0,0 +1,41 @@
+import pytest
+
+from bulk_io import export_table, import_rows, read_rows
+from offer_db_model import OfferDbModel
+from product_db_model import ProductDbModel
+from test_basic import run_app
+
+
+def test_export_and_import_round_trip(tmp_path):
+    app = run_app()
+    with app.app_context():
+        assert ProductDbModel(name='Apple', description='This is a red apple.').insert()
+        OfferDbModel(vendor_id=1, price=100, items_in_stock=5, prod_id=1).insert()
+        OfferDbModel(vendor_id=1, price=90, items_in_stock=5, prod_id=1).insert()
+        offers = [(offer.internal_id, offer.price, offer.active, offer.date_created)
+                  for offer in OfferDbModel.find_all()]
+        assert export_table('products', str(tmp_path / 'products.ndjson')) == 1
+        assert export_table('offers', str(tmp_path / 'offers.ndjson.gz'), batch_size=1) == 2
+
+    app = run_app()
+    with app.app_context():
+        assert import_rows('products', read_rows('products', str(tmp_path / 'products.ndjson'))) == 1
+        assert import_rows('offers', read_rows('offers', str(tmp_path / 'offers.ndjson.gz')), batch_size=1) == 2
+        assert [(product.prod_id, product.name) for product in ProductDbModel.find_all()] == [(1, 'Apple')]
+        assert [(offer.internal_id, offer.price, offer.active, offer.date_created)
+                for offer in OfferDbModel.find_all()] == offers
+
+
+def test_import_csv(tmp_path):
+    (tmp_path / 'offers.csv').write_text('vendor_id,price,items_in_stock,prod_id,active,date_created\n'
+                                         '1,100,5,1,false,2024-01-01T10:00:00.000001\n'
+                                         '2,200,5,1,,\n')
+    (tmp_path / 'bad.csv').write_text('vendor_id,price,colour\n1,100,red\n')
+    app = run_app()
+    with app.app_context():
+        assert import_rows('offers', read_rows('offers', str(tmp_path / 'offers.csv'))) == 2
+        assert [(offer.vendor_id, offer.price, offer.active) for offer in OfferDbModel.find_all()] == \
+            [(1, 100, False), (2, 200, True)]
+        assert OfferDbModel.find_all()[0].date_created.microsecond == 1
+        with pytest.raises(ValueError):
+            import_rows('offers', read_rows('offers', str(tmp_path / 'bad.csv')))
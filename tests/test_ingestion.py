@@ -0,0 +1,99 @@
+import threading
+import time
+
+import pytest
+
+import metrics
+from ingestion import IngestionPipeline
+from offer_db_model import OfferDbModel
+from test_basic import run_app
+
+
+def test_pipeline_coalesces_writes():
+    batches = []
+
+    def write(offers, prod_ids):
+        batches.append(list(offers))
+        return len(offers)
+
+    pipeline = IngestionPipeline(lambda prod_id: [prod_id] * 3 if prod_id % 10 else None, write, fetch_workers=3,
+                                 batch_size=50, flush_interval=10)
+    assert pipeline.run(range(1, 101)) == 270
+    assert sorted(offer for batch in batches for offer in batch) == sorted([i for i in range(1, 101) if i % 10] * 3)
+    assert len(batches) <= 6
+    assert all(len(batch) >= 50 for batch in batches[:-1])
+
+
+def test_pipeline_backpressure_and_stop():
+    backpressure_before = metrics.INGEST_BACKPRESSURE.value()
+    stop = threading.Event()
+
+    def slow_write(offers, prod_ids):
+        time.sleep(0.01)
+        if offers[-1] >= 20:
+            stop.set()
+        return len(offers)
+
+    pipeline = IngestionPipeline(lambda prod_id: [prod_id], slow_write, fetch_workers=2, queue_size=1, batch_size=1,
+                                 should_stop=stop.is_set)
+    written = pipeline.run(range(1, 1001))
+    assert 20 <= written < 1000
+    assert metrics.INGEST_BACKPRESSURE.value() > backpressure_before
+
+
+def test_pipeline_writer_failure_stops_fetchers():
+    def failing_write(offers, prod_ids):
+        raise RuntimeError('DB is down')
+
+    pipeline = IngestionPipeline(lambda prod_id: [prod_id], failing_write, fetch_workers=2, queue_size=2,
+                                 batch_size=1)
+    with pytest.raises(RuntimeError):
+        pipeline.run(range(1, 10001))
+    assert not [thread for thread in threading.enumerate() if thread.name.startswith('OffersFetcher')]
+
+
+def test_insert_many_matches_insert():
+    app = run_app()
+    with app.app_context():
+        OfferDbModel(vendor_id=1, price=100, items_in_stock=5, prod_id=1).insert()
+        OfferDbModel(vendor_id=2, price=200, items_in_stock=5, prod_id=1).insert()
+        inserted = OfferDbModel.insert_many([
+            OfferDbModel(vendor_id=1, price=100, items_in_stock=5, prod_id=1),  # unchanged
+            OfferDbModel(vendor_id=2, price=210, items_in_stock=5, prod_id=1),  # price change
+            OfferDbModel(vendor_id=1, price=300, items_in_stock=5, prod_id=2),  # new
+            OfferDbModel(vendor_id=1, price=300, items_in_stock=5, prod_id=2),  # repeated in the same batch
+            OfferDbModel(vendor_id=1, price=300, items_in_stock=6, prod_id=2),  # stock change in the same batch
+        ])
+        assert inserted == 3
+        active = {(offer.prod_id, offer.vendor_id): (offer.price, offer.items_in_stock)
+                  for offer in OfferDbModel.find_all_active()}
+        assert active == {(1, 1): (100, 5), (1, 2): (210, 5), (2, 1): (300, 6)}
+        assert len(OfferDbModel.find_all()) == 5
+
+
+def test_pipeline_passes_products_without_offers():
+    products = []
+
+    def write(offers, prod_ids):
+        products.extend(prod_ids)
+        return len(offers)
+
+    pipeline = IngestionPipeline(lambda prod_id: [] if prod_id % 2 else None, write, fetch_workers=2)
+    assert pipeline.run(range(1, 11)) == 0
+    assert sorted(products) == [1, 3, 5, 7, 9]
+
+
+def test_reconcile_many_deactivates_missing_vendors():
+    app = run_app()
+    with app.app_context():
+        for prod_id, vendor_id in ((1, 1), (1, 2), (1, 3), (2, 1), (3, 1)):
+            OfferDbModel(vendor_id=vendor_id, price=100, items_in_stock=5, prod_id=prod_id).insert()
+        # vendor 2 of product 1 vanished, vendor 3 ran out of stock, product 2 has no offers, product 3 wasn't polled
+        inserted, deactivated = OfferDbModel.reconcile_many(
+            [OfferDbModel(vendor_id=1, price=90, items_in_stock=5, prod_id=1),
+             OfferDbModel(vendor_id=4, price=80, items_in_stock=1, prod_id=1)], [1, 2])
+        assert (inserted, deactivated) == (2, 3)
+        assert sorted((offer.prod_id, offer.vendor_id, offer.price) for offer in OfferDbModel.find_all_active()) == \
+            [(1, 1, 90), (1, 4, 80), (3, 1, 100)]
+        assert OfferDbModel.reconcile_many([], [1, 2, 3]) == (0, 3)
+        assert OfferDbModel.find_all_active() == []
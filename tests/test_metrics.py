@@ -0,0 +1,71 @@
+import sys
+
+import pytest
+
+import metrics
+from metrics import Counter, Histogram, Registry
+from test_basic import run_app, API_BASE_URL, API_TOKEN
+from offer_db_model import OfferDbModel
+
+
+def test_histogram_render():
+    registry = Registry()
+    histogram = registry.register(Histogram('test_latency_seconds', 'Test latency', ('resource',), buckets=(0.1, 1)))
+    histogram.observe(0.05, 'OfferList')
+    histogram.observe(0.5, 'OfferList')
+    histogram.observe(5, 'OfferList')
+    counter = registry.register(Counter('test_total', 'Test counter'))
+    counter.inc(amount=2)
+    rendered = registry.render()
+    assert 'test_latency_seconds_bucket{resource="OfferList",le="0.1"} 1' in rendered
+    assert 'test_latency_seconds_bucket{resource="OfferList",le="1"} 2' in rendered
+    assert 'test_latency_seconds_bucket{resource="OfferList",le="+Inf"} 3' in rendered
+    assert 'test_latency_seconds_count{resource="OfferList"} 3' in rendered
+    assert 'test_total 2' in rendered
+    assert histogram.count('OfferList') == 3
+
+
+def test_metrics_endpoint():
+    app = run_app()
+    app.testing = True
+    client = app.test_client()
+    with app.app_context():
+        OfferDbModel(vendor_id=1000, price=100, items_in_stock=10, prod_id=1).insert()
+        requests_before = metrics.REQUEST_LATENCY.count('ActiveOfferList', 'GET')
+        response = client.get(API_BASE_URL + '/offers/active', headers={'Bearer': API_TOKEN})
+        assert response.status_code == 200
+        assert metrics.REQUEST_LATENCY.count('ActiveOfferList', 'GET') == requests_before + 1
+        assert metrics.PHASE_LATENCY.count('ActiveOfferList', 'serialize') > 0
+        response = client.get('/metrics')
+        assert response.status_code == 200
+        assert 'api_request_duration_seconds_count{resource="ActiveOfferList",method="GET"}' in response.text
+        assert 'api_request_db_queries_count{resource="ActiveOfferList"}' in response.text
+
+
+def test_request_profiling():
+    app = run_app()
+    app.testing = True
+    client = app.test_client()
+    with app.app_context():
+        OfferDbModel(vendor_id=1000, price=100, items_in_stock=10, prod_id=1).insert()
+        response = client.get(API_BASE_URL + '/offers/vendor/1000', headers={'Bearer': API_TOKEN})
+        assert 'Server-Timing' not in response.headers
+        response = client.get(API_BASE_URL + '/offers/vendor/1000', headers={'Bearer': API_TOKEN, 'X-Profile': '1'})
+        assert response.status_code == 200
+        assert 'serialize;dur=' in response.headers['Server-Timing']
+        assert 'hydrate;dur=' in response.headers['Server-Timing']
+        response = client.get('/debug/profiles?n=5', headers={'Bearer': API_TOKEN})
+        assert response.status_code == 200
+        assert 'VendorOfferList' in response.text
+        assert 'Aggregated cProfile statistics' in response.text
+        assert client.get('/debug/profiles').status_code == 401
+
+
+def test_profiler_disabled_when_request_fails():
+    app = run_app()
+    client = app.test_client()
+    with app.app_context():
+        with pytest.raises(ValueError):
+            client.post(API_BASE_URL + '/offers/product/1/vendor/1', headers={'Bearer': API_TOKEN, 'X-Profile': '1'},
+                        json={'date_start': 'yesterday', 'date_end': 'today'})
+        assert sys.getprofile() is None
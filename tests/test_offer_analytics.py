@@ -0,0 +1,94 @@
+from offer_analytics import active_prices, price_comparison
+from offer_db_model import OfferDbModel
+from offer_snapshot import OfferSnapshot
+from test_basic import run_app, API_TOKEN
+
+HEADERS = {'Bearer': API_TOKEN}
+
+
+def insert_offers():
+    for prod_id, vendor_id, price in ((1, 10, 100), (1, 20, 300), (1, 30, 200), (1, 40, 100), (2, 10, 50),
+                                      (2, 20, 60), (3, 10, 70)):
+        OfferDbModel(vendor_id=vendor_id, price=price, items_in_stock=5, prod_id=prod_id).insert()
+
+
+def test_price_comparison_from_snapshot_and_db():
+    app = run_app()
+    with app.app_context():
+        insert_offers()
+        snapshot = OfferSnapshot()
+        snapshot.refresh()
+        from_snapshot = price_comparison(active_prices(snapshot))
+        assert from_snapshot == price_comparison(active_prices())
+        assert from_snapshot[0] == {'prod_id': 1, 'min_price': 100, 'max_price': 300, 'median_price': 150.0,
+                                    'spread': 200, 'spread_pct': 200.0, 'vendors': 4, 'cheapest_vendor_id': 10}
+        assert [item['prod_id'] for item in from_snapshot] == [1, 2, 3]
+        assert [item['prod_id'] for item in price_comparison(active_prices(snapshot, [3, 2, 99]), 'min_price',
+                                                             descending=False)] == [2, 3]
+        assert price_comparison(active_prices(None, [3, 2, 99]), 'min_price') == \
+            price_comparison(active_prices(snapshot, [3, 2, 99]), 'min_price')
+
+
+def test_price_comparison_endpoint():
+    app = run_app()
+    client = app.test_client()
+    with app.app_context():
+        insert_offers()
+    response = client.get('/api/offers/comparison?sort=prod_id&order=asc&per_page=2&page=2', headers=HEADERS)
+    assert response.status_code == 200
+    assert response.json['total'] == 3
+    assert [item['prod_id'] for item in response.json['items']] == [3]
+    response = client.get('/api/offers/comparison?prod_ids=2,3', headers=HEADERS)
+    assert [item['prod_id'] for item in response.json['items']] == [2, 3]
+    assert client.get('/api/offers/comparison?sort=name', headers=HEADERS).status_code == 400
+    assert client.get('/api/offers/comparison?per_page=0', headers=HEADERS).status_code == 400
+    assert client.get('/api/offers/comparison?prod_ids=a', headers=HEADERS).status_code == 400
+    assert client.get('/api/offers/comparison').status_code == 401
+
+
+def test_vendor_summary():
+    app = run_app()
+    client = app.test_client()
+    with app.app_context():
+        insert_offers()
+        # vendor 10 changes price of product 1 twice and stock of product 2 once
+        for price, stock in ((110, 5), (120, 5)):
+            OfferDbModel(vendor_id=10, price=price, items_in_stock=stock, prod_id=1).insert()
+        OfferDbModel(vendor_id=10, price=50, items_in_stock=7, prod_id=2).insert()
+    response = client.get('/api/offers/vendor/10/summary', headers=HEADERS)
+    assert response.status_code == 200
+    summary = response.json
+    assert summary['active_offers'] == 3
+    assert summary['total_stock'] == 17
+    assert summary['avg_price'] == 80
+    # product 1 is 20 % above the cheapest vendor (vendor 40), products 2 and 3 are the cheapest
+    assert round(summary['avg_price_vs_market_min_pct'], 6) == round(20 / 3, 6)
+    assert summary['offer_updates'] == 6
+    assert summary['price_changes'] == 2
+    assert summary['price_changes_per_offer_per_day'] == 2 / 3
+    assert client.get('/api/offers/vendor/99/summary', headers=HEADERS).json == {}
+    assert client.get('/api/offers/vendor/10/summary?window_hours=0', headers=HEADERS).status_code == 400
+
+    page = client.get('/api/offers/vendors/summary?per_page=3', headers=HEADERS).json
+    assert page['total'] == 4
+    assert [item['vendor_id'] for item in page['items']] == [10, 20, 30]
+    assert page['items'][0] == summary
+
+    # cached summaries are dropped once new offers are ingested
+    with app.app_context():
+        OfferDbModel(vendor_id=10, price=70, items_in_stock=1, prod_id=4).insert()
+    assert client.get('/api/offers/vendor/10/summary', headers=HEADERS).json['active_offers'] == 4
+
+
+def test_vendor_summary_with_zero_lowest_price():
+    app = run_app()
+    client = app.test_client()
+    with app.app_context():
+        for prod_id, vendor_id, price in ((1, 10, 0), (1, 20, 50), (2, 20, 100), (2, 30, 110)):
+            OfferDbModel(vendor_id=vendor_id, price=price, items_in_stock=5, prod_id=prod_id).insert()
+    response = client.get('/api/offers/vendor/10/summary', headers=HEADERS)
+    assert response.status_code == 200
+    assert response.json['avg_price_vs_market_min_pct'] is None
+    # the product with the lowest price 0 is skipped
+    assert client.get('/api/offers/vendor/20/summary', headers=HEADERS).json['avg_price_vs_market_min_pct'] == 0
+    assert client.get('/api/offers/vendors/summary', headers=HEADERS).status_code == 200
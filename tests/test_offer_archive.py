@@ -0,0 +1,76 @@
+import json
+from datetime import datetime
+
+from sqlalchemy import inspect
+
+from flask_misc import fl_sql
+from offer_archive import archive, detach
+from offer_cleanup import purge_offers
+from offer_db_model import OfferDbModel
+from offer_partition_db_model import OfferPartitionDbModel
+from product_db_model import ProductDbModel
+from test_basic import run_app, API_TOKEN
+
+HEADERS = {'Bearer': API_TOKEN}
+INTERVAL = {'date_start': '2024-01-01T00:00:00.000000', 'date_end': '2024-12-31T00:00:00.000000'}
+
+
+def create_offers():
+    for name in ('Apple', 'Pear'):
+        assert ProductDbModel(name=name, description='Fruit').insert()
+    fl_sql.session.execute(OfferDbModel.__table__.insert(), [
+        {'vendor_id': vendor_id, 'price': price, 'items_in_stock': 1, 'active': active, 'prod_id': prod_id,
+         'date_created': date_created}
+        for prod_id, vendor_id, price, active, date_created in (
+            (1, 1, 100, False, datetime(2024, 1, 10)), (1, 2, 200, False, datetime(2024, 1, 20)),
+            (1, 1, 110, False, datetime(2024, 2, 10)), (2, 1, 300, False, datetime(2024, 2, 15)),
+            (1, 1, 120, True, datetime(2024, 3, 10)), (2, 1, 310, True, datetime(2024, 4, 1)))])
+    fl_sql.session.commit()
+
+
+def responses(client) -> "list":
+    return [client.get('/api/offers', headers=HEADERS).json,
+            client.get('/api/offers/product/1', headers=HEADERS).json,
+            client.get('/api/offers/vendor/1?fields=price', headers=HEADERS).json,
+            json.loads(client.post('/api/offers/product/1/vendor/1', headers=HEADERS, json=INTERVAL).json),
+            client.post('/api/offers/history', headers=HEADERS,
+                        json={'pairs': [{'prod_id': 1, 'vendor_id': 1}, {'prod_id': 2, 'vendor_id': 1}],
+                              **INTERVAL}).json]
+
+
+def test_archived_offers_are_served_unchanged():
+    app = run_app()
+    client = app.test_client()
+    with app.app_context():
+        create_offers()
+    before = responses(client)
+    with app.app_context():
+        # January and February are archived, March and April stay in OFFERS
+        assert archive(months=2, now=datetime(2024, 4, 15)) == 4
+        assert [(partition.name, partition.rows) for partition in OfferPartitionDbModel.find_overlapping()] == \
+            [('OFFERS_202401', 2), ('OFFERS_202402', 2)]
+        assert len(OfferDbModel.query.all()) == 2
+        assert [partition.name for partition in
+                OfferPartitionDbModel.find_overlapping(datetime(2024, 2, 1), datetime(2024, 3, 1))] == \
+            ['OFFERS_202402']
+        assert archive(months=2, now=datetime(2024, 4, 15)) == 0
+    after = responses(client)
+    # archived offers are older, so all lists keep their order
+    assert after == before
+    assert [offer['price'] for offer in after[1]] == [100, 200, 110, 120]
+
+    with app.app_context():
+        assert detach('OFFERS_202401') == 2
+        assert 'OFFERS_202401' not in inspect(fl_sql.engine).get_table_names()
+    assert [offer['price'] for offer in client.get('/api/offers/product/1', headers=HEADERS).json] == [110, 120]
+
+
+def test_purge_deletes_archived_offers():
+    app = run_app()
+    with app.app_context():
+        create_offers()
+        archive(months=2, now=datetime(2024, 4, 15))
+        assert ProductDbModel.delete_by_id(1)
+        assert purge_offers([1]) == 4
+        assert [(partition.name, partition.rows) for partition in OfferPartitionDbModel.find_overlapping()] == \
+            [('OFFERS_202401', 0), ('OFFERS_202402', 1)]
@@ -0,0 +1,91 @@
+from datetime import datetime
+
+from flask_misc import fl_sql
+from offer_cleanup import purge_offers
+from offer_db_model import OfferDbModel
+from product_db_model import ProductDbModel
+from test_basic import run_app, API_TOKEN
+
+HEADERS = {'Bearer': API_TOKEN}
+
+
+def create_products_with_offers(products: int, offers: int):
+    for i in range(products):
+        assert ProductDbModel(name=f'Product {i}', description='Product').insert()
+    fl_sql.session.execute(OfferDbModel.__table__.insert(), [
+        {'vendor_id': j, 'price': 100 + j, 'items_in_stock': 1, 'active': True, 'prod_id': prod_id,
+         'date_created': datetime.now()} for prod_id in range(1, products + 1) for j in range(offers)])
+    fl_sql.session.commit()
+
+
+def test_delete_product_cascades_to_offers():
+    app = run_app()
+    client = app.test_client()
+    with app.app_context():
+        create_products_with_offers(3, 20)
+    assert client.delete('/api/product/1', headers=HEADERS).status_code == 204
+    # deactivated immediately, deleted in the background
+    assert [offer['prod_id'] for offer in client.get('/api/offers/active', headers=HEADERS).json] == \
+        [2] * 20 + [3] * 20
+    app.extensions['offer_purger'].queue.join()
+    with app.app_context():
+        assert OfferDbModel.find_by_prod_id(1) == []
+        assert len(OfferDbModel.find_all()) == 40
+
+    response = client.delete('/api/products', headers=HEADERS, json={'prod_ids': [2, 3, 99]})
+    assert response.status_code == 200
+    assert response.json == {'deleted': 2}
+    app.extensions['offer_purger'].queue.join()
+    with app.app_context():
+        assert ProductDbModel.find_all() == []
+        assert OfferDbModel.find_all() == []
+    assert client.delete('/api/products', headers=HEADERS, json={'prod_ids': [2]}).json == {'deleted': 0}
+    assert client.delete('/api/products', headers=HEADERS, json={'prod_ids': []}).status_code == 400
+    assert client.delete('/api/products', headers=HEADERS, json={'prod_ids': '123'}).status_code == 400
+    assert client.delete('/api/products', headers=HEADERS, json={'prod_ids': ['1']}).status_code == 400
+    assert client.delete('/api/products', headers=HEADERS, json={'ids': [1]}).status_code == 400
+    assert client.delete('/api/products', json={'prod_ids': [1]}).status_code == 401
+
+
+def test_purge_orphaned_offers_in_batches():
+    app = run_app()
+    with app.app_context():
+        create_products_with_offers(3, 25)
+        # left behind by versions that deleted only the product rows
+        ProductDbModel.query.filter(ProductDbModel.prod_id.in_([1, 3])).delete(synchronize_session=False)
+        fl_sql.session.commit()
+        assert purge_offers(batch_size=10) == 50
+        assert {offer.prod_id for offer in OfferDbModel.find_all()} == {2}
+        assert purge_offers(batch_size=10) == 0
+
+
+def test_offer_list_version_changes_after_purge():
+    app = run_app()
+    client = app.test_client()
+    with app.app_context():
+        create_products_with_offers(2, 1)
+        assert ProductDbModel.delete_by_id(2)
+    # cached before the purge
+    assert [offer['internal_id'] for offer in client.get('/api/offers/product/1', headers=HEADERS).json] == [1]
+    with app.app_context():
+        version = OfferDbModel.data_version()
+        assert purge_offers([2]) == 1
+        assert OfferDbModel(vendor_id=0, price=90, items_in_stock=1, prod_id=1).insert()
+        assert OfferDbModel.data_version() != version
+        # the ID of the purged offer is not reused
+        assert OfferDbModel.find_all_active()[0].internal_id == 3
+    assert [(offer['internal_id'], offer['active']) for offer in
+            client.get('/api/offers/product/1', headers=HEADERS).json] == [(1, False), (3, True)]
+
+
+def test_purge_after_product_id_would_be_reused():
+    app = run_app()
+    client = app.test_client()
+    with app.app_context():
+        create_products_with_offers(1, 1)
+        assert ProductDbModel.delete_by_id(1)
+        new_product = ProductDbModel(name='New product', description='Product')
+        assert new_product.insert()
+        assert new_product.prod_id == 2
+        assert purge_offers([1]) == 1
+    assert client.get('/api/offers/product/2', headers=HEADERS).json == []
@@ -0,0 +1,132 @@
+import threading
+from datetime import datetime
+
+from flask_misc import fl_sql
+from offer_api import offer_list_schema
+from offer_db_model import OfferDbModel
+from offer_deactivation_db_model import OfferDeactivationDbModel
+from offer_snapshot import OfferSnapshot
+from test_basic import run_app, API_TOKEN
+
+HEADERS = {'Bearer': API_TOKEN}
+
+
+def insert_offers():
+    for prod_id, vendor_id, price in ((1, 10, 100), (1, 20, 200), (2, 10, 300), (1, 10, 150), (2, 30, 400),
+                                      (2, 10, 300)):
+        OfferDbModel(vendor_id=vendor_id, price=price, items_in_stock=5, prod_id=prod_id).insert()
+
+
+def test_snapshot_matches_db():
+    app = run_app()
+    client = app.test_client()
+    with app.app_context():
+        insert_offers()
+        active = offer_list_schema.dump(OfferDbModel.find_all_active())
+    assert len(active) == 4
+    assert client.get('/api/offers/active', headers=HEADERS).json == active
+    assert client.get('/api/offers/product/1/active', headers=HEADERS).json == \
+        [offer for offer in active if offer['prod_id'] == 1]
+    assert client.get('/api/offers/vendor/10/active', headers=HEADERS).json == \
+        [offer for offer in active if offer['vendor_id'] == 10]
+    assert client.get('/api/offers/vendor/99/active', headers=HEADERS).json == []
+    # writes of this process are visible immediately
+    with app.app_context():
+        OfferDbModel(vendor_id=20, price=250, items_in_stock=5, prod_id=1).insert()
+    prices = [offer['price'] for offer in client.get('/api/offers/product/1/active', headers=HEADERS).json]
+    assert prices == [150, 250]
+
+
+def test_snapshot_incremental_refresh_and_rebuild():
+    app = run_app()
+    snapshot = OfferSnapshot(max_age=3600)
+    with app.app_context():
+        insert_offers()
+        assert snapshot.refresh()
+        assert not snapshot.refresh()
+        # written by another process - no ORM events, seen after max_age or forced refresh
+        fl_sql.session.execute(OfferDbModel.__table__.update().where(OfferDbModel.internal_id == 4)
+                               .values(active=False))
+        fl_sql.session.execute(OfferDbModel.__table__.insert(), [
+            {'vendor_id': 10, 'price': 120, 'items_in_stock': 1, 'active': True, 'prod_id': 1,
+             'date_created': datetime(2030, 1, 2, 3, 4, 5, 6)}])
+        fl_sql.session.commit()
+        assert len(snapshot.by_product(1)) == 2
+        assert snapshot.refresh(force=True)
+        assert [offer['price'] for offer in snapshot.by_product(1)] == [200, 120]
+        assert snapshot.by_product(1)[1]['date_created'] == '2030-01-02T03:04:05.000006'
+        assert snapshot.stats()['rows'] == 5
+        # duplicated active offers are deactivated without a newer offer, the snapshot is rebuilt
+        fl_sql.session.execute(OfferDbModel.__table__.insert(), [
+            {'vendor_id': 30, 'price': 400, 'items_in_stock': 5, 'active': True, 'prod_id': 2,
+             'date_created': datetime.now()}])
+        fl_sql.session.commit()
+        assert not OfferDbModel(vendor_id=30, price=400, items_in_stock=5, prod_id=2).insert()
+        assert snapshot.refresh()
+        assert snapshot.stats() == {'offers': 4, 'rows': 4, 'bytes': 4 * 49}
+        assert snapshot.active() == offer_list_schema.dump(OfferDbModel.find_all_active())
+
+
+def test_refresh_does_not_modify_published_version():
+    app = run_app()
+    snapshot = OfferSnapshot(max_age=3600)
+    with app.app_context():
+        insert_offers()
+        snapshot.refresh()
+        published = snapshot._columns
+        before = (published.rows(range(len(published.alive))), published.rows(published.by_product[1]),
+                  published.rows(published.by_vendor[10]), dict(published.by_product))
+        OfferDbModel(vendor_id=10, price=90, items_in_stock=5, prod_id=1).insert()
+        OfferDbModel(vendor_id=10, price=80, items_in_stock=5, prod_id=3).insert()
+        assert snapshot.refresh()
+        assert snapshot._columns is not published
+        assert (published.rows(range(len(published.alive))), published.rows(published.by_product[1]),
+                published.rows(published.by_vendor[10]), dict(published.by_product)) == before
+        assert [offer['price'] for offer in snapshot.by_product(1)] == [200, 90]
+        assert snapshot.active() == offer_list_schema.dump(OfferDbModel.find_all_active())
+
+
+def test_prices_by_product_during_refreshes():
+    app = run_app()
+    snapshot = OfferSnapshot(max_age=3600)
+    with app.app_context():
+        insert_offers()
+        snapshot.refresh()
+
+    def refresh():
+        # what refresh() does with offers of new products, without the DB
+        for internal_id in range(100, 3100, 20):
+            columns = snapshot._columns.copy()
+            for offset in range(20):
+                columns.append(internal_id + offset, internal_id + offset, 10, 100, 1, datetime.now())
+            snapshot._columns = columns
+
+    writer = threading.Thread(target=refresh)
+    writer.start()
+    try:
+        while writer.is_alive():
+            for prod_id, prices in snapshot.prices_by_product():
+                if prod_id == 1:
+                    assert prices == [(200, 20), (150, 10)]
+    finally:
+        writer.join()
+    assert len(list(snapshot.prices_by_product())) == 3002
+
+
+def test_deactivations_applied_incrementally():
+    app = run_app()
+    snapshot = OfferSnapshot(max_age=3600)
+    with app.app_context():
+        insert_offers()
+        snapshot.refresh()
+        built_at = snapshot._built_at
+        # vendor 20 vanished upstream, vendor 10 changed its price
+        OfferDbModel.reconcile_many([OfferDbModel(vendor_id=10, price=140, items_in_stock=5, prod_id=1)], [1])
+        assert snapshot.refresh(force=True)
+        assert snapshot._built_at == built_at
+        assert snapshot.active() == offer_list_schema.dump(OfferDbModel.find_all_active())
+        assert [offer['price'] for offer in snapshot.by_product(1)] == [140]
+        OfferDbModel.reconcile_many([], [2])
+        # the newest deactivation is kept
+        assert OfferDeactivationDbModel.prune(retention=0) == 2
+        assert OfferDeactivationDbModel.find_since(0)[0][0] == OfferDeactivationDbModel.latest()
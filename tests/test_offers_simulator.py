@@ -0,0 +1,60 @@
+import requests
+
+from offers_client import OffersClient
+from offers_simulator import OffersSimulator, SimulatorConfig
+from offer_db_model import OfferDbModel
+from product_db_model import ProductDbModel
+from test_basic import run_app
+
+
+def test_simulator_is_deterministic():
+    config = SimulatorConfig(seed=42, churn=0.5, tick_seconds=0)
+    first = OffersSimulator(config)
+    second = OffersSimulator(config)
+    for prod_id in (1, 2, 100000, 250000):
+        assert first.offers(prod_id, tick=7) == second.offers(prod_id, tick=7)
+        assert config.min_vendors <= len(first.offers(prod_id, tick=0)) <= config.max_vendors
+    assert OffersSimulator(SimulatorConfig(seed=43)).offers(1, tick=7) != first.offers(1, tick=7)
+
+
+def test_simulator_churn():
+    simulator = OffersSimulator(SimulatorConfig(seed=1, churn=0.25, tick_seconds=0, out_of_stock_rate=0))
+    changed = 0
+    total = 0
+    for prod_id in range(1, 501):
+        before = simulator.offers(prod_id, tick=10)
+        after = simulator.offers(prod_id, tick=11)
+        changed += sum(1 for old, new in zip(before, after) if old != new)
+        total += len(before)
+    assert 0.15 < changed / total < 0.35
+
+
+def test_simulator_api(simulator_server):
+    base_url = simulator_server.base_url
+    auth_code = requests.post(base_url + '/auth').json()
+    assert requests.get(base_url + '/products/1/offers').status_code == 401
+    response = requests.get(base_url + '/products/1/offers', headers={'Bearer': auth_code})
+    assert response.status_code == 200
+    assert response.json() == simulator_server.simulator.offers(1)
+    assert requests.post(base_url + '/products/register', headers={'Bearer': auth_code},
+                         json={'prod_id': 1, 'name': 'Apple', 'description': 'Apple'}).status_code == 201
+
+
+def test_simulator_error_injection():
+    simulator = OffersSimulator(SimulatorConfig(error_rate=1.0))
+    assert simulator.inject_faults()
+    assert simulator.stats()['errors'] == 1
+
+
+def test_poller_ingests_simulated_offers(simulator_server):
+    app = run_app()
+    client = OffersClient()
+    client.define_app_context(app)
+    with app.app_context():
+        assert ProductDbModel(name='Apple', description='This is a red apple.').insert()
+        expected = [offer for offer in simulator_server.simulator.offers(1) if offer['items_in_stock'] > 0]
+        assert client.poll_once() == len(expected)
+        assert sorted(offer.vendor_id for offer in OfferDbModel.find_all_active()) == \
+               sorted(offer['id'] for offer in expected)
+        # the same tick produces the same offers, so nothing new is stored
+        assert client.poll_once() == 0
@@ -0,0 +1,76 @@
+import time
+
+import sqlalchemy.exc
+
+from offers_client import OffersClient
+from poller_lease import DbLease, FileLease, PollerSupervisor
+from poller_lease_db_model import PollerLeaseDbModel
+from test_basic import run_app
+
+
+def test_file_lease_is_exclusive(tmp_path):
+    path = str(tmp_path / 'poller.lock')
+    first = FileLease(path)
+    second = FileLease(path)
+    assert first.acquire()
+    assert first.acquire()
+    assert not second.acquire()
+    first.release()
+    assert second.acquire()
+    second.release()
+
+
+def test_db_lease_failover():
+    app = run_app()
+    first = DbLease(app, owner='worker-1', ttl=60)
+    second = DbLease(app, owner='worker-2', ttl=60)
+    assert first.acquire()
+    assert not second.acquire()
+    assert first.acquire()
+    with app.app_context():
+        # simulate a holder that died without releasing the lease
+        lease = PollerLeaseDbModel.find_by_name(first.name)
+        lease.expires_at = time.time() - 1
+        PollerLeaseDbModel.query.session.commit()
+    assert second.acquire()
+    assert not first.acquire()
+    second.release()
+    assert first.acquire()
+
+
+def test_db_lease_kept_on_transient_errors(monkeypatch):
+    app = run_app()
+    lease = DbLease(app, owner='worker-1', ttl=0.5)
+    assert lease.acquire()
+
+    def locked(*args):
+        raise sqlalchemy.exc.OperationalError('UPDATE', {}, Exception('database is locked'))
+
+    with monkeypatch.context() as patch:
+        patch.setattr(PollerLeaseDbModel, 'acquire', locked)
+        # nobody else can take the lease over before it expires
+        assert lease.acquire()
+        time.sleep(0.5)
+        assert not lease.acquire()
+        # the lease was lost, it is not held until it is renewed
+        assert not lease.acquire()
+    assert lease.acquire()
+
+
+def test_single_poller_with_graceful_shutdown(tmp_path):
+    app = run_app()
+    path = str(tmp_path / 'poller.lock')
+    supervisors = [PollerSupervisor(app, FileLease(path), OffersClient, interval=0.05) for _ in range(3)]
+    for supervisor in supervisors:
+        supervisor.start()
+    time.sleep(0.5)
+    leaders = [supervisor for supervisor in supervisors if supervisor.is_leader]
+    assert len(leaders) == 1
+    client = leaders[0].client
+    leaders[0].stop()
+    assert not client.is_alive()
+    time.sleep(0.5)
+    assert len([supervisor for supervisor in supervisors if supervisor.is_leader]) == 1
+    for supervisor in supervisors:
+        supervisor.stop()
+    assert not any(supervisor.is_leader for supervisor in supervisors)
@@ -0,0 +1,50 @@
+import time
+
+from poller_member_db_model import PollerMemberDbModel
+from poller_shards import HashRing, ShardedOffersClient
+from product_db_model import ProductDbModel
+from test_basic import run_app
+
+
+def test_hash_ring_balance_and_stability():
+    ring = HashRing(['a', 'b', 'c'])
+    owners = {prod_id: ring.owner(prod_id) for prod_id in range(1, 30001)}
+    for member in ('a', 'b', 'c'):
+        assert 5000 < list(owners.values()).count(member) < 15000
+    smaller_ring = HashRing(['a', 'b'])
+    # only products of the removed worker move
+    for prod_id, owner in owners.items():
+        if owner != 'c':
+            assert smaller_ring.owner(prod_id) == owner
+    assert HashRing([]).owner(1) is None
+
+
+def test_sharded_clients_partition_products():
+    app = run_app()
+    first = ShardedOffersClient('node:1:0', ttl=60)
+    second = ShardedOffersClient('node:1:1', ttl=60)
+    with app.app_context():
+        for i in range(50):
+            assert ProductDbModel(name=f'Product {i}', description='Product').insert()
+        PollerMemberDbModel.beat(first.worker_id)
+        PollerMemberDbModel.beat(second.worker_id)
+        first_shard = set(first.product_ids())
+        second_shard = set(second.product_ids())
+        assert first_shard and second_shard
+        assert not first_shard & second_shard
+        assert first_shard | second_shard == set(ProductDbModel.find_all_ids())
+        # second worker leaves, first takes over whole catalogue
+        PollerMemberDbModel.delete_by_id(second.worker_id)
+        assert set(first.product_ids()) == set(ProductDbModel.find_all_ids())
+
+
+def test_sharded_client_records_cycle():
+    app = run_app()
+    client = ShardedOffersClient('node:2:0', ttl=60)
+    with app.app_context():
+        assert ProductDbModel(name='Apple', description='This is a red apple.').insert()
+        PollerMemberDbModel.beat(client.worker_id)
+        assert client.poll_once() > 0
+        member = PollerMemberDbModel.find_live(60)[0]
+        assert member.products == 1
+        assert time.time() - member.last_cycle_start < 60
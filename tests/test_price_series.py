@@ -0,0 +1,52 @@
+import json
+
+import price_series_db_model
+from offer_db_model import OfferDbModel
+from price_series import backfill
+from price_series_db_model import PriceSeriesDbModel, _decode, _encode
+from test_basic import run_app, API_TOKEN
+
+HEADERS = {'Bearer': API_TOKEN}
+INTERVAL = {'date_start': '0001-01-01T00:00:00.000000', 'date_end': '3000-01-01T00:00:00.000000'}
+PAIRS = ((1, 10), (1, 20), (2, 10))
+
+
+def test_varint_round_trip():
+    values = [0, 1, -1, 63, -64, 64, 1_000_000, -86_400_000_000, 2 ** 62]
+    assert list(_decode(_encode(values))) == values
+    assert len(_encode([1, -1, 63, -64])) == 4
+
+
+def histories(client) -> "dict":
+    single = {pair: json.loads(client.post(f'/api/offers/product/{pair[0]}/vendor/{pair[1]}', headers=HEADERS,
+                                           json=INTERVAL).json) for pair in PAIRS}
+    bulk = client.post('/api/offers/history', headers=HEADERS, json={'prod_id': 1, **INTERVAL}).json
+    return {'single': single, 'bulk': bulk}
+
+
+def test_series_history_matches_offers_history(monkeypatch):
+    monkeypatch.setattr(price_series_db_model, 'CHUNK_POINTS', 3)
+    app = run_app()
+    app.config['PRICE_SERIES'] = True
+    client = app.test_client()
+    with app.app_context():
+        for prod_id, vendor_id, price in ((1, 10, 100), (1, 20, 200), (1, 10, 150), (2, 10, 300), (1, 10, 100)):
+            OfferDbModel(vendor_id=vendor_id, price=price, items_in_stock=5, prod_id=prod_id).insert()
+        OfferDbModel.insert_many([OfferDbModel(vendor_id=vendor_id, price=price, items_in_stock=5, prod_id=prod_id)
+                                  for prod_id, vendor_id, price in ((1, 10, 90), (1, 20, 210), (1, 10, 95),
+                                                                    (2, 10, 300), (1, 10, 80))])
+        # 6 observations of (1, 10) in chunks of 3, the unchanged offer of (2, 10) is not an observation
+        assert [(series.prod_id, series.vendor_id, series.chunk, series.count)
+                for series in PriceSeriesDbModel.query.order_by('prod_id', 'vendor_id', 'chunk')] == \
+            [(1, 10, 0, 3), (1, 10, 1, 3), (1, 20, 0, 2), (2, 10, 0, 1)]
+    from_series = histories(client)
+    assert [item['price'] for item in from_series['single'][(1, 10)]['history']] == [100, 150, 100, 90, 95, 80]
+
+    app.config['PRICE_SERIES'] = False
+    assert histories(client) == from_series
+
+    with app.app_context():
+        assert backfill(batch_size=1) == 9
+        assert PriceSeriesDbModel.storage_stats()['points'] == 9
+    app.config['PRICE_SERIES'] = True
+    assert histories(client) == from_series
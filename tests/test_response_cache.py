@@ -0,0 +1,117 @@
+import gzip
+import json
+from datetime import datetime
+
+from flask_misc import fl_sql
+from offer_db_model import OfferDbModel
+from offer_deactivation_db_model import OfferDeactivationDbModel
+from offer_snapshot import OfferSnapshot
+from response_cache import CachedResponse, ResponseCache
+from test_basic import run_app, API_TOKEN
+
+HEADERS = {'Bearer': API_TOKEN}
+
+
+def test_cache_is_bounded_lru():
+    app = run_app()
+    cache = ResponseCache(max_bytes=300)
+    with app.test_request_context('/'):
+        for key in 'abc':
+            cache.put(key, CachedResponse(1, b'x' * 100))
+        assert cache.get('a', 1) is not None
+        assert cache.get('a', 2) is None
+        cache.put('d', CachedResponse(1, b'x' * 100))
+        # b was used least recently
+        assert [key for key in 'abcd' if cache.get(key, 1) is not None] == ['a', 'c', 'd']
+        assert cache.bytes == 300
+        cache.put('e', CachedResponse(1, b'x' * 301))
+        assert cache.get('e', 1) is None
+
+
+def test_rebuilt_responses_are_bounded():
+    app = run_app()
+    cache = ResponseCache(max_bytes=300, max_rebuilt=2)
+    with app.test_request_context('/'):
+        for key in 'abc':
+            cache.put(key, CachedResponse(1, b'x' * 100), lambda: CachedResponse(2, b'y' * 100))
+        assert list(cache._rebuilt) == ['b', 'c']
+        # evicted responses are no longer rebuilt
+        assert cache.get('a', 1) is not None
+        cache.put('d', CachedResponse(1, b'x' * 100))
+        assert list(cache._rebuilt) == ['c']
+    cache.rebuild_async(app)
+    cache._rebuild_lock.acquire()
+    cache._rebuild_lock.release()
+    assert cache.get('c', 2) is not None
+    assert len(cache._entries) == 3 and cache.bytes == 300
+
+
+def test_active_offers_served_from_cache_and_rebuilt():
+    app = run_app()
+    client = app.test_client()
+    cache = app.extensions['response_cache']
+    with app.app_context():
+        OfferDbModel.insert_many([OfferDbModel(vendor_id=vendor_id, price=100, items_in_stock=5, prod_id=1)
+                                  for vendor_id in range(50)])
+    plain = client.get('/api/offers/active', headers=HEADERS)
+    assert len(plain.json) == 50
+    compressed = client.get('/api/offers/active', headers={**HEADERS, 'Accept-Encoding': 'gzip, deflate'})
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(compressed.data)) == plain.json
+
+    with app.app_context():
+        version = OfferDbModel.data_version()
+        OfferDbModel.insert_many([OfferDbModel(vendor_id=0, price=90, items_in_stock=5, prod_id=1)])
+        new_version = OfferDbModel.data_version()
+        cache.rebuild_async(app)
+    cache._rebuild_lock.acquire()
+    cache._rebuild_lock.release()
+    key = next(key for key in cache._entries if key[0].endswith('active_offer_list'))
+    assert cache.get(key, version) is None
+    assert json.loads(cache.get(key, new_version).body)[-1]['price'] == 90
+    assert client.get('/api/offers/active', headers=HEADERS).json[-1]['price'] == 90
+
+
+def test_cache_key_has_only_requested_fields():
+    app = run_app()
+    client = app.test_client()
+    cache = app.extensions['response_cache']
+    with app.app_context():
+        OfferDbModel(vendor_id=1, price=100, items_in_stock=5, prod_id=1).insert()
+    for query in ('', '?page=1', '?x=1&y=2'):
+        assert len(client.get(f'/api/offers/active{query}', headers=HEADERS).json) == 1
+    for query in ('?fields=price,prod_id', '?fields=price,prod_id,price&x=1', '?fields= price , prod_id'):
+        assert client.get(f'/api/offers/active{query}', headers=HEADERS).json == [{'price': 100, 'prod_id': 1}]
+    assert len(cache._entries) == 2
+    assert [path for path, _ in cache._rebuilt.values()] == ['/api/offers/active'] * 2
+
+
+def test_cached_response_from_snapshot_covers_its_version():
+    app = run_app()
+    app.extensions['offer_snapshot'] = OfferSnapshot(max_age=3600)
+    client = app.test_client()
+    with app.app_context():
+        OfferDbModel(vendor_id=1, price=100, items_in_stock=5, prod_id=1).insert()
+    assert len(client.get('/api/offers/active', headers=HEADERS).json) == 1
+    with app.app_context():
+        # written by another process - the snapshot doesn't refresh by itself until max_age
+        fl_sql.session.execute(OfferDbModel.__table__.insert(), [
+            {'vendor_id': 2, 'price': 90, 'items_in_stock': 5, 'active': True, 'prod_id': 1,
+             'date_created': datetime.now()}])
+        fl_sql.session.commit()
+    assert [offer['price'] for offer in client.get('/api/offers/active', headers=HEADERS).json] == [100, 90]
+    assert [offer['price'] for offer in client.get('/api/offers/product/1/active', headers=HEADERS).json] == [100, 90]
+
+
+def test_cached_response_outdated_after_deactivation_log_pruned():
+    app = run_app()
+    client = app.test_client()
+    with app.app_context():
+        OfferDbModel(vendor_id=1, price=100, items_in_stock=5, prod_id=1).insert()
+        OfferDbModel(vendor_id=2, price=100, items_in_stock=5, prod_id=1).insert()
+    assert len(client.get('/api/offers/vendor/2/active', headers=HEADERS).json) == 1
+    with app.app_context():
+        # vendor 2 vanished upstream, the log is pruned before the cached response is requested again
+        OfferDbModel.reconcile_many([OfferDbModel(vendor_id=1, price=100, items_in_stock=5, prod_id=1)], [1])
+        OfferDeactivationDbModel.prune(retention=0)
+    assert client.get('/api/offers/vendor/2/active', headers=HEADERS).json == []
@@ -0,0 +1,74 @@
+import threading
+import time
+
+import pytest
+
+import metrics
+from offer_db_model import OfferDbModel
+from single_flight import SingleFlight
+from test_basic import run_app, API_TOKEN
+
+HEADERS = {'Bearer': API_TOKEN}
+
+
+def run_concurrently(single_flight: SingleFlight, key, compute, calls: int) -> "list":
+    results = [None] * calls
+    barrier = threading.Barrier(calls)
+
+    def call(i):
+        barrier.wait()
+        try:
+            results[i] = single_flight.do(key, compute)
+        except RuntimeError as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(calls)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_calls_share_computation():
+    single_flight = SingleFlight()
+    computations = []
+    coalesced_before = metrics.SINGLE_FLIGHT_REQUESTS.value('none', 'coalesced')
+
+    def compute():
+        computations.append(1)
+        time.sleep(0.2)
+        return b'[]'
+
+    assert run_concurrently(single_flight, 'key', compute, 8) == [b'[]'] * 8
+    assert len(computations) == 1
+    assert metrics.SINGLE_FLIGHT_REQUESTS.value('none', 'coalesced') - coalesced_before == 7
+    # finished computations are not reused
+    assert single_flight.do('key', compute) == b'[]'
+    assert len(computations) == 2
+
+    def fail():
+        time.sleep(0.2)
+        raise RuntimeError('DB is down')
+
+    results = run_concurrently(single_flight, 'key', fail, 4)
+    assert all(isinstance(result, RuntimeError) for result in results)
+    with pytest.raises(RuntimeError):
+        single_flight.do('key', fail)
+
+
+def test_offer_lists_are_shared_per_data_version():
+    app = run_app()
+    client = app.test_client()
+    with app.app_context():
+        OfferDbModel(vendor_id=1, price=100, items_in_stock=5, prod_id=1).insert()
+    computed_before = metrics.SINGLE_FLIGHT_REQUESTS.value('ProductOfferList', 'computed')
+    response = client.get('/api/offers/product/1', headers=HEADERS)
+    assert response.status_code == 200
+    assert [offer['price'] for offer in response.json] == [100]
+    with app.app_context():
+        OfferDbModel(vendor_id=1, price=90, items_in_stock=5, prod_id=1).insert()
+    assert [offer['price'] for offer in client.get('/api/offers/product/1', headers=HEADERS).json] == [100, 90]
+    assert [offer['price'] for offer in client.get('/api/offers/active', headers=HEADERS).json] == [90]
+    assert metrics.SINGLE_FLIGHT_REQUESTS.value('ProductOfferList', 'computed') - computed_before == 2
+    assert client.get('/api/offers/product/1').status_code == 401
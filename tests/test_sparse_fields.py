@@ -0,0 +1,45 @@
+from offer_db_model import OfferDbModel
+from product_db_model import ProductDbModel
+from test_basic import run_app, API_TOKEN
+
+HEADERS = {'Bearer': API_TOKEN}
+
+
+def test_offer_lists_with_fields():
+    app = run_app()
+    client = app.test_client()
+    with app.app_context():
+        OfferDbModel(vendor_id=1, price=100, items_in_stock=5, prod_id=1).insert()
+        OfferDbModel(vendor_id=1, price=90, items_in_stock=5, prod_id=1).insert()
+        OfferDbModel(vendor_id=2, price=80, items_in_stock=5, prod_id=2).insert()
+    for path, expected in (('/api/offers', [(1, 1, 100), (1, 1, 90), (2, 2, 80)]),
+                           ('/api/offers/active', [(1, 1, 90), (2, 2, 80)]),
+                           ('/api/offers/product/1', [(1, 1, 100), (1, 1, 90)]),
+                           ('/api/offers/vendor/2', [(2, 2, 80)]),
+                           ('/api/offers/product/1/active', [(1, 1, 90)]),
+                           ('/api/offers/vendor/1/active', [(1, 1, 90)])):
+        response = client.get(f'{path}?fields=price,prod_id,vendor_id', headers=HEADERS)
+        assert response.status_code == 200, path
+        assert [tuple(offer) for offer in response.json] == [('price', 'prod_id', 'vendor_id')] * len(expected)
+        assert [(offer['prod_id'], offer['vendor_id'], offer['price']) for offer in response.json] == expected
+    # orders of the same fields are cached separately
+    for fields in ('vendor_id,price', 'price,vendor_id'):
+        assert list(client.get(f'/api/offers/active?fields={fields}', headers=HEADERS).json[0]) == fields.split(',')
+    # the snapshot and the DB produce the same fields
+    app.extensions.pop('offer_snapshot')
+    app.extensions['response_cache'].clear()
+    assert client.get('/api/offers/active?fields=date_created,active', headers=HEADERS).json[0].keys() == \
+        {'date_created', 'active'}
+    assert client.get('/api/offers?fields=price,product', headers=HEADERS).status_code == 400
+    assert client.get('/api/offers/active?fields=', headers=HEADERS).status_code == 400
+
+
+def test_product_list_with_fields():
+    app = run_app()
+    client = app.test_client()
+    with app.app_context():
+        assert ProductDbModel(name='Apple', description='This is a red apple.').insert()
+    assert client.get('/api/products?fields=name', headers=HEADERS).json == [{'name': 'Apple'}]
+    assert list(client.get('/api/products?fields=name,prod_id,name', headers=HEADERS).json[0]) == ['name', 'prod_id']
+    assert client.get('/api/products', headers=HEADERS).json[0]['description'] == 'This is a red apple.'
+    assert client.get('/api/products?fields=offers', headers=HEADERS).status_code == 400
@@ -0,0 +1,29 @@
+import os
+import subprocess
+import sys
+
+import offers_client
+from offers_client import OffersClient, get_offers_client
+
+
+def test_import_does_no_network_io():
+    # closed port and no authorization code - any request during import would fail
+    env = dict(os.environ, OFFER_BASE_URL='http://127.0.0.1:9')
+    env.pop('OFFER_AUTH_CODE')
+    probe = 'import main, offers_client; main.create_app(); assert offers_client._offers_client is None'
+    subprocess.run([sys.executable, '-c', probe], env=env, check=True, cwd=os.path.dirname(os.path.dirname(__file__)))
+
+
+def test_auth_code_requested_on_first_use(monkeypatch, simulator_server):
+    monkeypatch.delenv('OFFER_AUTH_CODE')
+    client = OffersClient()
+    assert client._auth_code is None
+    assert client.auth_code == simulator_server.simulator.config.auth_code
+    monkeypatch.setenv('OFFER_BASE_URL', 'http://127.0.0.1:9')
+    # requested only once
+    assert client.auth_code == simulator_server.simulator.config.auth_code
+
+
+def test_shared_client_created_once(monkeypatch):
+    monkeypatch.setattr(offers_client, '_offers_client', None)
+    assert get_offers_client() is get_offers_client()
@@ -0,0 +1,61 @@
+from offer_db_model import OfferDbModel
+from product_db_model import ProductDbModel
+from test_basic import run_app, API_TOKEN
+from watch_db_model import IN_STOCK, PRICE_BELOW, ThresholdIndex
+
+HEADERS = {'Bearer': API_TOKEN}
+
+
+def test_threshold_index_finds_crossed_thresholds():
+    index = ThresholdIndex([(1, 1, PRICE_BELOW, 100), (2, 1, PRICE_BELOW, 80), (3, 1, IN_STOCK, None),
+                            (4, 2, PRICE_BELOW, 50)], version=0)
+    assert index.prod_ids == {1, 2}
+    assert index.fired(1, 120, 90) == [(1, PRICE_BELOW, 100)]
+    assert index.fired(1, 90, 70) == [(2, PRICE_BELOW, 80)]
+    assert index.fired(1, 70, 60) == []
+    assert index.fired(1, 70, 120) == []
+    assert index.fired(1, 70, None) == []
+    assert index.fired(1, None, 90) == [(3, IN_STOCK, None), (1, PRICE_BELOW, 100)]
+
+
+def test_alerts_fire_on_ingestion():
+    app = run_app()
+    client = app.test_client()
+    with app.app_context():
+        for name in ('Apple', 'Pear'):
+            assert ProductDbModel(name=name, description='Fruit').insert()
+    assert client.post('/api/watches', headers=HEADERS, json={'prod_id': 1, 'kind': 'price_below', 'price': 100}) \
+        .status_code == 201
+    assert client.post('/api/watches', headers=HEADERS, json={'prod_id': 1, 'kind': 'in_stock'}).status_code == 201
+    assert client.post('/api/watches', headers=HEADERS, json={'prod_id': 1, 'kind': 'in_stock', 'price': 1}) \
+        .status_code == 400
+    assert client.post('/api/watches', headers=HEADERS, json={'prod_id': 3, 'kind': 'in_stock'}).status_code == 400
+    assert [watch['kind'] for watch in client.get('/api/watches?prod_id=1', headers=HEADERS).json] == \
+        ['price_below', 'in_stock']
+
+    with app.app_context():
+        def poll(prod_id, *offers):
+            OfferDbModel.reconcile_many([OfferDbModel(vendor_id=vendor_id, price=price, items_in_stock=1,
+                                                      prod_id=prod_id) for vendor_id, price in offers], [prod_id])
+
+        poll(1, (1, 120), (2, 110))
+        poll(2, (1, 10))
+        poll(1, (1, 120), (2, 90))
+        poll(1, (1, 120), (2, 80))
+        poll(1)
+        poll(1, (2, 95))
+    alerts = client.get('/api/watches/alerts', headers=HEADERS).json
+    assert alerts['total'] == 4
+    assert [(alert['kind'], alert['price'], alert['vendor_id']) for alert in alerts['items']] == \
+        [('in_stock', 110, 2), ('price_below', 90, 2), ('in_stock', 95, 2), ('price_below', 95, 2)]
+    page = client.get(f'/api/watches/alerts?after={alerts["items"][1]["alert_id"]}&per_page=1&page=2',
+                      headers=HEADERS).json
+    assert (page['total'], [alert['kind'] for alert in page['items']]) == (2, ['price_below'])
+    assert client.get('/api/watches/alerts?after=x', headers=HEADERS).status_code == 400
+
+    assert client.delete('/api/watches/1', headers=HEADERS).status_code == 204
+    with app.app_context():
+        poll(1)
+        poll(1, (2, 95))
+    assert [alert['kind'] for alert in client.get('/api/watches/alerts?after=4', headers=HEADERS).json['items']] == \
+        ['in_stock']
@@ -0,0 +1,155 @@
+from flask import request
+from flask_restx import Resource, fields, Namespace
+from auth_api import evaluate_token
+from flask_misc import RESPONSE200, RESPONSE201, RESPONSE204, RESPONSE400, RESPONSE401, RESPONSE403
+from metrics import phase
+from offer_api import DEFAULT_PER_PAGE, MAX_PER_PAGE, page_args
+from product_db_model import ProductDbModel
+from watch_db_model import AlertDbModel, WatchDbModel, WATCH_KINDS, PRICE_BELOW
+from watch_db_schema import AlertDbSchema, WatchDbSchema
+
+watches_ns = Namespace('watches', description='Price alert watches related operations')
+
+watch_schema = WatchDbSchema()
+watch_list_schema = WatchDbSchema(many=True)
+alert_list_schema = AlertDbSchema(many=True)
+
+watch_body = {'prod_id': fields.Integer('ID of the watched product'),
+              'kind': fields.String(f'Kind of the watch, one of {", ".join(WATCH_KINDS)}'),
+              'price': fields.Integer(f'Threshold price, required for {PRICE_BELOW}')}
+watch_model = watches_ns.model(name='Watch', model=watch_body)
+watch_model_res = watches_ns.model(name='WatchWithId', model={
+    'watch_id': fields.Integer('Watch ID'), **watch_body, 'date_created': fields.DateTime('Datetime of registration')})
+alert_model_res = watches_ns.model(name='Alert', model={
+    'alert_id': fields.Integer('Alert ID'), 'watch_id': fields.Integer('ID of the fired watch'),
+    'prod_id': fields.Integer('ID of the watched product'), 'kind': fields.String('Kind of the watch'),
+    'threshold': fields.Integer('Threshold price of the watch'),
+    'price': fields.Integer('Price of the cheapest offer in stock when the watch fired'),
+    'vendor_id': fields.Integer('Vendor of the cheapest offer'),
+    'date_created': fields.DateTime('Datetime the watch fired')})
+alert_page_model = watches_ns.model(name='AlertPage', model={
+    'items': fields.List(fields.Nested(alert_model_res)), 'page': fields.Integer('Page number'),
+    'per_page': fields.Integer('Items per page'), 'total': fields.Integer('Number of alerts')})
+
+
+class Watch(Resource):
+    @staticmethod
+    @watches_ns.doc('Delete a watch')
+    @watches_ns.response(200, RESPONSE200)
+    @watches_ns.response(204, RESPONSE204)
+    @watches_ns.response(401, RESPONSE401)
+    @watches_ns.response(403, RESPONSE403)
+    def delete(watch_id: int) -> "(str, int)":
+        """
+        Delete a watch by watch ID, alerts it already fired are kept
+
+        :param watch_id: Watch ID (int)
+        :returns:
+            - info - 'str' 'message' info
+            - sc - 'int' representing HTTP status code
+        """
+        msg, auth_check = evaluate_token(request.headers.get('Bearer'))
+        if auth_check != 200:
+            return {'message': msg}, auth_check
+        if WatchDbModel.delete_by_id(watch_id):
+            return {'message': RESPONSE204}, 204
+        return {'message': f'No watch with watch_id={watch_id} was found and therefore was not deleted'}, 200
+
+
+class WatchList(Resource):
+    @staticmethod
+    @watches_ns.doc('Get all watches', params={'prod_id': 'Only watches of this product'})
+    @watches_ns.response(200, RESPONSE200, [watch_model_res])
+    @watches_ns.response(400, RESPONSE400)
+    @watches_ns.response(401, RESPONSE401)
+    @watches_ns.response(403, RESPONSE403)
+    def get() -> "(str, int)":
+        """
+        Get list of all watches
+
+        :returns:
+            - info - 'str' json representing list of watches or 'message' info if not successful
+            - sc - 'int' representing HTTP status code
+        """
+        msg, auth_check = evaluate_token(request.headers.get('Bearer'))
+        if auth_check != 200:
+            return {'message': msg}, auth_check
+        try:
+            prod_id = request.args.get('prod_id')
+            prod_id = None if prod_id is None else int(prod_id)
+        except ValueError as e:
+            return {'message': f'{RESPONSE400} - {e}'}, 400
+        with phase('query'):
+            watches = WatchDbModel.find_all(prod_id)
+        with phase('serialize'):
+            return watch_list_schema.dump(watches), 200
+
+    @staticmethod
+    @watches_ns.expect(watch_model)
+    @watches_ns.doc('Create a watch')
+    @watches_ns.response(201, RESPONSE201, watch_model_res)
+    @watches_ns.response(400, RESPONSE400)
+    @watches_ns.response(401, RESPONSE401)
+    @watches_ns.response(403, RESPONSE403)
+    def post() -> "(str, int)":
+        """
+        Create a watch of a product - an alert is fired when the cheapest offer in stock drops below the price
+        (price_below) or when the product comes back in stock (in_stock)
+
+        :returns:
+            - info - 'str' json representing watch or 'message' info if not successful
+            - sc - 'int' representing HTTP status code
+        """
+        msg, auth_check = evaluate_token(request.headers.get('Bearer'))
+        if auth_check != 200:
+            return {'message': msg}, auth_check
+        watch_json = request.get_json()
+        try:
+            unknown = set(watch_json) - watch_body.keys()
+            if unknown:
+                raise ValueError(f'Attributes {", ".join(sorted(unknown))} are not present in the model.')
+            price = watch_json.get('price')
+            watch = WatchDbModel(prod_id=int(watch_json['prod_id']), kind=watch_json['kind'],
+                                 price=None if price is None else int(price))
+        except (KeyError, TypeError, ValueError) as e:
+            return {'message': f'{RESPONSE400} - {e!r}'}, 400
+        if ProductDbModel.find_by_id(watch.prod_id) is None:
+            return {'message': f'No product with prod_id={watch.prod_id} was found'}, 400
+        if not watch.insert():
+            return {'message': 'Internal server error - object not created'}, 500
+        return watch_schema.dump(watch), 201
+
+
+class AlertList(Resource):
+    @staticmethod
+    @watches_ns.doc('Get fired alerts',
+                    params={'after': 'Only alerts with greater alert ID, e.g. the last one already processed',
+                            'prod_id': 'Only alerts of this product', 'page': 'Page number starting at 1',
+                            'per_page': f'Items per page, at most {MAX_PER_PAGE} ({DEFAULT_PER_PAGE} by default)'})
+    @watches_ns.response(200, RESPONSE200, alert_page_model)
+    @watches_ns.response(400, RESPONSE400)
+    @watches_ns.response(401, RESPONSE401)
+    @watches_ns.response(403, RESPONSE403)
+    def get() -> "(str, int)":
+        """
+        Get alerts fired by watches ordered by alert ID; consumers pass the last alert ID they processed as after
+        to get only new alerts
+
+        :returns:
+            - info - 'str' json containing page of alerts or 'message' info if not successful
+            - sc - 'int' representing HTTP status code
+        """
+        msg, auth_check = evaluate_token(request.headers.get('Bearer'))
+        if auth_check != 200:
+            return {'message': msg}, auth_check
+        try:
+            after = int(request.args.get('after', 0))
+            prod_id = request.args.get('prod_id')
+            prod_id = None if prod_id is None else int(prod_id)
+            page, per_page = page_args()
+        except ValueError as e:
+            return {'message': str(e)}, 400
+        with phase('query'):
+            alerts, total = AlertDbModel.find_page(after, (page - 1) * per_page, per_page, prod_id)
+        with phase('serialize'):
+            return {'items': alert_list_schema.dump(alerts), 'page': page, 'per_page': per_page, 'total': total}, 200
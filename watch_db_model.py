@@ -0,0 +1,256 @@
+from bisect import bisect_right
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+from data_version_db_model import DataVersionDbModel, WATCHES
+from flask_misc import fl_sql
+
+PRICE_BELOW = 'price_below'
+IN_STOCK = 'in_stock'
+WATCH_KINDS = (PRICE_BELOW, IN_STOCK)
+
+
+class WatchDbModel(fl_sql.Model):
+    __tablename__ = 'WATCHES'
+
+    watch_id = fl_sql.Column(fl_sql.Integer, primary_key=True)
+    prod_id = fl_sql.Column(fl_sql.Integer, fl_sql.ForeignKey('PRODUCTS.prod_id'), nullable=False, index=True)
+    kind = fl_sql.Column(fl_sql.String(20), nullable=False)
+    price = fl_sql.Column(fl_sql.Integer, nullable=True)
+    date_created = fl_sql.Column(fl_sql.DateTime, nullable=False)
+
+    def __init__(self, prod_id: int, kind: str, price: int = None):
+        """
+        WatchDbModel used for SQLAlchemy database; a row asks for an alert when the cheapest offer in stock of
+        a product drops below the price (kind price_below) or when the product comes back in stock (kind in_stock)
+
+        :param prod_id: ID of the watched product (int)
+        :param kind: One of WATCH_KINDS (str)
+        :param price: Threshold price, required for price_below (int)
+        """
+        if kind not in WATCH_KINDS:
+            raise ValueError(f'Parameter kind should be one of {", ".join(WATCH_KINDS)}, but it is {kind}.')
+        if (kind == PRICE_BELOW) != (price is not None):
+            raise ValueError(f'Parameter price is required for {PRICE_BELOW} and not allowed for {IN_STOCK}.')
+        self.prod_id = prod_id
+        self.kind = kind
+        self.price = price
+        self.date_created = datetime.now()
+
+    def __repr__(self):
+        """
+        Return string representation of the WatchDbModel
+
+        :returns: - 'str' representing watch
+        """
+        return f'Watch watch_id = {self.watch_id}, prod_id = {self.prod_id}, kind = {self.kind}, price = {self.price}'
+
+    def insert(self) -> "bool":
+        """
+        Insert watch into DB; ingestion in all processes picks it up with the next batch of offers
+
+        :returns: - 'bool' representing success of the operation
+        """
+        try:
+            fl_sql.session.add(self)
+            DataVersionDbModel.bump(WATCHES)
+            fl_sql.session.commit()
+        except IntegrityError:
+            fl_sql.session.rollback()
+            return False
+        return True
+
+    @classmethod
+    def delete_by_id(cls, watch_id: int) -> "bool":
+        """
+        Delete watch by watch ID, alerts it fired are kept
+
+        :param watch_id: Watch ID (int)
+        :returns: - 'bool' representing whether the watch existed
+        """
+        deleted = cls.query.filter_by(watch_id=watch_id).delete()
+        if deleted:
+            DataVersionDbModel.bump(WATCHES)
+        fl_sql.session.commit()
+        return bool(deleted)
+
+    @classmethod
+    def find_all(cls, prod_id: int = None) -> "List[WatchDbModel]":
+        """
+        Find all watches
+
+        :param prod_id: Only watches of this product if provided (int)
+        :returns: - 'List[WatchDbModel]' representing watches ordered by watch ID
+        """
+        query = cls.query if prod_id is None else cls.query.filter_by(prod_id=prod_id)
+        return query.order_by(cls.watch_id).all()
+
+    @classmethod
+    def delete_orphans(cls, prod_ids: List[int] = None) -> "int":
+        """
+        Delete watches and alerts of products that don't exist and commit
+
+        :param prod_ids: Only watches of these (deleted) products if provided (List[int])
+        :returns: - 'int' representing number of deleted watches
+        """
+        from product_db_model import ProductDbModel
+        deleted = []
+        for model in (cls, AlertDbModel):
+            query = model.query.filter(~model.prod_id.in_(fl_sql.session.query(ProductDbModel.prod_id)))
+            if prod_ids is not None:
+                query = query.filter(model.prod_id.in_(prod_ids))
+            deleted.append(query.delete(synchronize_session=False))
+        if deleted[0]:
+            DataVersionDbModel.bump(WATCHES)
+        fl_sql.session.commit()
+        return deleted[0]
+
+
+class AlertDbModel(fl_sql.Model):
+    __tablename__ = 'ALERTS'
+
+    alert_id = fl_sql.Column(fl_sql.Integer, primary_key=True)
+    # the watch may be deleted later, its alerts stay
+    watch_id = fl_sql.Column(fl_sql.Integer, nullable=False, index=True)
+    prod_id = fl_sql.Column(fl_sql.Integer, nullable=False, index=True)
+    kind = fl_sql.Column(fl_sql.String(20), nullable=False)
+    threshold = fl_sql.Column(fl_sql.Integer, nullable=True)
+    price = fl_sql.Column(fl_sql.Integer, nullable=False)
+    vendor_id = fl_sql.Column(fl_sql.Integer, nullable=False)
+    date_created = fl_sql.Column(fl_sql.DateTime, nullable=False)
+
+    def __init__(self, watch_id: int, prod_id: int, kind: str, threshold: Optional[int], price: int, vendor_id: int):
+        """
+        AlertDbModel used for SQLAlchemy database; a row is a fired watch
+
+        :param watch_id: ID of the fired watch (int)
+        :param prod_id: ID of the watched product (int)
+        :param kind: Kind of the watch (str)
+        :param threshold: Threshold price of the watch (int)
+        :param price: Price of the cheapest offer in stock when the watch fired (int)
+        :param vendor_id: Vendor of the cheapest offer (int)
+        """
+        self.watch_id = watch_id
+        self.prod_id = prod_id
+        self.kind = kind
+        self.threshold = threshold
+        self.price = price
+        self.vendor_id = vendor_id
+        self.date_created = datetime.now()
+
+    def __repr__(self):
+        """
+        Return string representation of the AlertDbModel
+
+        :returns: - 'str' representing alert
+        """
+        return f'Alert alert_id = {self.alert_id}, watch_id = {self.watch_id}, prod_id = {self.prod_id}' \
+               f', kind = {self.kind}, price = {self.price}, vendor_id = {self.vendor_id}'
+
+    @classmethod
+    def find_page(cls, after: int = 0, offset: int = 0, limit: int = 100, prod_id: int = None) \
+            -> "Tuple[List[AlertDbModel], int]":
+        """
+        Find a page of alerts
+
+        :param after: Only alerts with greater alert ID, e.g. the last one already processed (int)
+        :param offset: Number of skipped alerts (int)
+        :param limit: Maximum number of alerts (int)
+        :param prod_id: Only alerts of this product if provided (int)
+        :returns: - 'Tuple[List[AlertDbModel], int]' representing alerts ordered by alert ID and number of all
+                    alerts matching the filters
+        """
+        query = cls.query.filter(cls.alert_id > after)
+        if prod_id is not None:
+            query = query.filter_by(prod_id=prod_id)
+        return query.order_by(cls.alert_id).offset(offset).limit(limit).all(), query.count()
+
+    @classmethod
+    def fire_many(cls, index: "ThresholdIndex", before: "Dict[int, Tuple[int, int]]",
+                  after: "Dict[int, Tuple[int, int]]") -> "int":
+        """
+        Add alerts of watches fired by a change of cheapest offers as part of the current transaction (the caller
+        commits)
+
+        :param index: Index of the watches (ThresholdIndex)
+        :param before: Price and vendor of the cheapest offer in stock by watched product before the change, products
+                       out of stock are missing (Dict[int, Tuple[int, int]])
+        :param after: The same after the change (Dict[int, Tuple[int, int]])
+        :returns: - 'int' representing number of fired alerts
+        """
+        fired = 0
+        for prod_id in sorted(before.keys() | after.keys()):
+            if prod_id not in after:
+                continue
+            price, vendor_id = after[prod_id]
+            old = before.get(prod_id)
+            for watch_id, kind, threshold in index.fired(prod_id, old[0] if old else None, price):
+                fl_sql.session.add(cls(watch_id, prod_id, kind, threshold, price, vendor_id))
+                fired += 1
+        return fired
+
+
+class ThresholdIndex:
+    def __init__(self, watches: Iterable[Tuple[int, int, str, Optional[int]]], version: int):
+        """
+        Initialize ThresholdIndex - watches grouped by product, price thresholds sorted, so that a change of
+        the cheapest price of a product finds the crossed thresholds by binary search instead of checking all of them
+
+        :param watches: Watch ID, product ID, kind and threshold price of the watches (Iterable[tuple])
+        :param version: Version of the watches the index was built from (int)
+        """
+        self.version = version
+        self._below: Dict[int, Tuple[List[int], List[int]]] = {}
+        self._in_stock: Dict[int, List[int]] = {}
+        thresholds: Dict[int, List[Tuple[int, int]]] = {}
+        for watch_id, prod_id, kind, price in watches:
+            if kind == PRICE_BELOW:
+                thresholds.setdefault(prod_id, []).append((price, watch_id))
+            else:
+                self._in_stock.setdefault(prod_id, []).append(watch_id)
+        for prod_id, items in thresholds.items():
+            items.sort()
+            self._below[prod_id] = ([price for price, _ in items], [watch_id for _, watch_id in items])
+        self.prod_ids: Set[int] = self._below.keys() | self._in_stock.keys()
+
+    def fired(self, prod_id: int, old_price: Optional[int], new_price: Optional[int]) \
+            -> "List[Tuple[int, str, Optional[int]]]":
+        """
+        Find watches of a product fired by a change of its cheapest price - price_below watches whose threshold is
+        above the new price but wasn't above the old one, and in_stock watches if the product was out of stock
+
+        :param prod_id: Product ID (int)
+        :param old_price: Cheapest price before the change, None if out of stock (int)
+        :param new_price: Cheapest price after the change, None if out of stock (int)
+        :returns: - 'List[Tuple[int, str, Optional[int]]]' representing watch ID, kind and threshold of fired watches
+        """
+        if new_price is None:
+            return []
+        result = []
+        if old_price is None:
+            result.extend((watch_id, IN_STOCK, None) for watch_id in self._in_stock.get(prod_id, ()))
+        if prod_id in self._below:
+            prices, watch_ids = self._below[prod_id]
+            start = bisect_right(prices, new_price)
+            end = len(prices) if old_price is None else bisect_right(prices, old_price)
+            result.extend((watch_ids[i], PRICE_BELOW, prices[i]) for i in range(start, end))
+        return result
+
+
+def threshold_index() -> "ThresholdIndex":
+    """
+    Get index of all watches, rebuilt when watches were added or deleted by any process. Must be called within app
+    context
+
+    :returns: - 'ThresholdIndex' representing current watches
+    """
+    version = DataVersionDbModel.get(WATCHES)
+    index = current_app.extensions.get('threshold_index')
+    if index is None or index.version != version:
+        watches = fl_sql.session.query(WatchDbModel.watch_id, WatchDbModel.prod_id, WatchDbModel.kind,
+                                       WatchDbModel.price)
+        index = current_app.extensions['threshold_index'] = ThresholdIndex(watches, version)
+    return index
@@ -0,0 +1,18 @@
+from marshmallow_sqlalchemy import SQLAlchemyAutoSchema
+from flask_misc import fl_sql
+from watch_db_model import AlertDbModel, WatchDbModel
+
+
+class WatchDbSchema(SQLAlchemyAutoSchema):
+    class Meta:
+        model = WatchDbModel
+        load_instance = True
+        include_fk = True
+        sqla_session = fl_sql.session
+
+
+class AlertDbSchema(SQLAlchemyAutoSchema):
+    class Meta:
+        model = AlertDbModel
+        load_instance = True
+        sqla_session = fl_sql.session
@@ -0,0 +1,5 @@
+from main import create_app
+
+# WSGI entry point, e.g. gunicorn -c gunicorn.conf.py wsgi:app
+# the offers poller is started by gunicorn hooks defined in gunicorn.conf.py
+app = create_app()